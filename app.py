@@ -1,20 +1,38 @@
 # app.py
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, Response
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, Response, stream_with_context, get_template_attribute
 from flask_migrate import Migrate
 from werkzeug.security import check_password_hash, generate_password_hash # For password hashing
 from functools import wraps
+import click
 import re
 import sys
+import json
+import hmac
 from datetime import datetime
 from collections import defaultdict
 import logging
 
 from config import Config
-from models import db, Film, RatingSnapshot  # Remove FilmRatingHistory
-from sqlalchemy import or_
-from scraper import get_film_data
-from tasks import run_scrape_job_for_film  # Import from new tasks.py
+from models import db, Film, FilmStats  # Remove FilmRatingHistory
+from sqlalchemy import select, func, case
+from tasks import scrape_films
+from history import (has_rating_history, fetch_rating_history, fetch_chart_history, iter_compare_chart_history, parse_since,
+                     latest_snapshot_id, fetch_rating_history_since, iter_compare_history)
+from rollups import rebuild_rollups_for_film
+from downsample import parse_max_points, downsample_history, downsample_points
+from film_stats import refresh_film_stats, leaderboard_query, rank_column, SORT_COLUMNS
+from ordering import move, rebalance, rebalance_in_background, apply_permutation
+from film_search import search_films, rebuild_search_index
+from film_import import parse_import_text, merge_sources, run_import, ImportSources
+from background_jobs import create_job, submit_job, job_status, recent_jobs, active_job, JobProgress
+from pagination import keyset_page, parse_cursor, list_columns_only
+from deadband import deadband_settings, with_current_point, compression_report
+from history_codec import wants_binary, encode_history, HISTORY_BINARY_MIMETYPE
+from sqlite_profile import configure_sqlite_engine, init_sqlite_profile, read_only_db
+from response_cache import init_response_cache, cached_response, film_tag, invalidate_films, invalidate_catalog, CATALOG_TAG
+import metrics
+from scrape_queue import queue_stats
 from scheduler import init_scheduler, scheduler, SCRAPE_JOB_ID  # Import the initializer and scheduler instance
 
 
@@ -34,8 +52,12 @@ except OSError:
 # Flask's convention for SQLite DB, etc. `app.instance_path` resolves to a folder named 'instance'
 os.makedirs(app.instance_path, exist_ok=True)
  
+configure_sqlite_engine(app) # SQLite: single-writer pool and busy timeout (no-op for other databases)
 db.init_app(app)
+init_sqlite_profile(app, db) # SQLite: WAL and other PRAGMAs on connect, plus the read-only pool
 migrate = Migrate(app, db) # Initialize Flask-Migrate
+init_response_cache(app) # Public pages/APIs are cached until a scrape or admin action changes them
+metrics.init_metrics(app) # Scrape pipeline metrics; web and scrape processes share them for /metrics
 
 # Initialize and start the scheduler if enabled in config.
 # We add a check to prevent starting the scheduler during 'flask db' commands.
@@ -75,14 +97,33 @@ def logout():
     flash('You have been logged out.', 'info')
     return redirect(url_for('index'))
 
+def _wants_json():
+    # fetch() callers ask for JSON; plain form posts get a redirect
+    return request.accept_mimetypes.best == 'application/json' or request.is_json
+
 # --- Admin Routes ---
 @app.route('/admin')
 @login_required
 def admin_dashboard():
-    films = Film.query.order_by(Film.display_order.asc()).all()
+    # Cursor-paginated in display order (?after= / ?before=)
+    rows, prev_cursor, next_cursor = keyset_page(
+        db.session,
+        select(Film).options(*list_columns_only()),
+        int(app.config.get('ADMIN_PAGE_SIZE', 100)),
+        after=parse_cursor(request.args.get('after')),
+        before=parse_cursor(request.args.get('before')),
+    )
+    films = [film for (film,) in rows]
+    # Ends of the whole list, so "move up/down" is only disabled on the real first/last film
+    first_id = db.session.execute(select(Film.id).order_by(Film.display_order.asc(), Film.id.asc()).limit(1)).scalar()
+    last_id = db.session.execute(select(Film.id).order_by(Film.display_order.desc(), Film.id.desc()).limit(1)).scalar()
+    total = db.session.execute(select(func.count(Film.id))).scalar()
     job = scheduler.get_job(SCRAPE_JOB_ID)
     next_run_time = job.next_run_time if job else None
-    return render_template('admin/dashboard.html', films=films, next_run_time=next_run_time)
+    return render_template('admin/dashboard.html', films=films, next_run_time=next_run_time,
+                           first_id=first_id, last_id=last_id, total=total,
+                           prev_cursor=prev_cursor, next_cursor=next_cursor,
+                           jobs=recent_jobs(limit=3))
 
 @app.route('/admin/add_film', methods=['POST'])
 @login_required
@@ -100,51 +141,14 @@ def add_film():
         flash(f'Film "{slug}" is already tracked.', 'warning')
         return redirect(url_for('admin_dashboard'))
 
-    # Fetch initial data to populate display_name, year etc.
-    scraped_data = get_film_data(slug)
-    if not scraped_data or not scraped_data.get('display_name'):
-        flash(f'Could not fetch initial data for "{slug}". Please check the slug or try again later.', 'danger')
-        return redirect(url_for('admin_dashboard'))
-
-    # Determine the display order for the new film
-    max_order = db.session.query(db.func.max(Film.display_order)).scalar() or 0
-
-    new_film = Film(
-        letterboxd_slug=slug,
-        display_name=scraped_data.get('display_name', slug),
-        year=scraped_data.get('year'),
-        director=scraped_data.get('director'),
-        poster_url=scraped_data.get('poster_url'),
-        is_tracked=True, # Default to tracked
-        display_order=max_order + 1
-    )
-    db.session.add(new_film)
-
-    try:
-        # Add initial rating snapshot if available
-        if 'average_rating' in scraped_data and 'rating_count' in scraped_data:
-            new_film.last_known_average_rating = scraped_data['average_rating']
-            new_film.last_known_rating_count = scraped_data['rating_count']
-            new_film.last_scraped_at = datetime.utcnow()
-            
-            # The 'film' back-reference on the RatingSnapshot model can be used
-            # to associate the two objects before committing. SQLAlchemy handles the foreign key.
-            snapshot = RatingSnapshot(
-                average_rating=scraped_data['average_rating'],
-                rating_count=scraped_data['rating_count'],
-                film=new_film # Associate directly with the film object
-            )
-            db.session.add(snapshot)
-            flash(f'Film "{new_film.display_name}" added and initial rating snapshot saved.', 'success')
-        else:
-            flash(f'Film "{new_film.display_name}" added. No rating data found yet (e.g., unreleased).', 'success')
-        
-        db.session.commit() # A single commit for the entire transaction
-    except Exception as e:
-        db.session.rollback()
-        logger.error(f"Error adding film {slug}: {e}")
-        flash(f'An error occurred while adding the film "{slug}".', 'danger')
-
+    # Fetched and inserted on the job executor, under the shared rate limit, retries and
+    # circuit breaker, like a one-film bulk import; the request never waits on Letterboxd
+    job_id = create_job('add_film', total=1, message=f'Queued: {slug}')
+    submit_job(app, job_id, run_import, ImportSources([slug], [], []))
+    logger.info(f"Adding film {slug} as job {job_id}")
+    if _wants_json():
+        return jsonify({"job_id": job_id, "status_url": url_for('job_status_api', job_id=job_id)}), 202
+    flash(f'Adding "{slug}". Progress is shown below.', 'info')
     return redirect(url_for('admin_dashboard'))
 
 @app.route('/admin/toggle_tracking/<int:film_id>', methods=['POST'])
@@ -153,6 +157,7 @@ def toggle_tracking(film_id):
     film = Film.query.get_or_404(film_id)
     film.is_tracked = not film.is_tracked
     db.session.commit()
+    invalidate_films([film.letterboxd_slug])
     status = "now tracked" if film.is_tracked else "no longer tracked"
     flash(f'Film "{film.display_name}" is {status}.', 'info')
     return redirect(url_for('admin_dashboard'))
@@ -164,6 +169,7 @@ def delete_film(film_id):
     # Related RatingSnapshots will be deleted due to cascade="all, delete-orphan"
     db.session.delete(film)
     db.session.commit()
+    invalidate_films([film.letterboxd_slug])
     flash(f'Film "{film.display_name}" and all its data deleted.', 'success')
     return redirect(url_for('admin_dashboard'))
 
@@ -171,36 +177,55 @@ def delete_film(film_id):
 @login_required
 def scrape_now_film(film_id):
     film = Film.query.get_or_404(film_id)
-    logger.info(f"Manual scrape initiated for {film.display_name}")
-    # Call the scraping logic from our tasks file
-    success = run_scrape_job_for_film(film.id) # Pass film_id
-    if success:
-        flash(f'Successfully scraped new data for "{film.display_name}".', 'success')
+    logger.info(f"Manual scrape queued for {film.display_name}")
+    # Runs on the job executor: the request never waits on Letterboxd
+    job_id = create_job('scrape', total=1, message=f'Queued: {film.display_name}')
+    submit_job(app, job_id, scrape_films, [film.id])
+    if _wants_json():
+        return jsonify({"job_id": job_id, "status_url": url_for('job_status_api', job_id=job_id)}), 202
+    flash(f'Scrape of "{film.display_name}" started. Progress is shown below.', 'info')
+    return redirect(url_for('admin_dashboard'))
+
+@app.route('/admin/scrape_all', methods=['POST'])
+@login_required
+def scrape_all_now():
+    """Scrapes every tracked film now, as one background job. While one is running, asking
+    again returns that job instead of starting another."""
+    job = active_job('scrape_all')
+    if job is not None:
+        job_id, started = job.id, False
+    else:
+        job_id, started = create_job('scrape_all', message='Queued'), True
+        submit_job(app, job_id, scrape_films, None)
+        logger.info(f"Scrape of all tracked films queued as job {job_id}")
+    if _wants_json():
+        return jsonify({"job_id": job_id, "started": started,
+                        "status_url": url_for('job_status_api', job_id=job_id)}), 202
+    if started:
+        flash('Scrape of all tracked films started. Progress is shown below.', 'info')
     else:
-        flash(f'Failed to scrape new data for "{film.display_name}". Check logs.', 'warning')
+        flash('A scrape of all films is already running.', 'warning')
     return redirect(url_for('admin_dashboard'))
 
+def _move_and_commit(film, direction):
+    # One row per move (see ordering.py); a tight gap gets respaced in the background
+    moved, tight = move(film, direction)
+    if moved:
+        db.session.commit()
+        invalidate_catalog()
+        if tight:
+            rebalance_in_background(app, on_done=invalidate_catalog)
+    return moved
+
 @app.route('/admin/film/move/<int:film_id>/<string:direction>', methods=['POST'])
 @login_required
 def move_film(film_id, direction):
     film_to_move = Film.query.get_or_404(film_id)
-    
-    if direction == 'up':
-        # Find the film with the next lower display_order to swap with
-        film_to_swap = Film.query.filter(Film.display_order < film_to_move.display_order).order_by(Film.display_order.desc()).first()
-    elif direction == 'down':
-        # Find the film with the next higher display_order to swap with
-        film_to_swap = Film.query.filter(Film.display_order > film_to_move.display_order).order_by(Film.display_order.asc()).first()
-    else:
+    if direction not in ('up', 'down'):
         flash('Invalid move direction.', 'danger')
         return redirect(url_for('admin_dashboard'))
 
-    if film_to_swap:
-        # Swap display order values
-        original_order = film_to_move.display_order
-        film_to_move.display_order = film_to_swap.display_order
-        film_to_swap.display_order = original_order
-        db.session.commit()
+    if _move_and_commit(film_to_move, direction):
         flash(f'Adjusted order for "{film_to_move.display_name}".', 'success')
     
     return redirect(url_for('admin_dashboard'))
@@ -209,35 +234,66 @@ def move_film(film_id, direction):
 @login_required
 def move_film_to_top(film_id):
     film = Film.query.get_or_404(film_id)
-    # Only consider films in the same group (tracked/archived)
-    group_filter = Film.is_tracked == film.is_tracked
-    films_in_group = Film.query.filter(group_filter).order_by(Film.display_order.asc()).all()
-    if films_in_group and films_in_group[0].id != film.id:
-        # Move this film to the top
-        for idx, f in enumerate(films_in_group):
-            if f.id == film.id:
-                continue
-            f.display_order = idx + 2  # Shift down
-        film.display_order = 1
-        db.session.commit()
+    _move_and_commit(film, 'top')
     return redirect(url_for('admin_dashboard'))
 
 @app.route('/admin/film/move_to_bottom/<int:film_id>', methods=['POST'])
 @login_required
 def move_film_to_bottom(film_id):
     film = Film.query.get_or_404(film_id)
-    group_filter = Film.is_tracked == film.is_tracked
-    films_in_group = Film.query.filter(group_filter).order_by(Film.display_order.asc()).all()
-    if films_in_group and films_in_group[-1].id != film.id:
-        # Move this film to the bottom
-        for idx, f in enumerate(films_in_group):
-            if f.id == film.id:
-                continue
-            f.display_order = idx + 1
-        film.display_order = len(films_in_group)
-        db.session.commit()
+    _move_and_commit(film, 'bottom')
     return redirect(url_for('admin_dashboard'))
 
+@app.route('/admin/api/reorder', methods=['POST'])
+@login_required
+def reorder_films_api():
+    """Drag-and-drop reorder: {"film_ids": [...]} in their new order. The listed films swap
+    among the positions they already occupy, in one UPDATE; other films do not move."""
+    payload = request.get_json(silent=True) or {}
+    film_ids = payload.get('film_ids')
+    if not isinstance(film_ids, list) or not film_ids or not all(isinstance(i, int) for i in film_ids):
+        return jsonify({"error": "film_ids must be a non-empty list of film ids"}), 400
+    try:
+        count = apply_permutation(film_ids)
+    except LookupError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 404
+    db.session.commit()
+    invalidate_catalog()
+    return jsonify({"reordered": count})
+
+@app.route('/admin/import', methods=['POST'])
+@login_required
+def import_films():
+    """Bulk import from pasted URLs/CSV and/or an uploaded CSV or saved list page. The
+    import runs as a background job; the dashboard polls its progress."""
+    parts = [parse_import_text(request.form.get('import_text', ''))]
+    upload = request.files.get('import_file')
+    if upload and upload.filename:
+        parts.append(parse_import_text(upload.read().decode('utf-8-sig', 'replace')))
+    sources = merge_sources(*parts)
+    if not any(sources):
+        flash('No Letterboxd film, list or boxd.it links found to import.', 'danger')
+        return redirect(url_for('admin_dashboard'))
+
+    job_id = create_job('import', message='Queued')
+    submit_job(app, job_id, run_import, sources)
+    logger.info(f"Import job {job_id} queued: {len(sources.slugs)} films, "
+                f"{len(sources.short_links)} short links, {len(sources.list_urls)} lists")
+    if _wants_json():
+        return jsonify({"job_id": job_id, "status_url": url_for('job_status_api', job_id=job_id)}), 202
+    flash(f'Import started ({len(sources.slugs)} films, {len(sources.list_urls)} lists, '
+          f'{len(sources.short_links)} short links). Progress is shown below.', 'info')
+    return redirect(url_for('admin_dashboard'))
+
+@app.route('/admin/api/jobs/<job_id>')
+@login_required
+def job_status_api(job_id):
+    status = job_status(job_id)
+    if status is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(status)
+
 # Only register the scheduler status route if NOT running in the scheduler process
 import os
 
@@ -262,70 +318,320 @@ if not os.environ.get("RUNNING_SCHEDULER_PROCESS"):
         # Using jsonify will correctly set the Content-Type header to application/json
         return jsonify(status_data)
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Scrape pipeline metrics of every process, in the Prometheus text format. Needs the
+    METRICS_TOKEN bearer token if one is set, otherwise an admin login."""
+    token = app.config.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            return Response("Unauthorized\n", status=401, mimetype='text/plain',
+                            headers={'WWW-Authenticate': 'Bearer'})
+    elif 'admin_logged_in' not in session:
+        return redirect(url_for('login', next=request.url))
+    queued, leased = queue_stats()
+    body = metrics.render({
+        'letterboxd_scrape_queue_entries': ("Entries in the scrape queue, leased ones included.", queued),
+        'letterboxd_scrape_queue_leased_entries': ("Queue entries claimed by a process.", leased),
+    })
+    return Response(body, content_type=metrics.CONTENT_TYPE)
+
 
 # --- CLI Commands for data maintenance ---
 @app.cli.command("reorder-films")
 def reorder_films_command():
-    """Resets the display_order for all films based on their addition date."""
+    """Respaces display_order keys evenly, keeping the current order (ties by id)."""
     with app.app_context():
-        # Order by existing display_order first, then by when they were added.
-        # This preserves any manual ordering that might already exist for some films.
-        films = Film.query.order_by(Film.display_order.asc(), Film.added_at.asc()).all()
-        if not films:
-            print("No films found in the database.")
-            return
-
-        print(f"Re-ordering {len(films)} films...")
-        for index, film in enumerate(films):
-            film.display_order = index + 1
-        
         try:
+            count = rebalance()
+            if not count:
+                print("No films found in the database.")
+                return
+            print(f"Re-ordering {count} films...")
             db.session.commit()
+            invalidate_catalog()
             print("Successfully updated display order for all films.")
         except Exception as e:
             db.session.rollback()
             print(f"An error occurred during re-ordering: {e}")
 
+@app.cli.command("import-films")
+@click.argument('sources', nargs=-1, required=True)
+def import_films_command(sources):
+    """Bulk-imports films from CSV/text files, saved list pages, or film/list/boxd.it URLs."""
+    with app.app_context():
+        parts = []
+        for source in sources:
+            if os.path.isfile(source):
+                with open(source, encoding='utf-8-sig', errors='replace') as f:
+                    parts.append(parse_import_text(f.read()))
+            else:
+                parts.append(parse_import_text(source))
+        merged = merge_sources(*parts)
+        if not any(merged):
+            print("Nothing to import.")
+            return
+        summary = run_import(JobProgress(None), merged)
+        print(f"Added {summary['added']} films, {summary['already_present']} already present, "
+              f"{summary['failed_count']} failed.")
+        for slug in summary['failed']:
+            print(f"  failed: {slug}")
+        for link in summary['unresolved']:
+            print(f"  unresolved: {link}")
+
+@app.cli.command("backfill-rollups")
+@click.option('--slug', default=None, help="Only rebuild rollups for this film.")
+def backfill_rollups_command(slug):
+    """Rebuilds the hourly/daily/weekly rating rollups from raw snapshots."""
+    with app.app_context():
+        query = Film.query.order_by(Film.id.asc())
+        if slug:
+            query = query.filter_by(letterboxd_slug=slug)
+        film_ids = [film.id for film in query.all()]
+        if not film_ids:
+            print("No films found in the database.")
+            return
+
+        print(f"Rebuilding rollups for {len(film_ids)} films...")
+        total = 0
+        for film_id in film_ids:
+            try:
+                total += rebuild_rollups_for_film(film_id)
+                db.session.commit() # One film per transaction keeps the writer lock short
+                invalidate_films([db.session.get(Film, film_id).letterboxd_slug])
+            except Exception as e:
+                db.session.rollback()
+                print(f"An error occurred while rebuilding rollups for film {film_id}: {e}")
+        print(f"Wrote {total} rollup rows.")
+
+@app.cli.command("refresh-film-stats")
+def refresh_film_stats_command():
+    """Rebuilds the film_stats rows (trend deltas for the index page and leaderboard)."""
+    with app.app_context():
+        film_ids = [film_id for (film_id,) in db.session.execute(select(Film.id).order_by(Film.id.asc()))]
+        if not film_ids:
+            print("No films found in the database.")
+            return
+        print(f"Refreshing stats for {len(film_ids)} films...")
+        for i in range(0, len(film_ids), 500):
+            refresh_film_stats(film_ids[i:i + 500])
+            db.session.commit()
+        invalidate_catalog()
+        print("Done.")
+
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index_command():
+    """Recreates the film search index (SQLite FTS5) and its sync triggers, and reindexes all films."""
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            print("The search index is SQLite-only; other databases use LIKE search.")
+            return
+        with db.engine.begin() as connection:
+            rebuild_search_index(connection)
+        invalidate_catalog()
+        print("Search index rebuilt.")
+
+@app.cli.command("compact-history")
+@click.option('--older-than-days', default=None, type=int,
+              help="Hot retention for tracked films (default: SNAPSHOT_HOT_RETENTION_DAYS).")
+@click.option('--slug', default=None, help="Only compact this film.")
+@click.option('--dry-run', is_flag=True, help="Report what would move without changing anything.")
+@click.option('--vacuum', is_flag=True, help="Run VACUUM afterwards to return freed space (SQLite).")
+def compact_history_command(older_than_days, slug, dry_run, vacuum):
+    """Moves old snapshots, and all snapshots of archived films, to the cold tier."""
+    from cold_storage import films_to_compact, compact_film
+    with app.app_context():
+        if older_than_days is None:
+            older_than_days = int(app.config.get('SNAPSHOT_HOT_RETENTION_DAYS', 180))
+        plan = films_to_compact(older_than_days, slug=slug)
+        if not plan:
+            print("Nothing to compact.")
+            return
+
+        print(f"{'Would compact' if dry_run else 'Compacting'} history for {len(plan)} films...")
+        total_months = total_points = 0
+        for film_id, film_slug, cutoff in plan:
+            try:
+                months, points = compact_film(film_id, cutoff, dry_run=dry_run)
+                if not dry_run:
+                    db.session.commit() # One film per transaction keeps the writer lock short
+                    invalidate_films([film_slug])
+                total_months += months
+                total_points += points
+            except Exception as e:
+                db.session.rollback()
+                print(f"An error occurred while compacting film {film_slug}: {e}")
+        print(f"{'Would move' if dry_run else 'Moved'} {total_points} snapshots into {total_months} monthly archives.")
+
+        if vacuum and not dry_run and db.engine.url.get_backend_name() == 'sqlite':
+            print("Running VACUUM...")
+            with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                connection.exec_driver_sql('VACUUM')
+
+@app.cli.command("snapshot-compression-report")
+@click.option('--tolerance', default=None, type=float, help="Average rating deadband (default: SNAPSHOT_AVERAGE_TOLERANCE).")
+@click.option('--count-threshold', default=None, type=int, help="Rating count deadband (default: SNAPSHOT_COUNT_THRESHOLD).")
+@click.option('--slug', default=None, help="Only report on this film.")
+def snapshot_compression_report_command(tolerance, count_threshold, slug):
+    """Reports how much deadband compression would shrink each film's stored history,
+    and the largest error of the reconstructed step series."""
+    with app.app_context():
+        if tolerance is None:
+            tolerance = float(app.config.get('SNAPSHOT_AVERAGE_TOLERANCE', 0.005))
+        if count_threshold is None:
+            count_threshold = int(app.config.get('SNAPSHOT_COUNT_THRESHOLD', 100))
+        count_threshold = max(count_threshold, 1)
+        query = Film.query.order_by(Film.display_order.asc())
+        if slug:
+            query = query.filter_by(letterboxd_slug=slug)
+        films = [(film.id, film.letterboxd_slug) for film in query.all()]
+        if not films:
+            print("No films found in the database.")
+            return
+
+        print(f"Deadband: average +/-{tolerance}, count {count_threshold}")
+        print(f"{'film':<40} {'points':>9} {'kept':>9} {'ratio':>7} {'max avg err':>12} {'max count err':>14}")
+        total_points = total_kept = 0
+        for film_id, film_slug in films:
+            rows = fetch_rating_history(film_id)
+            if not rows:
+                continue
+            kept, ratio, average_error, count_error = compression_report(rows, tolerance, count_threshold)
+            total_points += len(rows)
+            total_kept += kept
+            print(f"{film_slug[:40]:<40} {len(rows):>9} {kept:>9} {ratio:>6.1f}x {average_error:>12.4f} {count_error:>14}")
+        if total_kept:
+            print(f"Total: {total_points} -> {total_kept} snapshots ({total_points / total_kept:.1f}x)")
+
+@app.cli.command("scrape-worker")
+@click.option('--workers', default=1, show_default=True, help="Worker processes to run.")
+@click.option('--threads', default=None, type=int, help="Fetch threads per worker (default: SCRAPE_MAX_WORKERS).")
+@click.option('--once', is_flag=True, help="Exit once nothing is due instead of polling.")
+def scrape_worker_command(workers, threads, once):
+    """Runs scrape workers that drain the shared scrape queue until interrupted."""
+    from scrape_worker import run_workers
+    print(f"Starting {workers} scrape worker(s)... Press Ctrl+C to stop.")
+    run_workers(app, workers=workers, threads=threads, once=once)
+
 # --- Public Routes ---
+INDEX_SECTIONS = ('tracked', 'upcoming', 'archived')
+_INDEX_SECTION = case(
+    (Film.is_tracked.is_(False), 'archived'),
+    (Film.last_known_average_rating.is_(None), 'upcoming'),
+    else_='tracked',
+)
+
+def _index_section_page(section, after=None, limit=None):
+    """One page of an index section in display order: [(film, stats, rank)], next_cursor.
+    Tracked films come with their materialized stats row and rank (see film_stats.py),
+    so trends cost no snapshot reads."""
+    limit = limit or int(app.config.get('INDEX_PAGE_SIZE', 48))
+    if section == 'tracked':
+        # Ranked over all tracked films before the page is cut, so ranks stay global
+        ranked = (
+            select(FilmStats.film_id, rank_column())
+            .join(Film, Film.id == FilmStats.film_id)
+            .where(Film.is_tracked.is_(True))
+            .subquery()
+        )
+        stmt = (
+            select(Film, FilmStats, ranked.c.rank)
+            .outerjoin(FilmStats, FilmStats.film_id == Film.id)
+            .outerjoin(ranked, ranked.c.film_id == Film.id)
+        )
+    else:
+        stmt = select(Film)
+    stmt = stmt.where(_INDEX_SECTION == section).options(*list_columns_only())
+    rows, _, next_cursor = keyset_page(db.session, stmt, limit, after=after)
+    if section != 'tracked':
+        rows = [(film, None, None) for (film,) in rows]
+    return rows, next_cursor
+
 @app.route('/')
+@cached_response(lambda: [CATALOG_TAG])
+@read_only_db
 def index():
-    all_films = Film.query.order_by(Film.display_order.asc()).all()
-    films_with_data = [f for f in all_films if f.is_tracked and f.last_known_average_rating is not None]
-    films_without_data = [f for f in all_films if f.is_tracked and f.last_known_average_rating is None]
-    films_archived = [f for f in all_films if not f.is_tracked]
+    # Only the first page of tracked films is rendered here; later pages and the other
+    # two sections are fetched from /api/films when they scroll into view
+    films_with_data, next_cursor = _index_section_page('tracked')
+    counts = dict(db.session.execute(select(_INDEX_SECTION, func.count()).group_by(_INDEX_SECTION)).all())
     return render_template(
         'public/index.html',
         films_with_data=films_with_data,
-        films_without_data=films_without_data,
-        films_archived=films_archived
+        next_cursor=next_cursor,
+        section_counts={section: counts.get(section, 0) for section in INDEX_SECTIONS},
     )
 
+@app.route('/api/films')
+@cached_response(lambda: [CATALOG_TAG])
+@read_only_db
+def api_films():
+    """A page of index film cards, as rendered HTML plus the cursor of the next page."""
+    section = request.args.get('section', 'tracked')
+    if section not in INDEX_SECTIONS:
+        return jsonify({"error": f"section must be one of: {', '.join(INDEX_SECTIONS)}"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', app.config.get('INDEX_PAGE_SIZE', 48))), 1), 100)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    rows, next_cursor = _index_section_page(section, parse_cursor(request.args.get('after')), limit)
+    film_card = get_template_attribute('public/_film_card.html', 'film_card')
+    return jsonify({
+        "section": section,
+        "html": ''.join(str(film_card(film, stats, rank)) for film, stats, rank in rows),
+        "count": len(rows),
+        "next_cursor": next_cursor,
+    })
+
 @app.route('/film/<letterboxd_slug>')
+@cached_response(lambda letterboxd_slug: [film_tag(letterboxd_slug)])
+@read_only_db
 def film_detail(letterboxd_slug):
     film = Film.query.filter_by(letterboxd_slug=letterboxd_slug).first_or_404()
-    ratings = RatingSnapshot.query.filter_by(film_id=film.id).order_by(RatingSnapshot.timestamp.asc()).all()
-    return render_template('public/film_detail.html', film=film, ratings=ratings)
+    # The chart loads its data from the API; the page only needs to know whether there is any.
+    has_ratings = has_rating_history(film.id)
+    return render_template('public/film_detail.html', film=film, has_ratings=has_ratings,
+                           stepped_history=deadband_settings() is not None)
 
 @app.route('/api/film/<letterboxd_slug>/ratings')
+@cached_response(lambda letterboxd_slug: [film_tag(letterboxd_slug)],
+                 vary=lambda: 'binary' if wants_binary() else 'json')
+@read_only_db
 def api_film_ratings(letterboxd_slug):
     # Fetch rating history for the film
     film = Film.query.filter_by(letterboxd_slug=letterboxd_slug).first_or_404()
-    # Use RatingSnapshot for history
-    history = (
-        RatingSnapshot.query
-        .filter_by(film_id=film.id)
-        .order_by(RatingSnapshot.timestamp)
-        .all()
-    )
-    labels = [h.timestamp.isoformat() for h in history]
-    avg_ratings = [h.average_rating for h in history]
-    rating_counts = [h.rating_count for h in history]
+    # Optional server-side downsampling to roughly the chart's pixel width
+    max_points = parse_max_points(request.args.get('max_points') or request.args.get('resolution'))
+    # Optional incremental read: only points newer than a snapshot-id (or timestamp) cursor
+    after_id, after_timestamp = parse_since(request.args.get('since'))
+    next_cursor = latest_snapshot_id([film.id])
+    if after_id is not None or after_timestamp is not None:
+        history = fetch_rating_history_since(film.id, after_id, after_timestamp)
+    else:
+        # Column-only (timestamp, average_rating, rating_count) tuples from the composite index
+        # (rollup buckets instead when the history is much longer than the chart can draw)
+        history = fetch_chart_history(film.id, max_points)
+    if deadband_settings() and after_id is None and after_timestamp is None:
+        # Stored points are change points; add the latest scrape so the held series reaches it.
+        # Full reads only: clients append since= deltas to their cache, so a synthetic point
+        # in every delta would pile up there
+        history = with_current_point(history, film)
+    history = downsample_history(history, max_points)
+    if next_cursor is None:
+        next_cursor = after_id
+    if wants_binary():
+        # Columnar typed-array payload (see history_codec.py); much smaller than JSON for long series
+        return Response(encode_history(history, next_cursor), mimetype=HISTORY_BINARY_MIMETYPE)
+    labels = [timestamp.isoformat() for timestamp, _, _ in history]
+    avg_ratings = [average_rating for _, average_rating, _ in history]
+    rating_counts = [rating_count for _, _, rating_count in history]
     return jsonify({
         "labels": labels,
         "datasets": [
             {"label": "Average Rating", "data": avg_ratings},
             {"label": "Rating Count", "data": rating_counts}
-        ]
+        ],
+        "next_cursor": next_cursor,
     })
 
 
@@ -338,18 +644,12 @@ def compare():
 
 
 @app.route('/api/films/search')
+@cached_response(lambda: [CATALOG_TAG])
+@read_only_db
 def api_films_search():
-    query = request.args.get('q', '').strip()
-    q = Film.query
-    if query:
-        like = f"%{query}%"
-        q = q.filter(or_(Film.display_name.ilike(like), Film.letterboxd_slug.ilike(like)))
-    # Show both tracked and archived, tracked first
-    films = (
-        q.order_by(Film.is_tracked.desc(), Film.display_order.asc(), Film.display_name.asc())
-         .limit(50)
-         .all()
-    )
+    # Ranked, typo-tolerant matches from the FTS5 trigram index (see film_search.py).
+    # Shows both tracked and archived films; with no query, tracked first in display order.
+    films = search_films(request.args.get('q', ''), limit=50)
     return jsonify([
         {
             "id": f.id,
@@ -364,6 +664,8 @@ def api_films_search():
 
 
 @app.route('/api/film_meta')
+@cached_response(lambda: [film_tag(request.args.get('slug', '').strip())])
+@read_only_db
 def api_film_meta():
     slug = request.args.get('slug', '').strip()
     if not slug:
@@ -381,8 +683,55 @@ def api_film_meta():
     })
 
 
-@app.route('/api/compare')
-def api_compare():
+@app.route('/api/leaderboard')
+@cached_response(lambda: [CATALOG_TAG])
+@read_only_db
+def api_leaderboard():
+    """Tracked films ranked by average rating, sortable by trend. Reads film_stats only."""
+    sort = request.args.get('sort', 'rank')
+    if sort not in SORT_COLUMNS:
+        return jsonify({"error": f"sort must be one of: {', '.join(SORT_COLUMNS)}"}), 400
+    order = request.args.get('order')
+    if order not in (None, 'asc', 'desc'):
+        return jsonify({"error": "order must be 'asc' or 'desc'"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "limit and offset must be integers"}), 400
+
+    total = db.session.execute(
+        select(func.count()).select_from(FilmStats).join(Film, Film.id == FilmStats.film_id)
+        .where(Film.is_tracked.is_(True))
+    ).scalar()
+    rows = db.session.execute(
+        leaderboard_query(sort, None if order is None else order == 'desc').limit(limit).offset(offset)
+    ).all()
+    return jsonify({
+        "films": [{
+            "slug": film.letterboxd_slug,
+            "name": film.display_name,
+            "year": film.year,
+            "poster_url": film.poster_url,
+            "rank": rank,
+            "average_rating": stats.average_rating,
+            "rating_count": stats.rating_count,
+            "rating_delta_24h": stats.rating_delta_24h,
+            "rating_delta_7d": stats.rating_delta_7d,
+            "count_delta_24h": stats.count_delta_24h,
+            "count_delta_7d": stats.count_delta_7d,
+            "count_growth_per_day": stats.count_growth_per_day,
+            "updated_at": stats.updated_at.isoformat(),
+        } for film, stats, rank in rows],
+        "sort": sort,
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if offset + limit < total else None,
+    })
+
+
+def _requested_compare_slugs():
     # Support multiple films: ?slugs=slug1,slug2,slug3
     slugs_csv = request.args.get('slugs')
     slugs = []
@@ -394,7 +743,14 @@ def api_compare():
         b = request.args.get('b')
         if a: slugs.append(a)
         if b: slugs.append(b)
+    return slugs
 
+
+@app.route('/api/compare')
+@read_only_db
+def api_compare():
+    # Not cached: the JSON is streamed out as it is built (see cached_response)
+    slugs = _requested_compare_slugs()
     if not slugs:
         return jsonify({"error": "Provide film slugs via 'slugs' (comma-separated) or 'a'/'b'."}), 400
 
@@ -405,26 +761,39 @@ def api_compare():
         return jsonify({"error": f"Films not found: {', '.join(missing)}"}), 404
 
     film_meta = {}
-    datasets = {}
     for s in slugs:
         f = by_slug[s]
         film_meta[s] = {"slug": f.letterboxd_slug, "name": f.display_name, "year": f.year}
-        snaps = (
-            RatingSnapshot.query
-            .filter_by(film_id=f.id)
-            .order_by(RatingSnapshot.timestamp.asc())
-            .all()
-        )
-        data_map = {}
-        for snap in snaps:
-            data_map[snap.rating_count] = snap.average_rating
-        datasets[s] = [{"x": x, "y": y} for x, y in sorted(data_map.items())]
-
-    return jsonify({
-        "films": film_meta,
-        "datasets": datasets,
-        "order": slugs,
-    })
+    slug_by_id = {f.id: f.letterboxd_slug for f in films}
+    max_points = parse_max_points(request.args.get('max_points') or request.args.get('resolution'))
+    after_id, after_timestamp = parse_since(request.args.get('since'))
+    next_cursor = latest_snapshot_id(list(slug_by_id))
+    if next_cursor is None:
+        next_cursor = after_id
+
+    def generate():
+        # Every film's series comes from a single query, deduplicated in SQL and
+        # written out film by film as the rows arrive.
+        yield '{"films": ' + json.dumps(film_meta) + ', "datasets": {'
+        emitted = set()
+        if after_id is not None or after_timestamp is not None:
+            # Incremental read: clients merge these by x (rating_count), replacing older y values
+            series = iter_compare_history(list(slug_by_id), after_id, after_timestamp)
+        else:
+            series = iter_compare_chart_history(list(slug_by_id), max_points)
+        for film_id, points in series:
+            slug = slug_by_id[film_id]
+            prefix = ', ' if emitted else ''
+            emitted.add(slug)
+            yield prefix + json.dumps(slug) + ': ' + json.dumps([{"x": x, "y": y} for x, y in downsample_points(points, max_points)])
+        for slug in dict.fromkeys(slugs):
+            if slug not in emitted:
+                prefix = ', ' if emitted else ''
+                emitted.add(slug)
+                yield prefix + json.dumps(slug) + ': []'
+        yield '}, "order": ' + json.dumps(slugs) + ', "next_cursor": ' + json.dumps(next_cursor) + '}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+# background_jobs.py
+# Long admin actions (bulk imports, on-demand scrapes) run on a small per-process executor
+# instead of the request thread, so no web worker waits on outbound HTTP. Each run has a
+# background_job row that the worker updates as it goes; the admin page polls it through
+# /admin/api/jobs/<id>, so the status is visible from every web process, not just the one
+# running the job.
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete, func
+
+from models import db, BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+# Finished jobs are kept this long for the status endpoint, then pruned
+JOB_RETENTION_DAYS = 7
+# Progress is written at most this often (every write is a commit)
+PROGRESS_INTERVAL_SECONDS = 2.0
+# An unfinished job silent for this long died with its process (restart, deploy)
+STALE_JOB_MINUTES = 15
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """The process-wide job executor, created on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='job')
+        return _executor
+
+def create_job(kind, total=None, message=None):
+    """Adds a queued job row (pruning old finished ones) and commits. Returns its id."""
+    prune_jobs()
+    job = BackgroundJob(id=uuid.uuid4().hex, kind=kind, status='queued', total=total, message=message)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+def update_job(job_id, **values):
+    """Sets columns on the job row (and its updated_at) and commits."""
+    values.setdefault('updated_at', datetime.utcnow())
+    db.session.execute(update(BackgroundJob).where(BackgroundJob.id == job_id).values(**values))
+    db.session.commit()
+
+class JobProgress:
+    """Counters for a running job, written to its row at most every
+    PROGRESS_INTERVAL_SECONDS (or on flush)."""
+
+    def __init__(self, job_id, total=None):
+        self.job_id = job_id
+        self.total = total
+        self.processed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self._written_at = None
+
+    def stage(self, message, total=None):
+        """Starts a new stage: resets the counters and writes at once."""
+        if total is not None:
+            self.total = total
+        self.processed = self.succeeded = self.failed = 0
+        self.flush(message=message)
+
+    def advance(self, succeeded=True):
+        self.processed += 1
+        if succeeded:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        now = datetime.utcnow()
+        if self._written_at is None or (now - self._written_at).total_seconds() >= PROGRESS_INTERVAL_SECONDS:
+            self.flush()
+
+    def flush(self, **values):
+        if self.job_id is None:
+            return
+        self._written_at = datetime.utcnow()
+        update_job(self.job_id, total=self.total, processed=self.processed, succeeded=self.succeeded,
+                   failed=self.failed, **values)
+
+def submit_job(app, job_id, func, *args):
+    """Runs func(progress, *args) on the job executor with its own app context and session.
+    func returns a JSON-serialisable summary, stored in the row when it finishes."""
+    def run():
+        with app.app_context():
+            progress = JobProgress(job_id)
+            try:
+                update_job(job_id, status='running', started_at=datetime.utcnow())
+                summary = func(progress, *args)
+                progress.flush(status='done', finished_at=datetime.utcnow(),
+                               result=json.dumps(summary) if summary is not None else None)
+                logger.info(f"Background job {job_id} finished: {summary}")
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Background job {job_id} failed: {e}", exc_info=True)
+                try:
+                    progress.flush(status='failed', finished_at=datetime.utcnow(), message=str(e)[:255])
+                except Exception:
+                    db.session.rollback()
+            finally:
+                db.session.remove()
+    return get_executor().submit(run)
+
+def job_status(job_id):
+    """The job row as a dict for the status endpoint, or None."""
+    job = db.session.get(BackgroundJob, job_id)
+    if job is None:
+        return None
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "succeeded": job.succeeded,
+        "failed": job.failed,
+        "message": job.message,
+        "result": json.loads(job.result) if job.result else None,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+def active_job(kind, now=None):
+    """The newest queued or running job of this kind that is still alive, or None."""
+    cutoff = (now or datetime.utcnow()) - timedelta(minutes=STALE_JOB_MINUTES)
+    return db.session.execute(
+        select(BackgroundJob)
+        .where(BackgroundJob.kind == kind, BackgroundJob.status.in_(('queued', 'running')),
+               func.coalesce(BackgroundJob.updated_at, BackgroundJob.created_at) >= cutoff)
+        .order_by(BackgroundJob.created_at.desc())
+        .limit(1)
+    ).scalar()
+
+def recent_jobs(kind=None, limit=5):
+    stmt = select(BackgroundJob).order_by(BackgroundJob.created_at.desc()).limit(limit)
+    if kind:
+        stmt = stmt.where(BackgroundJob.kind == kind)
+    return db.session.execute(stmt).scalars().all()
+
+def prune_jobs(now=None):
+    """Deletes finished jobs older than JOB_RETENTION_DAYS. Does not commit."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=JOB_RETENTION_DAYS)
+    return db.session.execute(
+        delete(BackgroundJob).where(BackgroundJob.status.in_(('done', 'failed')), BackgroundJob.created_at < cutoff)
+    ).rowcount
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark rating-history query latency against snapshot table size, with and
+without the (film_id, timestamp) index. Uses a throwaway SQLite file.
+
+    python bench_history_queries.py [--sizes 10000 100000 1000000] [--films 200]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, text
+
+from models import db, Film, RatingSnapshot
+from history import rating_history_query
+
+INDEX_NAME = 'ix_rating_snapshot_film_id_timestamp'
+
+def populate(engine, films, snapshots):
+    db.metadata.create_all(engine, tables=[Film.__table__, RatingSnapshot.__table__])
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Film.__table__), [
+            {"id": i, "letterboxd_slug": f"film-{i}", "display_name": f"Film {i}",
+             "is_tracked": True, "display_order": i}
+            for i in range(1, films + 1)
+        ])
+        # Interleave films the way a scrape cycle does, so one film's rows are scattered
+        batch = []
+        for n in range(snapshots):
+            batch.append({
+                "film_id": n % films + 1,
+                "timestamp": start + timedelta(minutes=15 * (n // films)),
+                "average_rating": round(random.uniform(2.5, 4.5), 2),
+                "rating_count": n,
+            })
+            if len(batch) == 50000:
+                conn.execute(insert(RatingSnapshot.__table__), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(RatingSnapshot.__table__), batch)
+
+def time_queries(engine, films, repeats):
+    film_ids = [random.randint(1, films) for _ in range(repeats)]
+    with engine.connect() as conn:
+        started = time.perf_counter()
+        for film_id in film_ids:
+            conn.execute(rating_history_query(film_id)).all()
+        return (time.perf_counter() - started) / repeats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--films', type=int, default=200)
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'snapshots':>10} {'no index (ms)':>14} {'indexed (ms)':>13} {'speedup':>8}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine('sqlite:///' + os.path.join(tmp, 'bench.sqlite3'))
+            populate(engine, args.films, size)
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAME}"))
+                conn.execute(text("ANALYZE"))
+            unindexed = time_queries(engine, args.films, args.repeats)
+            with engine.begin() as conn:
+                conn.execute(text(f"CREATE INDEX {INDEX_NAME} ON rating_snapshot (film_id, timestamp)"))
+                conn.execute(text("ANALYZE"))
+            indexed = time_queries(engine, args.films, args.repeats)
+            engine.dispose()
+        print(f"{size:>10,} {unindexed * 1000:>14.2f} {indexed * 1000:>13.2f} {unindexed / indexed:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the film page parser backends.
+
+Save a few Letterboxd film pages first, e.g.
+    curl -s https://letterboxd.com/film/28-years-later/ -o fixtures/28-years-later.html
+then run
+    python bench_parser.py fixtures/ [--iterations 50]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+from scraper import parse_film_html
+
+BACKENDS = ['fast', 'html.parser', 'lxml']
+
+def load_fixtures(paths):
+    fixtures = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith('.html'):
+                    fixtures.append(os.path.join(path, name))
+        else:
+            fixtures.append(path)
+    return [(os.path.basename(p), open(p, 'rb').read()) for p in fixtures]
+
+def time_backend(backend, fixtures, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for name, html_bytes in fixtures:
+            parse_film_html(html_bytes, name, backend=backend)
+    return (time.perf_counter() - started) / (iterations * len(fixtures))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help="Saved film page HTML files or directories of them")
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    # Per-film log lines would dominate the timings
+    logging.disable(logging.CRITICAL)
+
+    fixtures = load_fixtures(args.paths)
+    if not fixtures:
+        print("No .html fixtures found.")
+        sys.exit(1)
+    total_kb = sum(len(h) for _, h in fixtures) / 1024
+    print(f"{len(fixtures)} fixtures ({total_kb:.0f} KiB), {args.iterations} iterations each\n")
+
+    # The fast path must agree with the full parser before its timing means anything
+    for name, html_bytes in fixtures:
+        fast = parse_film_html(html_bytes, name, backend='fast')
+        full = parse_film_html(html_bytes, name, backend='html.parser')
+        if fast != full:
+            print(f"MISMATCH in {name}:\n  fast: {fast}\n  full: {full}")
+
+    results = {}
+    for backend in BACKENDS:
+        if backend == 'lxml':
+            try:
+                import lxml  # noqa: F401
+            except ImportError:
+                print(f"{backend:>12}: skipped (not installed)")
+                continue
+        results[backend] = time_backend(backend, fixtures, args.iterations)
+
+    baseline = results['html.parser']
+    for backend, per_page in results.items():
+        print(f"{backend:>12}: {per_page * 1000:8.2f} ms/page  ({baseline / per_page:5.1f}x vs html.parser)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark /api/films/search latency against catalogue size: the old LIKE '%q%' scan
+versus the FTS5 trigram index (film_search.py). Uses a throwaway SQLite file with
+generated titles; queries are substrings, prefixes and misspellings of real titles.
+
+    python bench_search.py [--sizes 10000 100000] [--repeats 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from flask import Flask
+from sqlalchemy import insert, text
+
+from models import db, Film
+from film_search import rebuild_search_index, search_films, _like_search
+
+WORDS = (
+    "night day last first dark light red blue house road river city king queen girl boy "
+    "man woman love war summer winter dream ghost empire star shadow silent wild lost "
+    "years later before after return rise fall secret island mountain ocean fire ice "
+    "stranger memory garden machine heart song story letter game time"
+).split()
+
+def title(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+
+def misspell(rng, value):
+    # Drop, swap or replace one letter
+    i = rng.randrange(1, max(len(value) - 1, 2))
+    kind = rng.choice(('drop', 'swap', 'replace'))
+    if kind == 'drop':
+        return value[:i] + value[i + 1:]
+    if kind == 'swap' and i + 1 < len(value):
+        return value[:i] + value[i + 1] + value[i] + value[i + 2:]
+    return value[:i] + rng.choice('aeiourst') + value[i + 1:]
+
+def populate(films, rng):
+    db.metadata.create_all(db.engine, tables=[Film.__table__])
+    rows = []
+    for i in range(1, films + 1):
+        name = f"{title(rng)} {i}"
+        rows.append({"id": i, "letterboxd_slug": name.lower().replace(' ', '-'), "display_name": name,
+                     "is_tracked": i % 5 != 0, "display_order": i * 1024})
+    with db.engine.begin() as conn:
+        conn.execute(insert(Film.__table__), rows)
+        rebuild_search_index(conn)
+        conn.execute(text("ANALYZE"))
+    return [row["display_name"] for row in rows]
+
+def time_search(search, queries):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        timings.append(time.perf_counter() - started)
+        db.session.rollback()
+    timings.sort()
+    return statistics.mean(timings) * 1000, timings[int(len(timings) * 0.95) - 1] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    print(f"{'films':>8} {'query':>9} {'LIKE mean/p95 (ms)':>20} {'FTS mean/p95 (ms)':>19} {'found':>6}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = Flask(__name__)
+            app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tmp, 'bench.sqlite3')
+            db.init_app(app)
+            with app.app_context():
+                names = populate(size, rng)
+                targets = [rng.choice(names) for _ in range(args.repeats)]
+                kinds = {
+                    'substring': [name.split(' ', 1)[-1][:10] for name in targets],
+                    'prefix': [name[:6] for name in targets],
+                    'typo': [misspell(rng, name) for name in targets],
+                }
+                for kind, queries in kinds.items():
+                    like_mean, like_p95 = time_search(lambda q: _like_search(q, 50), queries)
+                    fts_mean, fts_p95 = time_search(lambda q: search_films(q, 50), queries)
+                    # How often the intended film is among the results
+                    found = sum(
+                        any(row.display_name == target for row in search_films(query, 50))
+                        for query, target in zip(queries, targets)
+                    ) / len(queries)
+                    print(f"{size:>8,} {kind:>9} {like_mean:>10.2f}/{like_p95:<9.2f} "
+                          f"{fts_mean:>9.2f}/{fts_p95:<9.2f} {found:>6.0%}")
+                db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+# cold_storage.py
+# Cold tier for rating history. `flask compact-history` moves old snapshots out of the
+# rating_snapshot table into rating_archive: one row per film per calendar month, holding
+# the month's points in the lossless columnar encoding from history_codec.py, zlib-compressed.
+# The hot table then only holds recent history for tracked films, which keeps its indexes
+# small. history.py reads both tiers, so APIs and charts see one continuous series.
+import heapq
+import logging
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, func, and_
+
+from models import db, Film, RatingSnapshot, RatingArchive
+from history_codec import encode_history, decode_history_rows
+
+logger = logging.getLogger(__name__)
+
+# Hot rows are deleted in chunks of this many ids, keeping IN lists within SQLite's limits
+DELETE_CHUNK_SIZE = 500
+
+def month_start(timestamp):
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _pack(rows):
+    return zlib.compress(encode_history(rows, precise=True), 9)
+
+def _unpack(payload):
+    return decode_history_rows(zlib.decompress(payload))
+
+def merge_histories(*histories):
+    """Merges time-ordered (timestamp, average_rating, rating_count) sequences into one."""
+    return list(heapq.merge(*histories, key=lambda row: row[0]))
+
+def fetch_archived_history(film_id, after_timestamp=None):
+    """Returns a film's archived (timestamp, average_rating, rating_count) rows, ordered by
+    time; with after_timestamp, only rows newer than it."""
+    query = (
+        select(RatingArchive.payload)
+        .where(RatingArchive.film_id == film_id)
+        .order_by(RatingArchive.month_start.asc())
+    )
+    if after_timestamp is not None:
+        query = query.where(RatingArchive.last_timestamp > after_timestamp)
+    rows = []
+    for payload in db.session.execute(query).scalars():
+        rows.extend(_unpack(payload))
+    if after_timestamp is not None:
+        rows = [row for row in rows if row[0] > after_timestamp]
+    return rows
+
+def archived_values_at(film_ids, cutoff):
+    """{film_id: (average_rating, rating_count)} of each film's latest archived point at or
+    before `cutoff`. Decodes one month per film: the latest month starting by then."""
+    if not film_ids:
+        return {}
+    latest = (
+        select(RatingArchive.film_id, func.max(RatingArchive.month_start).label('month_start'))
+        .where(RatingArchive.film_id.in_(film_ids), RatingArchive.first_timestamp <= cutoff)
+        .group_by(RatingArchive.film_id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(RatingArchive.film_id, RatingArchive.payload)
+        .join(latest, and_(RatingArchive.film_id == latest.c.film_id,
+                           RatingArchive.month_start == latest.c.month_start))
+    ).all()
+    values = {}
+    for film_id, payload in rows:
+        points = [point for point in _unpack(payload) if point[0] <= cutoff]
+        if points:
+            values[film_id] = (points[-1][1], points[-1][2])
+    return values
+
+def archived_film_ids(film_ids, after_timestamp=None):
+    """The subset of film_ids with archived history (newer than after_timestamp, if given)."""
+    if not film_ids:
+        return set()
+    query = select(RatingArchive.film_id).where(RatingArchive.film_id.in_(film_ids)).distinct()
+    if after_timestamp is not None:
+        query = query.where(RatingArchive.last_timestamp > after_timestamp)
+    return set(db.session.execute(query).scalars())
+
+def archive_bounds(film_ids):
+    """{film_id: (first_timestamp, last_timestamp, point_count)} over each film's archive."""
+    if not film_ids:
+        return {}
+    rows = db.session.execute(
+        select(
+            RatingArchive.film_id,
+            func.min(RatingArchive.first_timestamp),
+            func.max(RatingArchive.last_timestamp),
+            func.sum(RatingArchive.point_count),
+        )
+        .where(RatingArchive.film_id.in_(film_ids))
+        .group_by(RatingArchive.film_id)
+    ).all()
+    return {film_id: (first, last, int(count)) for film_id, first, last, count in rows}
+
+# --- Compaction ---
+def compaction_cutoff(film, retention_days, now=None):
+    """Snapshots older than this move to the cold tier: everything for archived (untracked)
+    films, and whole calendar months older than retention_days for tracked films."""
+    if not film.is_tracked:
+        return datetime.max
+    now = now or datetime.utcnow()
+    return month_start(now - timedelta(days=retention_days))
+
+def compact_film(film_id, before, dry_run=False):
+    """Moves the film's snapshots older than `before` into its monthly archive rows, merging
+    with months archived earlier. Does not commit. Returns (months, points) archived."""
+    rows = db.session.execute(
+        select(RatingSnapshot.id, RatingSnapshot.timestamp, RatingSnapshot.average_rating, RatingSnapshot.rating_count)
+        .where(RatingSnapshot.film_id == film_id, RatingSnapshot.timestamp < before)
+        .order_by(RatingSnapshot.timestamp.asc(), RatingSnapshot.id.asc())
+    ).all()
+    if not rows:
+        return 0, 0
+
+    by_month = {}
+    for _, timestamp, average_rating, rating_count in rows:
+        by_month.setdefault(month_start(timestamp), []).append((timestamp, average_rating, rating_count))
+    if dry_run:
+        return len(by_month), len(rows)
+
+    existing = {
+        archive.month_start: archive
+        for archive in RatingArchive.query.filter(
+            RatingArchive.film_id == film_id, RatingArchive.month_start.in_(list(by_month))
+        )
+    }
+    for month, points in by_month.items():
+        archive = existing.get(month)
+        if archive is not None:
+            points = merge_histories(_unpack(archive.payload), points)
+        else:
+            archive = RatingArchive(film_id=film_id, month_start=month)
+            db.session.add(archive)
+        archive.first_timestamp = points[0][0]
+        archive.last_timestamp = points[-1][0]
+        archive.point_count = len(points)
+        archive.payload = _pack(points)
+
+    ids = [row[0] for row in rows]
+    for i in range(0, len(ids), DELETE_CHUNK_SIZE):
+        db.session.execute(delete(RatingSnapshot).where(RatingSnapshot.id.in_(ids[i:i + DELETE_CHUNK_SIZE])))
+    return len(by_month), len(rows)
+
+def films_to_compact(retention_days, slug=None, now=None):
+    """(film_id, slug, cutoff) for every film with hot snapshots older than its cutoff."""
+    query = Film.query.order_by(Film.id.asc())
+    if slug:
+        query = query.filter_by(letterboxd_slug=slug)
+    oldest = dict(db.session.execute(
+        select(RatingSnapshot.film_id, func.min(RatingSnapshot.timestamp)).group_by(RatingSnapshot.film_id)
+    ).all())
+    plan = []
+    for film in query:
+        cutoff = compaction_cutoff(film, retention_days, now)
+        first = oldest.get(film.id)
+        if first is not None and first < cutoff:
+            plan.append((film.id, film.letterboxd_slug, cutoff))
+    return plan
@@ -5,22 +5,100 @@ from dotenv import load_dotenv
 basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv(os.path.join(basedir, '.env'), override=True)
 
+def _env_int(name, default):
+    # More robustly handle potential inline comments from the .env file
+    value = str(os.environ.get(name, default)).split('#')[0].strip()
+    return int(value)
+
+def _env_float(name, default):
+    value = str(os.environ.get(name, default)).split('#')[0].strip()
+    return float(value)
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'instance', 'letterboxd_tracker.sqlite3')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # SQLite profile (file databases only): PRAGMAs applied on every connection, a small
+    # writer pool, and a separate read-only pool for public pages and APIs
+    SQLITE_PROFILE_ENABLED = str(os.environ.get('SQLITE_PROFILE_ENABLED', 'true')).split('#')[0].strip().lower() in ('1', 'true', 'yes')
+    SQLITE_JOURNAL_MODE = (os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL').split('#')[0].strip()
+    SQLITE_SYNCHRONOUS = (os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL').split('#')[0].strip()
+    SQLITE_BUSY_TIMEOUT_MS = _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    SQLITE_CACHE_SIZE = _env_int('SQLITE_CACHE_SIZE', -20000) # Negative = KiB, so ~20 MB per connection
+    SQLITE_MMAP_SIZE = _env_int('SQLITE_MMAP_SIZE', 268435456) # 256 MB
+    SQLITE_WRITER_POOL_SIZE = _env_int('SQLITE_WRITER_POOL_SIZE', 1)
+    SQLITE_READ_POOL_SIZE = _env_int('SQLITE_READ_POOL_SIZE', 4)
     ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME') or 'admin'
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD') or 'password'
     SCHEDULER_API_ENABLED = False
+
+    # Films per page on the index (further pages load while scrolling) and the admin dashboard
+    INDEX_PAGE_SIZE = _env_int('INDEX_PAGE_SIZE', 48)
+    ADMIN_PAGE_SIZE = _env_int('ADMIN_PAGE_SIZE', 100)
     
     # Explicit Flask-APScheduler configuration
-    SCHEDULER_JOBSTORES = {"default": {"type": "memory"}}
+    # Jobs persist across restarts in their own SQLite file (kept out of the app database,
+    # whose schema is managed by Alembic)
+    SCHEDULER_JOBSTORE_URL = os.environ.get('SCHEDULER_JOBSTORE_URL') or \
+        'sqlite:///' + os.path.join(basedir, 'instance', 'scheduler_jobs.sqlite3')
+    SCHEDULER_JOBSTORES = {"default": {"type": "sqlalchemy", "url": SCHEDULER_JOBSTORE_URL}}
     SCHEDULER_EXECUTORS = {"default": {"type": "threadpool", "max_workers": 10}}
     SCHEDULER_JOB_DEFAULTS = {"coalesce": False, "max_instances": 1}
     SCHEDULER_TIMEZONE = "UTC"
     
-    # More robustly handle potential inline comments from the .env file
-    scheduler_interval_str = str(os.environ.get('SCHEDULER_INTERVAL_MINUTES', '60')).split('#')[0].strip()
-    SCHEDULER_INTERVAL_MINUTES = int(scheduler_interval_str)
+    SCHEDULER_INTERVAL_MINUTES = _env_int('SCHEDULER_INTERVAL_MINUTES', 60)
+
+    # Adaptive scheduling: SCHEDULER_INTERVAL_MINUTES is the starting interval per film,
+    # which then moves between these bounds. The job wakes every tick to scrape due films.
+    SCRAPE_MIN_INTERVAL_MINUTES = _env_int('SCRAPE_MIN_INTERVAL_MINUTES', 15)
+    SCRAPE_MAX_INTERVAL_MINUTES = _env_int('SCRAPE_MAX_INTERVAL_MINUTES', 1440)
+    SCHEDULER_TICK_MINUTES = _env_int('SCHEDULER_TICK_MINUTES', 5)
+
+    # Scrape engine: concurrent fetches share one global request budget
+    SCRAPE_MAX_WORKERS = _env_int('SCRAPE_MAX_WORKERS', 4)
+    SCRAPE_REQUESTS_PER_MINUTE = _env_int('SCRAPE_REQUESTS_PER_MINUTE', 20)
+    SCRAPE_COMMIT_BATCH_SIZE = _env_int('SCRAPE_COMMIT_BATCH_SIZE', 25)
+    # ...or after this many seconds, whichever comes first
+    SCRAPE_COMMIT_INTERVAL_SECONDS = _env_int('SCRAPE_COMMIT_INTERVAL_SECONDS', 30)
+    # Queue leases: how long a claimed batch stays reserved for one process (at least 2x its fetch time)
+    SCRAPE_LEASE_SECONDS = _env_int('SCRAPE_LEASE_SECONDS', 300)
+    # Retries of transient failures (network, 5xx, 429): attempts per film, and the jittered
+    # exponential backoff between them. A longer Retry-After defers the film instead
+    SCRAPE_RETRY_ATTEMPTS = _env_int('SCRAPE_RETRY_ATTEMPTS', 3)
+    SCRAPE_RETRY_BASE_SECONDS = _env_float('SCRAPE_RETRY_BASE_SECONDS', 2.0)
+    SCRAPE_RETRY_MAX_SECONDS = _env_float('SCRAPE_RETRY_MAX_SECONDS', 60.0)
+    # Circuit breaker: stop scraping for the cooldown once this share of the last WINDOW
+    # requests failed (with at least MIN_REQUESTS seen)
+    SCRAPE_BREAKER_WINDOW = _env_int('SCRAPE_BREAKER_WINDOW', 20)
+    SCRAPE_BREAKER_MIN_REQUESTS = _env_int('SCRAPE_BREAKER_MIN_REQUESTS', 10)
+    SCRAPE_BREAKER_FAILURE_RATE = _env_float('SCRAPE_BREAKER_FAILURE_RATE', 0.5)
+    SCRAPE_BREAKER_COOLDOWN_SECONDS = _env_float('SCRAPE_BREAKER_COOLDOWN_SECONDS', 300.0)
+
+    # Cold history tier: `flask compact-history` archives tracked films' snapshots older than
+    # this (whole months), and all snapshots of untracked films
+    SNAPSHOT_HOT_RETENTION_DAYS = _env_int('SNAPSHOT_HOT_RETENTION_DAYS', 180)
+
+    # Deadband snapshot compression (off = store every change). When on, a snapshot is only
+    # stored once the average moves by more than the tolerance or the count by the threshold
+    SNAPSHOT_COMPRESSION_ENABLED = str(os.environ.get('SNAPSHOT_COMPRESSION_ENABLED', 'false')).split('#')[0].strip().lower() in ('1', 'true', 'yes')
+    SNAPSHOT_AVERAGE_TOLERANCE = _env_float('SNAPSHOT_AVERAGE_TOLERANCE', 0.005)
+    SNAPSHOT_COUNT_THRESHOLD = _env_int('SNAPSHOT_COUNT_THRESHOLD', 100)
+
+    # Film page parser: 'fast' (byte-level extraction, soup fallback), 'html.parser' or 'lxml'
+    SCRAPER_PARSER_BACKEND = os.environ.get('SCRAPER_PARSER_BACKEND') or 'fast'
+
+    # Response cache for public pages and JSON APIs. The shared SQLite file lets every
+    # gunicorn worker and the scheduler process see the same invalidations.
+    RESPONSE_CACHE_ENABLED = str(os.environ.get('RESPONSE_CACHE_ENABLED', 'true')).split('#')[0].strip().lower() in ('1', 'true', 'yes')
+    RESPONSE_CACHE_TTL_SECONDS = _env_int('RESPONSE_CACHE_TTL_SECONDS', 300)
+    RESPONSE_CACHE_MAX_ENTRIES = _env_int('RESPONSE_CACHE_MAX_ENTRIES', 512)
+    RESPONSE_CACHE_SHARED_PATH = os.environ.get(
+        'RESPONSE_CACHE_SHARED_PATH', os.path.join(basedir, 'instance', 'response_cache.sqlite3'))
 
+    # Scrape pipeline metrics at /metrics (Prometheus text format). Each process writes its
+    # metrics to the shared directory and /metrics adds them up; empty = this process only.
+    # With a token set, /metrics needs "Authorization: Bearer <token>" instead of an admin login
+    METRICS_SHARED_DIR = os.environ.get('METRICS_SHARED_DIR', os.path.join(basedir, 'instance', 'metrics'))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
@@ -0,0 +1,62 @@
+# deadband.py
+# Optional lossy snapshot storage. With SNAPSHOT_COMPRESSION_ENABLED, a scrape only stores
+# a snapshot when the rating moved "significantly" since the last stored one: the average
+# by more than SNAPSHOT_AVERAGE_TOLERANCE, or the count by at least SNAPSHOT_COUNT_THRESHOLD.
+# Between stored points the rating is held (a step series), so the reconstruction error is
+# bounded by those two settings. Large films, whose count ticks up on every scrape while the
+# average barely moves, go from one row per scrape to one per real movement.
+from flask import current_app
+
+def deadband_settings():
+    """(average_tolerance, count_threshold) when compression is on, otherwise None
+    (every change is stored)."""
+    config = current_app.config
+    if not config.get('SNAPSHOT_COMPRESSION_ENABLED', False):
+        return None
+    return (float(config.get('SNAPSHOT_AVERAGE_TOLERANCE', 0.005)),
+            max(int(config.get('SNAPSHOT_COUNT_THRESHOLD', 100)), 1))
+
+def is_significant(previous_average, previous_count, average_rating, rating_count, tolerance, count_threshold):
+    """True if (average_rating, rating_count) is outside the deadband around the last stored point."""
+    if previous_average is None or previous_count is None:
+        return True
+    return (abs(average_rating - previous_average) > tolerance or
+            abs(rating_count - previous_count) >= count_threshold)
+
+def compress_history(rows, tolerance, count_threshold):
+    """The (timestamp, average_rating, rating_count) rows a deadband store would have kept."""
+    kept = []
+    for row in rows:
+        if not kept or is_significant(kept[-1][1], kept[-1][2], row[1], row[2], tolerance, count_threshold):
+            kept.append(row)
+    return kept
+
+def with_current_point(history, film):
+    """Step reconstruction for a compressed history: the stored change points plus the
+    film's latest scraped values, so the held series runs up to the last scrape.
+    The extra point is a real observation, just one that fell inside the deadband."""
+    if film.last_scraped_at is None or film.last_known_average_rating is None or film.last_known_rating_count is None:
+        return history
+    if history and history[-1][0] >= film.last_scraped_at:
+        return history
+    return list(history) + [(film.last_scraped_at, film.last_known_average_rating, film.last_known_rating_count)]
+
+def compression_report(rows, tolerance, count_threshold):
+    """Compresses `rows` and measures the step reconstruction against the originals.
+    Returns (kept, compression_ratio, max_average_error, max_count_error)."""
+    kept = compress_history(rows, tolerance, count_threshold)
+    max_average_error = 0.0
+    max_count_error = 0
+    held = None
+    k = 0
+    for timestamp, average_rating, rating_count in rows:
+        # Value held at this time: the latest kept point at or before it
+        while k < len(kept) and kept[k][0] <= timestamp:
+            held = kept[k]
+            k += 1
+        if held is None:
+            continue
+        max_average_error = max(max_average_error, abs(average_rating - held[1]))
+        max_count_error = max(max_count_error, abs(rating_count - held[2]))
+    ratio = len(rows) / len(kept) if kept else 1.0
+    return len(kept), ratio, max_average_error, max_count_error
@@ -0,0 +1,73 @@
+# downsample.py
+# Shape-preserving downsampling for chart series. Charts are at most a few thousand
+# pixels wide, so sending more points than that only costs payload and render time.
+from datetime import datetime
+
+MIN_POINTS = 3
+MAX_POINTS = 10000
+_EPOCH = datetime(1970, 1, 1)
+
+def parse_max_points(raw):
+    """Parses a max_points query parameter. Returns None (no downsampling) if absent or invalid."""
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        return None
+    if value <= 0:
+        return None
+    return max(MIN_POINTS, min(value, MAX_POINTS))
+
+def lttb_indices(xs, ys, threshold):
+    """Largest-Triangle-Three-Buckets: returns the indices of at most `threshold` points
+    that best preserve the visual shape of the (xs, ys) series. xs must be sorted."""
+    n = len(xs)
+    if threshold is None or threshold >= n or n <= MIN_POINTS:
+        return list(range(n))
+
+    indices = [0]
+    # First and last points are always kept; the rest are split into equal buckets
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        bucket_start = int(i * bucket_size) + 1
+        bucket_end = int((i + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the third vertex of the triangle
+        next_start = bucket_end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        ax, ay = xs[a], ys[a]
+        best_area = -1.0
+        best = bucket_start
+        for j in range(bucket_start, bucket_end):
+            # Twice the triangle area; the constant factor doesn't change the argmax
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        indices.append(best)
+        a = best
+
+    indices.append(n - 1)
+    return indices
+
+def downsample_points(points, threshold):
+    """LTTB over a list of (x, y, *extra) tuples, keeping whole tuples."""
+    if threshold is None or len(points) <= threshold:
+        return points
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return [points[i] for i in lttb_indices(xs, ys, threshold)]
+
+def downsample_history(rows, threshold):
+    """LTTB over (timestamp, average_rating, rating_count) rows, shaped by the rating line."""
+    if threshold is None or len(rows) <= threshold:
+        return rows
+    xs = [(timestamp - _EPOCH).total_seconds() for timestamp, _, _ in rows]
+    ys = [average_rating for _, average_rating, _ in rows]
+    return [rows[i] for i in lttb_indices(xs, ys, threshold)]
@@ -0,0 +1,285 @@
+# film_import.py
+# Bulk film import. Sources are a CSV (Letterboxd exports or any file with film URLs or
+# slugs), pasted URLs, Letterboxd list/watchlist URLs (fetched page by page) or a saved
+# list page. The pipeline: expand lists and boxd.it short links, drop slugs that are
+# already in the database with one IN query per chunk, fetch the film pages concurrently
+# under the shared scrape rate limit, and insert the films, their first snapshots,
+# rollups and stats in bulk, one transaction per batch. Progress goes to a
+# background_job row (see background_jobs.py).
+import csv
+import io
+import logging
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from urllib.parse import urljoin
+
+from flask import current_app
+from sqlalchemy import select, insert
+
+from models import db, Film, RatingSnapshot
+from scraper import remember_validators, SCRAPE_CHANGED, SCRAPE_FAILED
+from scrape_retry import fetch_with_retry, fetch_page_with_retry
+from scrape_budget import fetch_budget
+from rollups import record_snapshots
+from film_stats import refresh_film_stats
+from ordering import next_key, ORDER_GAP
+from scrape_schedule import interval_bounds
+from response_cache import invalidate_films, invalidate_catalog
+
+logger = logging.getLogger(__name__)
+
+# Slugs per IN (...) query, below SQLite's bound-parameter limit
+IN_CHUNK_SIZE = 500
+# A list page holds ~100 films; stop runaway pagination well past any real list
+LIST_MAX_PAGES = 100
+
+_FILM_URL = re.compile(r'letterboxd\.com/film/([^/?#\s"\',]+)', re.IGNORECASE)
+_SHORT_URL = re.compile(r'^https?://boxd\.it/[A-Za-z0-9]+/?$', re.IGNORECASE)
+_LIST_URL = re.compile(r'^(https?://(?:www\.)?letterboxd\.com/[^/\s]+/(?:list/[^/\s]+|watchlist))/?(?:page/\d+/?)?$',
+                       re.IGNORECASE)
+_SLUG = re.compile(r'^[a-z0-9][a-z0-9-]*$')
+# Poster grids on list and watchlist pages carry the slug on the poster element
+_LIST_SLUG = re.compile(r'data-(?:film|item)-slug="([^"]+)"|data-(?:target|film|item)-link="/film/([^/"]+)/')
+_NEXT_LINK = re.compile(r'<a\s[^>]*class="[^"]*\bnext\b[^"]*"[^>]*>', re.IGNORECASE)
+_HREF = re.compile(r'href="([^"]+)"')
+# CSV headers that hold a film URL or slug (Letterboxd exports use "Letterboxd URI")
+_URL_COLUMNS = {'letterboxd uri', 'letterboxd url', 'uri', 'url', 'link', 'slug'}
+
+ImportSources = namedtuple('ImportSources', ['slugs', 'short_links', 'list_urls'])
+
+def _unique(values):
+    return list(dict.fromkeys(values))
+
+def _classify(value, sources, allow_bare_slug):
+    value = value.strip()
+    if not value:
+        return
+    film = _FILM_URL.search(value)
+    if film:
+        sources.slugs.append(film.group(1).lower())
+    elif _SHORT_URL.match(value):
+        sources.short_links.append(value)
+    elif _LIST_URL.match(value):
+        sources.list_urls.append(_LIST_URL.match(value).group(1) + '/')
+    elif allow_bare_slug and _SLUG.match(value):
+        sources.slugs.append(value)
+
+def parse_list_html(page):
+    """Film slugs on a Letterboxd list or watchlist page, in list order."""
+    return _unique(a or b for a, b in _LIST_SLUG.findall(page))
+
+def _next_page_url(page, url):
+    tag = _NEXT_LINK.search(page)
+    href = _HREF.search(tag.group(0)) if tag else None
+    return urljoin(url, href.group(1)) if href else None
+
+def parse_import_text(text):
+    """Sorts pasted text or an uploaded file into an ImportSources of film slugs, boxd.it
+    short links and list URLs. A saved list page is read for its poster slugs; anything
+    else is read as CSV (one URL per line is a one-column CSV). With a known header only
+    those columns are read, and bare slugs are only accepted in single-column rows."""
+    sources = ImportSources([], [], [])
+    if '<' in text and '>' in text:
+        sources.slugs.extend(parse_list_html(text))
+        return sources
+    rows = [row for row in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in row)]
+    columns = None
+    if rows:
+        header = [cell.strip().lower() for cell in rows[0]]
+        columns = [i for i, name in enumerate(header) if name in _URL_COLUMNS] or None
+        if columns:
+            rows = rows[1:]
+    for row in rows:
+        cells = [row[i] for i in columns if i < len(row)] if columns else row
+        for cell in cells:
+            _classify(cell, sources, allow_bare_slug=bool(columns) or len(row) == 1)
+    return ImportSources(_unique(sources.slugs), _unique(sources.short_links), _unique(sources.list_urls))
+
+def merge_sources(*parts):
+    return ImportSources(*(_unique(value for part in parts for value in getattr(part, field))
+                           for field in ImportSources._fields))
+
+def fetch_list_slugs(bucket, list_url):
+    """Film slugs of a list or watchlist, following its pages, and whether every page was
+    read. A page that still fails after retries (or the open circuit breaker) ends the walk
+    with what was read so far."""
+    slugs = []
+    url = list_url
+    complete = False
+    for _ in range(LIST_MAX_PAGES):
+        result = fetch_page_with_retry(url, bucket)
+        if result.status == SCRAPE_FAILED:
+            logger.warning(f"Could not read list page {url} ({result.failure})")
+            break
+        page = result.data.text
+        found = parse_list_html(page)
+        url = _next_page_url(page, url) if found else None
+        slugs.extend(found)
+        if not url:
+            complete = True
+            break
+    logger.info(f"Read {len(slugs)} films from {list_url}{'' if complete else ' (incomplete)'}")
+    return _unique(slugs), complete
+
+def resolve_short_link(bucket, short_url):
+    """The film slug a boxd.it link redirects to, or None."""
+    result = fetch_page_with_retry(short_url, bucket, allow_redirects=True, stream=True)
+    if result.status == SCRAPE_FAILED:
+        logger.warning(f"Could not resolve {short_url} ({result.failure})")
+        return None
+    result.data.close()
+    match = _FILM_URL.search(result.data.url)
+    return match.group(1).lower() if match else None
+
+def existing_slugs(slugs):
+    """The subset of `slugs` already in the film table: one IN query per IN_CHUNK_SIZE slugs."""
+    found = set()
+    for i in range(0, len(slugs), IN_CHUNK_SIZE):
+        chunk = slugs[i:i + IN_CHUNK_SIZE]
+        found.update(db.session.execute(select(Film.letterboxd_slug).where(Film.letterboxd_slug.in_(chunk))).scalars())
+    return found
+
+def _fetch(bucket, slug):
+    # Runs on a fetch thread: HTTP only, never the DB session
+    return fetch_with_retry(slug, bucket, conditional=False)
+
+def insert_films(fetched, first_key, now=None):
+    """Inserts [(position, slug, data)] as tracked films at display_order
+    first_key + position * ORDER_GAP, with first snapshots, rollups and stats, in bulk.
+    Slugs added since the dedupe are skipped. Does not commit. Returns the slugs inserted."""
+    now = now or datetime.utcnow()
+    taken = existing_slugs([slug for _, slug, _ in fetched])
+    base, minimum, maximum = interval_bounds()
+    interval = max(minimum, min(base, maximum))
+    rows = []
+    for position, slug, data in fetched:
+        if slug in taken:
+            continue
+        taken.add(slug)
+        has_rating = 'average_rating' in data and 'rating_count' in data
+        rows.append({
+            'letterboxd_slug': slug,
+            'display_name': data.get('display_name') or slug,
+            'year': data.get('year'),
+            'director': data.get('director'),
+            'poster_url': data.get('poster_url'),
+            'is_tracked': True,
+            'display_order': first_key + position * ORDER_GAP,
+            'last_scraped_at': now,
+            'last_known_average_rating': data.get('average_rating') if has_rating else None,
+            'last_known_rating_count': data.get('rating_count') if has_rating else None,
+            'last_snapshot_average_rating': data.get('average_rating') if has_rating else None,
+            'last_snapshot_rating_count': data.get('rating_count') if has_rating else None,
+            # Just fetched, so not due again until a normal interval has passed
+            'scrape_interval_minutes': interval,
+            'next_scrape_due_at': now + timedelta(minutes=interval),
+        })
+    if not rows:
+        return []
+    ids = dict(
+        (slug, film_id) for film_id, slug in
+        db.session.execute(insert(Film).returning(Film.id, Film.letterboxd_slug), rows)
+    )
+    snapshots = [
+        {'film_id': ids[row['letterboxd_slug']], 'timestamp': now,
+         'average_rating': row['last_known_average_rating'], 'rating_count': row['last_known_rating_count']}
+        for row in rows if row['last_known_average_rating'] is not None
+    ]
+    if snapshots:
+        db.session.execute(insert(RatingSnapshot), snapshots)
+        record_snapshots(snapshots)
+        refresh_film_stats([s['film_id'] for s in snapshots], now)
+    return [row['letterboxd_slug'] for row in rows]
+
+def run_import(progress, sources):
+    """Runs a bulk import of `sources` (an ImportSources), reporting to `progress` (a
+    background_jobs.JobProgress). Films are committed every SCRAPE_COMMIT_BATCH_SIZE fetches.
+    Returns a summary dict."""
+    # Imports fetch pages too, so they take this process's share of the scrape budget
+    with fetch_budget() as bucket:
+        return _run_import(progress, sources, bucket)
+
+def _run_import(progress, sources, bucket):
+    config = current_app.config
+    max_workers = max(int(config.get('SCRAPE_MAX_WORKERS', 4)), 1)
+    batch_size = max(int(config.get('SCRAPE_COMMIT_BATCH_SIZE', 25)), 1)
+
+    slugs = list(sources.slugs)
+    unresolved = []
+    if sources.list_urls:
+        progress.stage(f"Reading {len(sources.list_urls)} lists", total=len(sources.list_urls))
+        for list_url in sources.list_urls:
+            found, complete = fetch_list_slugs(bucket, list_url)
+            slugs.extend(found)
+            progress.advance(complete)
+            # A list cut short by an error is reported too: some of its films were not read
+            if not complete:
+                unresolved.append(list_url)
+    if sources.short_links:
+        progress.stage(f"Resolving {len(sources.short_links)} boxd.it links", total=len(sources.short_links))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='import') as pool:
+            futures = {pool.submit(resolve_short_link, bucket, url): url for url in sources.short_links}
+            for future in as_completed(futures):
+                slug = future.result()
+                progress.advance(slug is not None)
+                if slug:
+                    slugs.append(slug)
+                else:
+                    unresolved.append(futures[future])
+
+    slugs = _unique(slugs)
+    present = existing_slugs(slugs)
+    new_slugs = [slug for slug in slugs if slug not in present]
+    logger.info(f"Import: {len(slugs)} films found, {len(present)} already in the database, fetching {len(new_slugs)}")
+
+    added, failed = [], []
+    progress.stage(f"Fetching {len(new_slugs)} films ({len(present)} already added)", total=len(new_slugs))
+    # Keys are reserved up front, so imported films keep their source order whatever
+    # order the fetches finish in
+    first_key = next_key()
+    pending = []
+    validators = {}
+
+    def write(pending):
+        inserted = insert_films(pending, first_key)
+        db.session.commit()
+        added.extend(inserted)
+        for slug in inserted:
+            remember_validators(slug, validators.pop(slug, None))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='import') as pool:
+        futures = {pool.submit(_fetch, bucket, slug): (position, slug) for position, slug in enumerate(new_slugs)}
+        for future in as_completed(futures):
+            position, slug = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Import fetch crashed for {slug}: {e}", exc_info=True)
+                result = None
+            ok = result is not None and result.status == SCRAPE_CHANGED and bool(result.data.get('display_name'))
+            if ok:
+                pending.append((position, slug, result.data))
+                validators[slug] = result.validators
+            else:
+                failed.append(slug)
+            if len(pending) >= batch_size:
+                write(pending)
+                pending = []
+            progress.advance(ok)
+    write(pending)
+    if added:
+        invalidate_films(added)
+        invalidate_catalog()
+    outcome = (f"{len(added)} added, {len(present)} already present, "
+               f"{len(failed)} failed, {len(unresolved)} links unresolved")
+    logger.info(f"Import finished: {outcome}")
+    progress.flush(message=outcome)
+    return {
+        "added": len(added),
+        "already_present": len(present),
+        "failed": failed[:100],
+        "failed_count": len(failed),
+        "unresolved": unresolved[:100],
+    }
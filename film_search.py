@@ -0,0 +1,212 @@
+# film_search.py
+# Film search for the autocomplete boxes. On SQLite, film names and slugs are indexed in
+# an FTS5 table with the trigram tokenizer (film_search), kept in sync with the film
+# table by triggers, so every process sees inserts and renames immediately.
+#
+# A query is split into trigrams and matched with OR, so a title still matches when a
+# few of its trigrams are wrong (typos, missing letters). bm25 picks the candidates, and
+# those are re-ranked in Python: exact and prefix matches first, then trigram similarity
+# or words within an edit or two. Queries shorter than a trigram, and databases without
+# FTS5, use a LIKE scan instead. A typo in a short word ("flim") breaks all of its
+# trigrams, so when the index finds almost nothing the first FUZZY_SCAN_ROWS films in
+# listing order are ranked as well.
+import re
+
+from sqlalchemy import select, text, or_
+
+from models import db, Film
+
+FTS_TABLE = 'film_search'
+# Candidates fetched by bm25 before re-ranking
+CANDIDATES = 200
+# Below this trigram similarity a candidate is noise, not a typo
+MIN_SIMILARITY = 0.2
+# With fewer ranked results than this, fall back to a bounded scan
+FUZZY_MIN_RESULTS = 5
+FUZZY_SCAN_ROWS = 2000
+
+SEARCH_COLUMNS = (Film.id, Film.letterboxd_slug, Film.display_name, Film.year, Film.poster_url,
+                  Film.is_tracked, Film.display_order)
+
+# Schema, shared by the migration and `flask rebuild-search-index`. Triggers on film are
+# dropped whenever SQLite recreates the table (e.g. an Alembic batch migration), so that
+# command recreates them.
+CREATE_STATEMENTS = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "display_name, letterboxd_slug, content='film', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON film BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, display_name, letterboxd_slug) "
+    "VALUES (new.id, new.display_name, new.letterboxd_slug); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON film BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, display_name, letterboxd_slug) "
+    "VALUES ('delete', old.id, old.display_name, old.letterboxd_slug); END",
+    # Scrapes rewrite display_name on every run; only real changes touch the index
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF display_name, letterboxd_slug ON film "
+    "WHEN old.display_name IS NOT new.display_name OR old.letterboxd_slug IS NOT new.letterboxd_slug BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, display_name, letterboxd_slug) "
+    "VALUES ('delete', old.id, old.display_name, old.letterboxd_slug); "
+    f"INSERT INTO {FTS_TABLE}(rowid, display_name, letterboxd_slug) "
+    "VALUES (new.id, new.display_name, new.letterboxd_slug); END",
+)
+DROP_STATEMENTS = (
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+)
+REBUILD_STATEMENT = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+def rebuild_search_index(connection):
+    """(Re)creates the FTS table and triggers and reindexes every film."""
+    for statement in CREATE_STATEMENTS:
+        connection.execute(text(statement))
+    connection.execute(text(REBUILD_STATEMENT))
+
+def has_search_index():
+    bind = db.session.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return False
+    return db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+    ).first() is not None
+
+def normalize(value):
+    """Lowercase, with punctuation and slug hyphens turned into single spaces."""
+    return ' '.join(re.sub(r'[\W_]+', ' ', (value or '').lower()).split())
+
+def _grams(normalized):
+    padded = f" {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def trigrams(value):
+    return _grams(normalize(value))
+
+def _jaccard(ta, tb):
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+def similarity(a, b):
+    """Jaccard similarity of two strings' trigram sets."""
+    return _jaccard(trigrams(a), trigrams(b))
+
+def _max_edits(word):
+    return 0 if len(word) < 3 else 1 if len(word) < 6 else 2
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (insertions, deletions, substitutions and swaps of
+    adjacent letters), or limit + 1 as soon as it must be larger than `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return current[-1]
+
+def _word_distance(typed, word, allowed):
+    # Each edit brings in at most one letter the word lacks: a cheap reject for most words
+    if len(set(typed).difference(word)) > allowed:
+        return allowed + 1
+    return min(edit_distance(typed, word, allowed), edit_distance(typed, word[:len(typed)], allowed))
+
+def typo_similarity(query, value):
+    """0-1: how closely every word of a normalized query matches a word (or the start of a
+    word) of `value`, allowing one edit in words of 3-5 letters and two in longer ones."""
+    words = value.split()
+    scores = []
+    for typed in query.split():
+        allowed = _max_edits(typed)
+        distance = min((_word_distance(typed, word, allowed) for word in words), default=allowed + 1)
+        if distance > allowed:
+            return 0.0
+        scores.append(1 - distance / len(typed))
+    return sum(scores) / len(scores) if scores else 0.0
+
+def _match_expression(query):
+    # The trigram tokenizer indexes the raw (case-folded) text, so only trigrams made of
+    # word characters are searched; quoting keeps FTS5 syntax out of user input
+    grams = {g for g in trigrams(query) if ' ' not in g}
+    return ' OR '.join('"' + g.replace('"', '""') + '"' for g in sorted(grams))
+
+def _rank(query, films):
+    normalized = normalize(query)
+    grams = _grams(normalized)
+    ranked = []
+    for film in films:
+        name, slug = normalize(film.display_name), normalize(film.letterboxd_slug)
+        if normalized in (name, slug):
+            tier = 0
+        elif name.startswith(normalized) or slug.startswith(normalized):
+            tier = 1
+        elif normalized in name or normalized in slug:
+            tier = 2
+        else:
+            tier = 3
+        # Slugs usually repeat the name (plus the year); score them only when they differ
+        score = _jaccard(grams, _grams(name))
+        if slug != name:
+            score = max(score, _jaccard(grams, _grams(slug)))
+        if tier == 3 and score < 1:
+            score = max(score, typo_similarity(normalized, name),
+                        typo_similarity(normalized, slug) if slug != name else 0.0)
+        if tier == 3 and score < MIN_SIMILARITY:
+            continue
+        ranked.append((tier, -score, not film.is_tracked, film.display_order, film))
+    ranked.sort(key=lambda item: item[:4])
+    return [item[-1] for item in ranked]
+
+def _listing(limit):
+    # Tracked first, in display order
+    return db.session.execute(
+        select(*SEARCH_COLUMNS)
+        .order_by(Film.is_tracked.desc(), Film.display_order.asc(), Film.display_name.asc())
+        .limit(limit)
+    ).all()
+
+def _like_candidates(query, limit):
+    like = f"%{query}%"
+    return db.session.execute(
+        select(*SEARCH_COLUMNS)
+        .where(or_(Film.display_name.ilike(like), Film.letterboxd_slug.ilike(like)))
+        .order_by(Film.is_tracked.desc(), Film.display_order.asc(), Film.display_name.asc())
+        .limit(limit)
+    ).all()
+
+def _like_search(query, limit):
+    return _rank(query, _like_candidates(query, limit))
+
+def _with_fuzzy_fallback(query, films):
+    # The index (or LIKE) found too little: rank the first FUZZY_SCAN_ROWS films too, so a
+    # typo that breaks every trigram of a word still finds the title
+    ranked = _rank(query, films)
+    if len(ranked) >= FUZZY_MIN_RESULTS:
+        return ranked
+    seen = {film.id for film in films}
+    return _rank(query, list(films) + [film for film in _listing(FUZZY_SCAN_ROWS) if film.id not in seen])
+
+def search_films(query, limit=50):
+    """Ranked film rows (SEARCH_COLUMNS) matching `query`; with an empty query, the first
+    `limit` films in listing order."""
+    query = (query or '').strip()
+    if not query:
+        return _listing(limit)
+    expression = _match_expression(query)
+    if not expression:
+        return _like_search(query, limit)[:limit]
+    if not has_search_index():
+        return _with_fuzzy_fallback(query, _like_candidates(query, limit))[:limit]
+
+    candidate_ids = db.session.execute(
+        text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :expression "
+             f"ORDER BY bm25({FTS_TABLE}) LIMIT :candidates"),
+        {'expression': expression, 'candidates': CANDIDATES},
+    ).scalars().all()
+    films = db.session.execute(select(*SEARCH_COLUMNS).where(Film.id.in_(candidate_ids))).all() if candidate_ids else []
+    return _with_fuzzy_fallback(query, films)[:limit]
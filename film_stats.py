@@ -0,0 +1,101 @@
+# film_stats.py
+# The film_stats table: per-film trend numbers (24h/7d deltas, count growth) kept up to
+# date at write time, so the index page and /api/leaderboard read one row per film
+# instead of scanning snapshots on every view. Rank is not stored; it is a window
+# function over film_stats at read time, which is still one pass over the films.
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, insert, func, and_
+
+from models import db, Film, RatingSnapshot, FilmStats
+from cold_storage import archived_values_at
+
+WINDOWS = {'24h': timedelta(hours=24), '7d': timedelta(days=7)}
+
+# Leaderboard sort keys; 'rank' orders by average rating like the rank itself
+SORT_COLUMNS = {
+    'rank': FilmStats.average_rating,
+    'rating': FilmStats.average_rating,
+    'delta_24h': FilmStats.rating_delta_24h,
+    'delta_7d': FilmStats.rating_delta_7d,
+    'growth': FilmStats.count_growth_per_day,
+    'count': FilmStats.rating_count,
+}
+
+def _values_at(film_ids, cutoff):
+    """{film_id: (average_rating, rating_count)} held at `cutoff`: each film's latest snapshot
+    at or before it. One grouped query on the (film_id, timestamp) index; films whose point
+    was moved to the cold tier by `flask compact-history` are looked up there."""
+    latest = (
+        select(RatingSnapshot.film_id, func.max(RatingSnapshot.timestamp).label('timestamp'))
+        .where(RatingSnapshot.film_id.in_(film_ids), RatingSnapshot.timestamp <= cutoff)
+        .group_by(RatingSnapshot.film_id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(RatingSnapshot.film_id, RatingSnapshot.average_rating, RatingSnapshot.rating_count)
+        .join(latest, and_(RatingSnapshot.film_id == latest.c.film_id, RatingSnapshot.timestamp == latest.c.timestamp))
+    ).all()
+    values = {film_id: (average_rating, rating_count) for film_id, average_rating, rating_count in rows}
+    # Compaction keeps whole recent months hot, so only films retracked after being archived
+    # (or a retention shorter than a window) reach the archive
+    missing = [film_id for film_id in film_ids if film_id not in values]
+    if missing:
+        values.update(archived_values_at(missing, cutoff))
+    return values
+
+def refresh_film_stats(film_ids, now=None):
+    """Recomputes the stats rows of these films from their latest values and the snapshots
+    held 24h/7d ago (hot or archived). Three queries plus one bulk write, whatever the number
+    of films, and one more per window when some baselines are only in the archive.
+    Does not commit; flushes first so values staged in this session are seen."""
+    film_ids = list(set(film_ids))
+    if not film_ids:
+        return
+    now = now or datetime.utcnow()
+    db.session.flush()
+    current = db.session.execute(
+        select(Film.id, Film.last_known_average_rating, Film.last_known_rating_count)
+        .where(Film.id.in_(film_ids), Film.last_known_average_rating.isnot(None),
+               Film.last_known_rating_count.isnot(None))
+    ).all()
+    if not current:
+        return
+    baselines = {name: _values_at(film_ids, now - window) for name, window in WINDOWS.items()}
+    existing = set(db.session.execute(select(FilmStats.film_id).where(FilmStats.film_id.in_(film_ids))).scalars())
+
+    updates, inserts = [], []
+    for film_id, average_rating, rating_count in current:
+        row = {'film_id': film_id, 'average_rating': average_rating, 'rating_count': rating_count, 'updated_at': now}
+        for name in WINDOWS:
+            baseline = baselines[name].get(film_id)
+            row[f'rating_delta_{name}'] = None if baseline is None else round(average_rating - baseline[0], 4)
+            row[f'count_delta_{name}'] = None if baseline is None else rating_count - baseline[1]
+        row['count_growth_per_day'] = None if row['count_delta_7d'] is None else row['count_delta_7d'] / 7
+        (updates if film_id in existing else inserts).append(row)
+    if updates:
+        db.session.execute(update(FilmStats), updates)
+    if inserts:
+        db.session.execute(insert(FilmStats), inserts)
+
+def rank_column():
+    """Rank by average rating among the selected films (ties share a rank; films without
+    a stats row, if outer-joined, rank last)."""
+    return func.rank().over(order_by=FilmStats.average_rating.desc().nulls_last()).label('rank')
+
+def leaderboard_query(sort='rank', descending=None):
+    """Tracked films with stats, ranked, sorted by `sort` in SQL. Films without a value for the
+    sort key (not enough history yet) come last."""
+    column = SORT_COLUMNS[sort]
+    if descending is None:
+        descending = sort != 'rank'
+    if sort == 'rank':
+        # Rank 1 is the highest average; "descending" rank means lowest first
+        descending = not descending
+    # The window is evaluated before ORDER BY/LIMIT, so ranks stay global when paginating
+    return (
+        select(Film, FilmStats, rank_column())
+        .join(FilmStats, FilmStats.film_id == Film.id)
+        .where(Film.is_tracked.is_(True))
+        .order_by(column.is_(None), column.desc() if descending else column.asc(), Film.display_order.asc())
+    )
@@ -0,0 +1,235 @@
+# history.py
+# Read paths for rating history. These select only the columns the charts need and
+# return plain row tuples, so long histories never hydrate full ORM objects.
+# History older than the hot retention window lives in the cold tier (cold_storage.py);
+# the reads below merge both tiers.
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import select, exists, func, and_, or_
+
+from models import db, RatingSnapshot, RatingRollup, RatingArchive
+from rollups import RESOLUTIONS, BUCKET_SECONDS
+from cold_storage import fetch_archived_history, archived_film_ids, archive_bounds, merge_histories
+
+def rating_history_query(film_id):
+    """The (timestamp, average_rating, rating_count) select for one film, ordered by time.
+    Served by the ix_rating_snapshot_film_id_timestamp index without a sort step."""
+    return (
+        select(RatingSnapshot.timestamp, RatingSnapshot.average_rating, RatingSnapshot.rating_count)
+        .where(RatingSnapshot.film_id == film_id)
+        .order_by(RatingSnapshot.timestamp.asc())
+    )
+
+def fetch_rating_history(film_id):
+    """Returns a list of (timestamp, average_rating, rating_count) rows for a film, across both tiers."""
+    hot = db.session.execute(rating_history_query(film_id)).all()
+    cold = fetch_archived_history(film_id)
+    return merge_histories(cold, hot) if cold else hot
+
+# --- Incremental ("since") reads ---
+def parse_since(raw):
+    """Parses a `since` cursor: a snapshot id, or an ISO timestamp.
+    Returns (after_id, after_timestamp); both None if absent or invalid."""
+    if not raw:
+        return None, None
+    raw = raw.strip()
+    if raw.isdigit():
+        return int(raw), None
+    try:
+        return None, datetime.fromisoformat(raw)
+    except ValueError:
+        return None, None
+
+def _since_filter(after_id, after_timestamp):
+    if after_id is not None:
+        return RatingSnapshot.id > after_id
+    if after_timestamp is not None:
+        return RatingSnapshot.timestamp > after_timestamp
+    return None
+
+def latest_snapshot_id(film_ids):
+    """The newest snapshot id across these films: the cursor for the next incremental read.
+    Read it before the data, so rows written in between are re-sent rather than skipped."""
+    if not film_ids:
+        return None
+    latest = db.session.execute(
+        select(func.max(RatingSnapshot.id)).where(RatingSnapshot.film_id.in_(film_ids))
+    ).scalar()
+    if latest is None and archived_film_ids(film_ids):
+        # Everything is archived; any hot row written later is new to the client
+        return 0
+    return latest
+
+def fetch_rating_history_since(film_id, after_id=None, after_timestamp=None):
+    """Rows newer than the cursor, ordered by time. Snapshot-id cursors only ever point at
+    hot rows (archived rows are older than any id handed out since), so only timestamp
+    cursors and full reads need the cold tier."""
+    if after_id is None and after_timestamp is None:
+        return fetch_rating_history(film_id)
+    query = rating_history_query(film_id).where(_since_filter(after_id, after_timestamp))
+    hot = db.session.execute(query).all()
+    if after_id is not None:
+        return hot
+    cold = fetch_archived_history(film_id, after_timestamp)
+    return merge_histories(cold, hot) if cold else hot
+
+def has_rating_history(film_id):
+    """True if the film has at least one snapshot in either tier. Index-only EXISTS probes."""
+    return db.session.execute(
+        select(or_(
+            exists().where(RatingSnapshot.film_id == film_id),
+            exists().where(RatingArchive.film_id == film_id),
+        ))
+    ).scalar()
+
+def compare_history_query(film_ids, after_id=None, after_timestamp=None):
+    """One select for several films' compare series: the latest average_rating for each
+    distinct rating_count, ordered by film then rating_count. With a cursor, only rows
+    newer than it are considered."""
+    conditions = [RatingSnapshot.film_id.in_(film_ids)]
+    since = _since_filter(after_id, after_timestamp)
+    if since is not None:
+        conditions.append(since)
+    ranked = (
+        select(
+            RatingSnapshot.film_id,
+            RatingSnapshot.rating_count,
+            RatingSnapshot.average_rating,
+            func.row_number().over(
+                partition_by=(RatingSnapshot.film_id, RatingSnapshot.rating_count),
+                order_by=(RatingSnapshot.timestamp.desc(), RatingSnapshot.id.desc()),
+            ).label('rank'),
+        )
+        .where(*conditions)
+        .subquery()
+    )
+    return (
+        select(ranked.c.film_id, ranked.c.rating_count, ranked.c.average_rating)
+        .where(ranked.c.rank == 1)
+        .order_by(ranked.c.film_id, ranked.c.rating_count)
+    )
+
+def iter_compare_history(film_ids, after_id=None, after_timestamp=None):
+    """Yields (film_id, [(rating_count, average_rating), ...]) per film, streaming from one query.
+    Films without snapshots (newer than the cursor) are not yielded. Films with archived
+    history get their cold points merged in, hot rows winning (they are newer)."""
+    cold_ids = set() if after_id is not None else archived_film_ids(film_ids, after_timestamp)
+    rows = db.session.execute(compare_history_query(film_ids, after_id, after_timestamp))
+    for film_id, group in groupby(rows, key=lambda row: row[0]):
+        points = [(rating_count, average_rating) for _, rating_count, average_rating in group]
+        if film_id in cold_ids:
+            cold_ids.discard(film_id)
+            points = sorted(dict(_cold_compare_points(film_id, after_timestamp) + points).items())
+        yield film_id, points
+    for film_id in sorted(cold_ids):
+        yield film_id, sorted(dict(_cold_compare_points(film_id, after_timestamp)).items())
+
+def _cold_compare_points(film_id, after_timestamp=None):
+    # Time-ordered, so building a dict from these keeps the latest average per rating_count
+    return [(rating_count, average_rating)
+            for _, average_rating, rating_count in fetch_archived_history(film_id, after_timestamp)]
+
+# --- Rollup-aware chart reads ---
+def choose_rollup_resolution(span_seconds, max_points):
+    """The coarsest rollup that still yields at least max_points buckets over the span,
+    or None if raw snapshots are needed."""
+    if not max_points:
+        return None
+    for resolution in reversed(RESOLUTIONS):
+        if span_seconds / BUCKET_SECONDS[resolution] >= max_points:
+            return resolution
+    return None
+
+def plan_history_resolutions(film_ids, max_points):
+    """Decides per film whether charts read raw snapshots (None) or a rollup resolution.
+    A rollup is only used when the film has more raw points than requested and the
+    rollup covers the film's whole history (i.e. it has been backfilled)."""
+    plan = {film_id: None for film_id in film_ids}
+    if not max_points or not film_ids:
+        return plan
+
+    bounds = db.session.execute(
+        select(
+            RatingSnapshot.film_id,
+            func.min(RatingSnapshot.timestamp),
+            func.max(RatingSnapshot.timestamp),
+            func.count(),
+        )
+        .where(RatingSnapshot.film_id.in_(film_ids))
+        .group_by(RatingSnapshot.film_id)
+    ).all()
+    # The rollups cover archived history too, so the span includes the cold tier
+    totals = archive_bounds(film_ids)
+    for film_id, first, last, count in bounds:
+        if film_id in totals:
+            cold_first, cold_last, cold_count = totals[film_id]
+            totals[film_id] = (min(first, cold_first), max(last, cold_last), count + cold_count)
+        else:
+            totals[film_id] = (first, last, count)
+    candidates = {}
+    for film_id, (first, last, count) in totals.items():
+        if count <= max_points:
+            continue
+        resolution = choose_rollup_resolution((last - first).total_seconds(), max_points)
+        if resolution:
+            candidates[film_id] = (resolution, first)
+    if not candidates:
+        return plan
+
+    coverage = db.session.execute(
+        select(RatingRollup.film_id, RatingRollup.resolution, func.min(RatingRollup.first_timestamp))
+        .where(RatingRollup.film_id.in_(list(candidates)))
+        .group_by(RatingRollup.film_id, RatingRollup.resolution)
+    ).all()
+    earliest = {(film_id, resolution): first for film_id, resolution, first in coverage}
+    for film_id, (resolution, first) in candidates.items():
+        rollup_first = earliest.get((film_id, resolution))
+        if rollup_first is not None and rollup_first <= first:
+            plan[film_id] = resolution
+    return plan
+
+def rollup_history_query(film_id, resolution):
+    """(timestamp, average_rating, rating_count) rows from a rollup: each bucket's closing values."""
+    return (
+        select(RatingRollup.last_timestamp, RatingRollup.close_average_rating, RatingRollup.close_rating_count)
+        .where(RatingRollup.film_id == film_id, RatingRollup.resolution == resolution)
+        .order_by(RatingRollup.bucket_start.asc())
+    )
+
+def fetch_chart_history(film_id, max_points=None):
+    """History rows for a chart that can draw about max_points points, read from the
+    coarsest sufficient rollup when one is available, otherwise from raw snapshots."""
+    resolution = plan_history_resolutions([film_id], max_points)[film_id]
+    if resolution:
+        return db.session.execute(rollup_history_query(film_id, resolution)).all()
+    return fetch_rating_history(film_id)
+
+def iter_compare_chart_history(film_ids, max_points=None):
+    """Like iter_compare_history, but films with long histories are read from rollups.
+    At most two queries: one for raw films and one for all rollup films."""
+    plan = plan_history_resolutions(film_ids, max_points)
+    raw_ids = [film_id for film_id, resolution in plan.items() if resolution is None]
+    if raw_ids:
+        yield from iter_compare_history(raw_ids)
+
+    by_resolution = {}
+    for film_id, resolution in plan.items():
+        if resolution:
+            by_resolution.setdefault(resolution, []).append(film_id)
+    if not by_resolution:
+        return
+    rows = db.session.execute(
+        select(RatingRollup.film_id, RatingRollup.close_rating_count, RatingRollup.close_average_rating)
+        .where(or_(*[
+            and_(RatingRollup.resolution == resolution, RatingRollup.film_id.in_(ids))
+            for resolution, ids in by_resolution.items()
+        ]))
+        .order_by(RatingRollup.film_id, RatingRollup.bucket_start)
+    )
+    for film_id, group in groupby(rows, key=lambda row: row[0]):
+        # Same "latest average per rating_count" rule as the raw query
+        data_map = {}
+        for _, rating_count, average_rating in group:
+            data_map[rating_count] = average_rating
+        yield film_id, sorted(data_map.items())
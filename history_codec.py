@@ -0,0 +1,95 @@
+# history_codec.py
+# Compact columnar encoding of a rating history, as an alternative to JSON for large series.
+#
+# Layout (all little-endian):
+#   4 bytes   magic b'LBH1'
+#   uint32    n, the number of points
+#   int64     next_cursor (-1 if none)
+#   int64[n]  timestamps in epoch seconds, delta-encoded: the first is absolute, the
+#             rest are differences from the previous point
+#   float32[n] average ratings
+#   uint32[n] rating counts
+# The 16-byte header keeps every column naturally aligned, so a browser can view the
+# columns as typed arrays without copying.
+#
+# Magic b'LBH2' is a lossless variant for archival, with the same layout except for
+# microsecond timestamps and float64 averages.
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+
+from flask import request
+
+HISTORY_BINARY_MIMETYPE = 'application/vnd.letterboxd-tracker.history'
+MAGIC = b'LBH1'
+PRECISE_MAGIC = b'LBH2'
+_HEADER = struct.Struct('<4sIq')
+_EPOCH = datetime(1970, 1, 1)
+
+def wants_binary():
+    """True if the client asked for the binary encoding, via ?format=binary or the Accept header.
+    JSON stays the default."""
+    if request.args.get('format') == 'binary':
+        return True
+    # Ties go to the first match, so "*/*" still gets JSON
+    return request.accept_mimetypes.best_match(['application/json', HISTORY_BINARY_MIMETYPE]) == HISTORY_BINARY_MIMETYPE
+
+def _little_endian(column):
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+def encode_history(rows, next_cursor=None, precise=False):
+    """Encodes (timestamp, average_rating, rating_count) rows into the binary layout.
+    precise=True writes the lossless b'LBH2' variant (for archival rather than charts)."""
+    scale = 1000000 if precise else 1
+    timestamps = array('q')
+    previous = 0
+    for timestamp, _, _ in rows:
+        delta = timestamp - _EPOCH
+        ticks = (delta.days * 86400 + delta.seconds) * scale + (delta.microseconds if precise else 0)
+        timestamps.append(ticks - previous)
+        previous = ticks
+    averages = array('d' if precise else 'f', (average_rating for _, average_rating, _ in rows))
+    counts = array('I', (rating_count for _, _, rating_count in rows))
+    header = _HEADER.pack(PRECISE_MAGIC if precise else MAGIC, len(rows), -1 if next_cursor is None else next_cursor)
+    return header + _little_endian(timestamps) + _little_endian(averages) + _little_endian(counts)
+
+def _decode_columns(payload):
+    magic, n, next_cursor = _HEADER.unpack_from(payload)
+    if magic not in (MAGIC, PRECISE_MAGIC):
+        raise ValueError("Not a rating history payload")
+    offset = _HEADER.size
+    columns = []
+    for typecode in ('q', 'd' if magic == PRECISE_MAGIC else 'f', 'I'):
+        column = array(typecode)
+        size = column.itemsize * n
+        column.frombytes(payload[offset:offset + size])
+        if sys.byteorder != 'little':
+            column.byteswap()
+        columns.append(column)
+        offset += size
+    deltas, averages, counts = columns
+    ticks = []
+    running = 0
+    for delta in deltas:
+        running += delta
+        ticks.append(running)
+    return magic, ticks, averages, counts, (None if next_cursor < 0 else next_cursor)
+
+def decode_history(payload):
+    """Decodes the binary layout back into ([epoch_seconds], [average_rating], [rating_count], next_cursor)."""
+    magic, ticks, averages, counts, next_cursor = _decode_columns(payload)
+    if magic == PRECISE_MAGIC:
+        ticks = [t / 1000000 for t in ticks]
+    return ticks, list(averages), list(counts), next_cursor
+
+def decode_history_rows(payload):
+    """Decodes a payload into (timestamp, average_rating, rating_count) rows with naive UTC datetimes."""
+    magic, ticks, averages, counts, _ = _decode_columns(payload)
+    unit = 'microseconds' if magic == PRECISE_MAGIC else 'seconds'
+    return [
+        (_EPOCH + timedelta(**{unit: t}), average_rating, rating_count)
+        for t, average_rating, rating_count in zip(ticks, averages, counts)
+    ]
@@ -0,0 +1,384 @@
+# metrics.py
+# In-process metrics for the scrape pipeline (counters, gauges and histograms), exposed in
+# the Prometheus text format at /metrics. Scrapes run in several processes (gunicorn
+# workers, run_scheduler.py, `flask scrape-worker`), so each of them also writes a snapshot
+# of its metrics to METRICS_SHARED_DIR every few seconds, and /metrics adds up the
+# snapshots of every process. Counters and histograms are summed; gauges take the largest
+# value among live processes. When a process is gone, its counters are folded into a base
+# file, so the totals Prometheus sees never go down.
+import atexit
+import fcntl
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Each exporting process rewrites its snapshot this often
+EXPORT_INTERVAL_SECONDS = 10.0
+# A snapshot not rewritten for this long belongs to a process that is gone (or hung)
+STALE_SNAPSHOT_SECONDS = 600
+# Totals of finished processes, so counters stay monotonic (see _fold_finished)
+BASE_FILE = 'base.json'
+LOCK_FILE = '.lock'
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+    def _copy(self, value):
+        return value
+
+    def _reset(self):
+        with self._lock:
+            self._values = {}
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not cumulative) counts; the last slot is +Inf
+                state = self._values[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    break
+            else:
+                i = len(self.buckets)
+            state['counts'][i] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the `with` block, in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _copy(self, value):
+        return {'counts': list(value['counts']), 'sum': value['sum'], 'count': value['count']}
+
+REGISTRY = {}
+
+def _register(metric):
+    REGISTRY[metric.name] = metric
+    return metric
+
+def counter(name, help_text, labelnames=()):
+    return _register(Counter(name, help_text, labelnames))
+
+def gauge(name, help_text, labelnames=()):
+    return _register(Gauge(name, help_text, labelnames))
+
+def histogram(name, help_text, buckets, labelnames=()):
+    return _register(Histogram(name, help_text, buckets, labelnames))
+
+# --- Scrape pipeline metrics ---
+FETCH_SECONDS = histogram(
+    'letterboxd_scrape_fetch_seconds', "HTTP time per film page request, including failed ones.",
+    (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30))
+FETCH_BYTES = counter(
+    'letterboxd_scrape_downloaded_bytes_total', "Film page bytes downloaded (304 responses have none).")
+PARSE_SECONDS = histogram(
+    'letterboxd_scrape_parse_seconds', "Time to parse a downloaded film page.",
+    (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+RATE_LIMIT_WAIT_SECONDS = histogram(
+    'letterboxd_scrape_rate_limit_wait_seconds', "Time a fetch waited for a rate limiter token.",
+    (0, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+RESULTS = counter(
+    'letterboxd_scrape_results_total',
+    "Film scrapes by outcome: changed, unchanged, or the failure class once retries ran out.",
+    ('outcome',))
+RETRIES = counter(
+    'letterboxd_scrape_retries_total', "Fetches retried after a transient failure, by failure class.", ('failure',))
+SNAPSHOT_DECISIONS = counter(
+    'letterboxd_scrape_snapshots_total',
+    "Successful scrapes that stored a snapshot (stored) or found the rating unchanged (skipped).",
+    ('decision',))
+DB_WRITE_SECONDS = histogram(
+    'letterboxd_scrape_db_write_seconds', "Time to store one batch of scrape results (one transaction).",
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+DB_WRITE_ROWS = counter(
+    'letterboxd_scrape_db_written_results_total', "Scrape results stored by the bulk writer.")
+CYCLE_SECONDS = histogram(
+    'letterboxd_scrape_cycle_seconds', "Duration of a pass over the scrape queue that scraped at least one film.",
+    (5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200))
+CYCLE_FILMS = counter(
+    'letterboxd_scrape_cycle_films_total', "Films processed by scrape queue passes.")
+BREAKER_STATE = gauge(
+    'letterboxd_scrape_circuit_breaker_state', "Circuit breaker state: 0 closed, 1 half-open, 2 open.")
+
+# --- Cross-process snapshots ---
+_shared_dir = None
+_exporting = False
+_export_lock = threading.Lock()
+_process_id = None
+_exported = False
+
+def init_metrics(app):
+    """Configures the shared snapshot directory (METRICS_SHARED_DIR; empty = this process only).
+    Only reading is set up here; processes that scrape call enable_export()."""
+    global _shared_dir
+    _shared_dir = app.config.get('METRICS_SHARED_DIR') or None
+
+def enable_export():
+    """Makes this process publish its metrics: a daemon thread rewrites its snapshot every
+    EXPORT_INTERVAL_SECONDS (and once more at exit). Called by the web app (wsgi.py), the
+    scheduler and scrape workers, not by one-off CLI commands."""
+    global _exporting
+    if _shared_dir is None or _exporting:
+        return
+    _exporting = True
+    _start_exporter()
+    atexit.register(export)
+    # A forked child (gunicorn --preload) has no exporter thread, and must not report
+    # the parent's counts as its own
+    os.register_at_fork(after_in_child=_restart_in_child)
+
+def _new_process_id():
+    global _process_id, _exported
+    # host-pid plus a random part: a later process that reuses the pid gets a file of its own
+    _process_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    _exported = False
+
+def _start_exporter():
+    _new_process_id()
+    threading.Thread(target=_export_loop, name='metrics-export', daemon=True).start()
+
+def _restart_in_child():
+    global _export_lock
+    _export_lock = threading.Lock()
+    for metric in REGISTRY.values():
+        # Locks held by other threads at fork time would never be released here
+        metric._lock = threading.Lock()
+        metric._reset()
+    _start_exporter()
+
+def _export_loop():
+    pid = os.getpid()
+    while os.getpid() == pid:
+        time.sleep(EXPORT_INTERVAL_SECONDS)
+        export()
+
+def snapshot():
+    """This process's metrics as a JSON-serialisable dict."""
+    return {
+        name: {'type': metric.kind, 'help': metric.help, 'labelnames': list(metric.labelnames),
+               'buckets': list(getattr(metric, 'buckets', ())), 'samples': metric.samples()}
+        for name, metric in REGISTRY.items()
+    }
+
+def _write_json(path, payload):
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(temp_path, path) # Readers never see a half-written file
+
+def export():
+    """Writes this process's snapshot to the shared directory (if enable_export() was called)."""
+    if not _exporting or _process_id is None:
+        return
+    global _exported
+    try:
+        with _export_lock:
+            if _exported and not os.path.exists(os.path.join(_shared_dir, f"{_process_id}.json")):
+                # Folded while this process was hung past STALE_SNAPSHOT_SECONDS: what it
+                # reported is in the base now, so start over under a new name
+                for metric in REGISTRY.values():
+                    if metric.kind != 'gauge':
+                        metric._reset()
+                _new_process_id()
+            path = os.path.join(_shared_dir, f"{_process_id}.json")
+            payload = {'host': socket.gethostname(), 'pid': os.getpid(), 'written_at': time.time(),
+                       'metrics': snapshot()}
+            os.makedirs(_shared_dir, exist_ok=True)
+            _write_json(path, payload)
+            _exported = True
+    except OSError as e:
+        logger.warning(f"Could not write metrics snapshot {path}: {e}")
+
+def _alive(host, pid):
+    if host != socket.gethostname():
+        return True # Can't tell; trust the file's age instead
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _fold_finished(finished):
+    """Adds the counters and histograms of finished processes' snapshots to BASE_FILE and
+    deletes the snapshots, so totals never go down when a process goes away. The names of
+    folded files are kept until the files are gone, so a crash between the two steps
+    cannot fold a snapshot twice. Returns the base metrics."""
+    base_path = os.path.join(_shared_dir, BASE_FILE)
+    with open(os.path.join(_shared_dir, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX) # One folder at a time, across processes
+        base = _read_json(base_path) or {'metrics': {}, 'folded': []}
+        folded = [name for name in base['folded'] if os.path.exists(os.path.join(_shared_dir, name))]
+        changed = len(folded) != len(base['folded'])
+        for name, payload in finished:
+            if name in folded:
+                continue
+            counters = {n: m for n, m in payload['metrics'].items() if m['type'] != 'gauge'}
+            base['metrics'] = _merge([base['metrics'], counters], as_lists=True)
+            folded.append(name)
+            changed = True
+        base['folded'] = folded
+        if changed:
+            _write_json(base_path, base)
+        for name in folded:
+            try:
+                os.remove(os.path.join(_shared_dir, name))
+            except OSError:
+                pass
+    return base['metrics']
+
+def _shared_snapshots():
+    """The base totals of finished processes plus the snapshots of the other live ones.
+    Snapshots of processes that exited (or that stopped writing STALE_SNAPSHOT_SECONDS
+    ago) are folded into the base first."""
+    if _shared_dir is None or not os.path.isdir(_shared_dir):
+        return []
+    own = f"{_process_id}.json" if _exporting else None
+    live, finished = [], []
+    now = time.time()
+    for entry in os.scandir(_shared_dir):
+        if not entry.name.endswith('.json') or entry.name in (own, BASE_FILE):
+            continue
+        payload = _read_json(entry.path)
+        if payload is None:
+            continue
+        if now - payload.get('written_at', 0) > STALE_SNAPSHOT_SECONDS or not _alive(payload.get('host'), payload.get('pid', 0)):
+            finished.append((entry.name, payload))
+        else:
+            live.append(payload['metrics'])
+    try:
+        base = _fold_finished(finished)
+    except OSError as e:
+        logger.warning(f"Could not fold finished metrics snapshots: {e}")
+        base = (_read_json(os.path.join(_shared_dir, BASE_FILE)) or {}).get('metrics', {})
+    return [base] + live
+
+def _merge(snapshots, as_lists=False):
+    """Adds up snapshots (counters and histograms summed, gauges at their max). Samples
+    are keyed by label tuple, or kept as [labels, value] lists with as_lists=True."""
+    merged = {}
+    for metrics in snapshots:
+        for name, metric in metrics.items():
+            target = merged.setdefault(name, dict(metric, samples={}))
+            for labels, value in metric['samples']:
+                key = tuple(labels)
+                current = target['samples'].get(key)
+                if current is None:
+                    target['samples'][key] = value
+                elif metric['type'] == 'histogram':
+                    target['samples'][key] = {
+                        'counts': [a + b for a, b in zip(current['counts'], value['counts'])],
+                        'sum': current['sum'] + value['sum'],
+                        'count': current['count'] + value['count'],
+                    }
+                elif metric['type'] == 'gauge':
+                    target['samples'][key] = max(current, value)
+                else:
+                    target['samples'][key] = current + value
+    if as_lists:
+        for metric in merged.values():
+            metric['samples'] = [[list(key), value] for key, value in metric['samples'].items()]
+    return merged
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+def render(extra_gauges=None):
+    """Prometheus text exposition of every process's metrics, plus `extra_gauges`
+    ({name: (help, value)}) computed by the caller (e.g. queue depth)."""
+    export()
+    merged = _merge([snapshot()] + _shared_snapshots())
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        names = metric['labelnames']
+        for labels, value in sorted(metric['samples'].items()):
+            if metric['type'] == 'histogram':
+                cumulative = 0
+                for bound, count in zip(list(metric['buckets']) + [math.inf], value['counts']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(names, labels, ('le', _format_value(bound)))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(names, labels)} {_format_value(value['sum'])}")
+                lines.append(f"{name}_count{_labels(names, labels)} {value['count']}")
+            else:
+                lines.append(f"{name}{_labels(names, labels)} {_format_value(value)}")
+    for name, (help_text, value) in sorted((extra_gauges or {}).items()):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
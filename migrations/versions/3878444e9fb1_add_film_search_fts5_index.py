@@ -0,0 +1,57 @@
+"""Add film_search FTS5 index
+
+Revision ID: 3878444e9fb1
+Revises: de2198b77a27
+Create Date: 2026-10-18 11:48:23.484867
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3878444e9fb1'
+down_revision = 'de2198b77a27'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of film_search.py's schema at this revision. The virtual table and its
+# triggers are SQLite-only; other databases keep using the LIKE search.
+CREATE_STATEMENTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS film_search USING fts5("
+    "display_name, letterboxd_slug, content='film', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS film_search_ai AFTER INSERT ON film BEGIN "
+    "INSERT INTO film_search(rowid, display_name, letterboxd_slug) "
+    "VALUES (new.id, new.display_name, new.letterboxd_slug); END",
+    "CREATE TRIGGER IF NOT EXISTS film_search_ad AFTER DELETE ON film BEGIN "
+    "INSERT INTO film_search(film_search, rowid, display_name, letterboxd_slug) "
+    "VALUES ('delete', old.id, old.display_name, old.letterboxd_slug); END",
+    "CREATE TRIGGER IF NOT EXISTS film_search_au AFTER UPDATE OF display_name, letterboxd_slug ON film "
+    "WHEN old.display_name IS NOT new.display_name OR old.letterboxd_slug IS NOT new.letterboxd_slug BEGIN "
+    "INSERT INTO film_search(film_search, rowid, display_name, letterboxd_slug) "
+    "VALUES ('delete', old.id, old.display_name, old.letterboxd_slug); "
+    "INSERT INTO film_search(rowid, display_name, letterboxd_slug) "
+    "VALUES (new.id, new.display_name, new.letterboxd_slug); END",
+    "INSERT INTO film_search(film_search) VALUES ('rebuild')",
+)
+DROP_STATEMENTS = (
+    "DROP TRIGGER IF EXISTS film_search_au",
+    "DROP TRIGGER IF EXISTS film_search_ad",
+    "DROP TRIGGER IF EXISTS film_search_ai",
+    "DROP TABLE IF EXISTS film_search",
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in CREATE_STATEMENTS:
+        op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in DROP_STATEMENTS:
+        op.execute(statement)
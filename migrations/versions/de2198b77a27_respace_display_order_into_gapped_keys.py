@@ -0,0 +1,41 @@
+"""Respace display_order into gapped keys
+
+Revision ID: de2198b77a27
+Revises: 28ae2b779782
+Create Date: 2026-10-18 11:46:20.292724
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'de2198b77a27'
+down_revision = '28ae2b779782'
+branch_labels = None
+depends_on = None
+
+
+# Matches ordering.ORDER_GAP
+ORDER_GAP = 1024
+
+
+def _respace(gap):
+    # Positions are read first and written after: an UPDATE whose subquery counts rows of
+    # the table being updated would see half-renumbered rows on SQLite
+    connection = op.get_bind()
+    ids = [row[0] for row in connection.execute(sa.text("SELECT id FROM film ORDER BY display_order, id"))]
+    if ids:
+        connection.execute(
+            sa.text("UPDATE film SET display_order = :display_order WHERE id = :id"),
+            [{"id": film_id, "display_order": (i + 1) * gap} for i, film_id in enumerate(ids)],
+        )
+
+
+def upgrade():
+    # Films are spaced ORDER_GAP apart so a move only rewrites the moved film
+    _respace(ORDER_GAP)
+
+
+def downgrade():
+    _respace(1)
@@ -3,9 +3,17 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
-db = SQLAlchemy()
+from sqlite_profile import RoutingSession
+
+# RoutingSession sends queries from @read_only_db views to the read-only SQLite pool
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class Film(db.Model):
+    # Film lists page through display order by (display_order, id) keyset cursors
+    __table_args__ = (
+        db.Index('ix_film_display_order_id', 'display_order', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     letterboxd_slug = db.Column(db.String(200), unique=True, nullable=False) # e.g., "28-years-later"
     display_name = db.Column(db.String(255), nullable=False) # e.g., "28 Years Later"
@@ -18,13 +26,28 @@ class Film(db.Model):
     last_known_average_rating = db.Column(db.Float, nullable=True) # For quick display
     last_known_rating_count = db.Column(db.Integer, nullable=True) # For quick display
     display_order = db.Column(db.Integer, nullable=False, server_default='0') # For custom sorting
+    # Adaptive scheduling: each film is re-scraped on its own interval (see scrape_schedule.py)
+    scrape_interval_minutes = db.Column(db.Integer, nullable=True)
+    next_scrape_due_at = db.Column(db.DateTime, nullable=True, index=True) # NULL = due now
+    # Values of the newest stored snapshot: the reference point for deadband compression (see deadband.py)
+    last_snapshot_average_rating = db.Column(db.Float, nullable=True)
+    last_snapshot_rating_count = db.Column(db.Integer, nullable=True)
 
     ratings = db.relationship('RatingSnapshot', backref='film', lazy=True, cascade="all, delete-orphan")
+    rollups = db.relationship('RatingRollup', backref='film', lazy=True, cascade="all, delete-orphan")
+    archives = db.relationship('RatingArchive', backref='film', lazy=True, cascade="all, delete-orphan")
+    queue_entry = db.relationship('ScrapeQueueEntry', backref='film', lazy=True, uselist=False, cascade="all, delete-orphan")
+    stats = db.relationship('FilmStats', backref='film', lazy=True, uselist=False, cascade="all, delete-orphan")
 
     def __repr__(self):
         return f'<Film {self.display_name}>'
 
 class RatingSnapshot(db.Model):
+    # History reads always filter by film and order by time
+    __table_args__ = (
+        db.Index('ix_rating_snapshot_film_id_timestamp', 'film_id', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     film_id = db.Column(db.Integer, db.ForeignKey('film.id'), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -34,4 +57,122 @@ class RatingSnapshot(db.Model):
     def __repr__(self):
         return f'<RatingSnapshot {self.film_id} @ {self.timestamp}: {self.average_rating}>'
 
-    
\ No newline at end of file
+    
+
+class RatingRollup(db.Model):
+    """Per-film OHLC-style aggregate of RatingSnapshot rows over one hour, day or week."""
+    __table_args__ = (
+        db.UniqueConstraint('film_id', 'resolution', 'bucket_start', name='uq_rating_rollup_bucket'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    film_id = db.Column(db.Integer, db.ForeignKey('film.id'), nullable=False)
+    resolution = db.Column(db.String(8), nullable=False) # 'hour', 'day' or 'week'
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    first_timestamp = db.Column(db.DateTime, nullable=False) # Earliest snapshot in the bucket
+    last_timestamp = db.Column(db.DateTime, nullable=False) # Latest snapshot in the bucket
+    open_average_rating = db.Column(db.Float, nullable=False)
+    close_average_rating = db.Column(db.Float, nullable=False)
+    min_average_rating = db.Column(db.Float, nullable=False)
+    max_average_rating = db.Column(db.Float, nullable=False)
+    open_rating_count = db.Column(db.Integer, nullable=False)
+    close_rating_count = db.Column(db.Integer, nullable=False)
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def rating_count_delta(self):
+        return self.close_rating_count - self.open_rating_count
+
+    def __repr__(self):
+        return f'<RatingRollup {self.film_id} {self.resolution} @ {self.bucket_start}: {self.close_average_rating}>'
+
+class ScrapeQueueEntry(db.Model):
+    """A film waiting to be scraped. Workers claim entries by setting a lease; entries whose
+    lease ran out (the worker crashed) can be claimed again. See scrape_queue.py."""
+    __tablename__ = 'scrape_queue'
+    __table_args__ = (
+        db.Index('ix_scrape_queue_due_at_lease_until', 'due_at', 'lease_until'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    film_id = db.Column(db.Integer, db.ForeignKey('film.id'), nullable=False, unique=True)
+    due_at = db.Column(db.DateTime, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Claims so far
+    lease_until = db.Column(db.DateTime, nullable=True) # NULL = not claimed
+    leased_by = db.Column(db.String(64), nullable=True) # Claim token of the worker holding the lease
+    enqueued_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<ScrapeQueueEntry film={self.film_id} due={self.due_at} lease={self.lease_until}>'
+
+class ScrapeWorker(db.Model):
+    """Heartbeat row for a process that is fetching Letterboxd pages (scrape workers, the
+    scheduler, admin scrapes and imports). Processes that reported recently share the global
+    request budget between them (see scrape_budget.py)."""
+    id = db.Column(db.String(64), primary_key=True) # host:pid
+    hostname = db.Column(db.String(255), nullable=False)
+    pid = db.Column(db.Integer, nullable=False)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_heartbeat_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    films_scraped = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f'<ScrapeWorker {self.id} @ {self.last_heartbeat_at}>'
+
+class RatingArchive(db.Model):
+    """Cold storage: one film's snapshots for one calendar month, moved out of rating_snapshot
+    by `flask compact-history`. `payload` is the zlib-compressed columnar encoding from
+    history_codec.py. See cold_storage.py."""
+    __table_args__ = (
+        db.UniqueConstraint('film_id', 'month_start', name='uq_rating_archive_film_month'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    film_id = db.Column(db.Integer, db.ForeignKey('film.id'), nullable=False)
+    month_start = db.Column(db.DateTime, nullable=False)
+    first_timestamp = db.Column(db.DateTime, nullable=False)
+    last_timestamp = db.Column(db.DateTime, nullable=False)
+    point_count = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f'<RatingArchive {self.film_id} {self.month_start:%Y-%m}: {self.point_count} points>'
+
+class FilmStats(db.Model):
+    """Materialized trend stats for the index page and leaderboard, one row per film.
+    Refreshed whenever the film is scraped (see film_stats.py), so reads never scan snapshots.
+    Deltas compare the latest values with those held 24 hours / 7 days earlier; they are
+    NULL until the film has that much history."""
+    film_id = db.Column(db.Integer, db.ForeignKey('film.id'), primary_key=True)
+    average_rating = db.Column(db.Float, nullable=False, index=True)
+    rating_count = db.Column(db.Integer, nullable=False)
+    rating_delta_24h = db.Column(db.Float, nullable=True, index=True)
+    rating_delta_7d = db.Column(db.Float, nullable=True, index=True)
+    count_delta_24h = db.Column(db.Integer, nullable=True)
+    count_delta_7d = db.Column(db.Integer, nullable=True)
+    count_growth_per_day = db.Column(db.Float, nullable=True, index=True) # Average new ratings per day over 7 days
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<FilmStats {self.film_id}: {self.average_rating} (24h delta {self.rating_delta_24h})>'
+
+class BackgroundJob(db.Model):
+    """A long-running admin action (e.g. a bulk import) run off the request thread. The
+    worker updates the progress counters as it goes, and the admin page polls the row
+    (see background_jobs.py), so any web process can report on it."""
+    id = db.Column(db.String(32), primary_key=True) # uuid4 hex
+    kind = db.Column(db.String(32), nullable=False) # e.g. 'import'
+    status = db.Column(db.String(16), nullable=False, default='queued') # queued, running, done, failed
+    total = db.Column(db.Integer, nullable=True) # Items to process, once known
+    processed = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    succeeded = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    failed = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    message = db.Column(db.String(255), nullable=True) # Current stage, or the error
+    result = db.Column(db.Text, nullable=True) # JSON summary once finished
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True) # Last progress write; a long-silent running job is dead
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.kind} {self.id}: {self.status} {self.processed}/{self.total}>'
@@ -0,0 +1,147 @@
+# ordering.py
+# Film display order with gapped keys. Films are spaced ORDER_GAP apart in display_order,
+# so a move writes one row: the moved film gets a key between its new neighbours. When two
+# neighbours end up adjacent (no integer between them), the whole list is respaced in a
+# single UPDATE, either on the spot (if a move needs the room) or in the background once
+# a gap gets tight.
+import logging
+import threading
+
+from sqlalchemy import select, update, case, func
+
+from models import db, Film
+
+logger = logging.getLogger(__name__)
+
+ORDER_GAP = 1024
+# Respace in the background once a move leaves a gap smaller than this
+MIN_GAP = 4
+
+def key_between(lower, upper):
+    """An integer key strictly between lower and upper (either may be None for "open"),
+    or None if they are adjacent."""
+    if lower is None and upper is None:
+        return ORDER_GAP
+    if lower is None:
+        return upper - ORDER_GAP
+    if upper is None:
+        return lower + ORDER_GAP
+    if upper - lower < 2:
+        return None
+    return (lower + upper) // 2
+
+def _ordered_keys():
+    return (Film.display_order, Film.id)
+
+def _neighbour_keys(film, direction, count):
+    """display_order keys of the `count` films just above ('up') or below ('down') `film`."""
+    order, film_id = _ordered_keys()
+    if direction == 'up':
+        condition = (order < film.display_order) | ((order == film.display_order) & (film_id < film.id))
+        sort = (order.desc(), film_id.desc())
+    else:
+        condition = (order > film.display_order) | ((order == film.display_order) & (film_id > film.id))
+        sort = (order.asc(), film_id.asc())
+    return db.session.execute(select(order).where(condition).order_by(*sort).limit(count)).scalars().all()
+
+def rebalance():
+    """Respaces every film ORDER_GAP apart, keeping the current order, in one UPDATE.
+    Does not commit. Returns the number of films."""
+    ids = db.session.execute(select(Film.id).order_by(*_ordered_keys())).scalars().all()
+    if ids:
+        db.session.execute(
+            update(Film)
+            .where(Film.id.in_(ids))
+            .values(display_order=case({film_id: (i + 1) * ORDER_GAP for i, film_id in enumerate(ids)}, value=Film.id))
+            .execution_options(synchronize_session=False)
+        )
+    db.session.expire_all()
+    return len(ids)
+
+def _place(film, lower, upper):
+    # Sets the film's key between lower and upper; respaces first if they are adjacent.
+    # Returns True if the remaining gaps are tight enough to warrant a background respacing.
+    key = key_between(lower, upper)
+    if key is None:
+        logger.info("Display order keys exhausted; respacing all films")
+        rebalance()
+        return None
+    film.display_order = key
+    return (lower is not None and key - lower < MIN_GAP) or (upper is not None and upper - key < MIN_GAP)
+
+def move(film, direction):
+    """Moves `film` one place 'up' or 'down', or to the 'top' or 'bottom'. Writes one row
+    (plus a respacing in the rare case there is no room). Does not commit.
+    Returns (moved, tight): tight means a background rebalance is advisable."""
+    for _ in range(2):
+        if direction in ('up', 'down'):
+            neighbours = _neighbour_keys(film, direction, 2)
+            if not neighbours:
+                return False, False
+            # The new slot lies past the adjacent film: between it and the one after it
+            near, far = neighbours[0], (neighbours[1] if len(neighbours) > 1 else None)
+            lower, upper = (far, near) if direction == 'up' else (near, far)
+        elif direction == 'top':
+            if not _neighbour_keys(film, 'up', 1):
+                return False, False
+            lower, upper = None, db.session.execute(select(func.min(Film.display_order))).scalar()
+        elif direction == 'bottom':
+            if not _neighbour_keys(film, 'down', 1):
+                return False, False
+            lower, upper = db.session.execute(select(func.max(Film.display_order))).scalar(), None
+        else:
+            raise ValueError(f"Unknown move direction: {direction}")
+        tight = _place(film, lower, upper)
+        if tight is not None:
+            return True, tight
+        # Respaced: the film's own key was rewritten too, so reload it and retry once
+        db.session.refresh(film)
+    return False, False
+
+def next_key():
+    """Key for a film appended at the bottom."""
+    return key_between(db.session.execute(select(func.max(Film.display_order))).scalar(), None)
+
+def apply_permutation(film_ids):
+    """Reorders the given films to the order of `film_ids`, leaving all other films where
+    they are: the films swap among the keys they already hold, in one UPDATE. Respaces
+    first if those keys are not distinct. Does not commit. Returns the number of films."""
+    film_ids = list(dict.fromkeys(film_ids))
+    for _ in range(2):
+        keys = dict(db.session.execute(
+            select(Film.id, Film.display_order).where(Film.id.in_(film_ids))
+        ).all())
+        missing = [film_id for film_id in film_ids if film_id not in keys]
+        if missing:
+            raise LookupError(f"Unknown film ids: {missing}")
+        slots = sorted(keys.values())
+        if len(set(slots)) == len(slots):
+            break
+        rebalance()
+    db.session.execute(
+        update(Film)
+        .where(Film.id.in_(film_ids))
+        .values(display_order=case(dict(zip(film_ids, slots)), value=Film.id))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.expire_all()
+    return len(film_ids)
+
+def rebalance_in_background(app, on_done=None):
+    """Respaces the keys on a background thread with its own session."""
+    def run():
+        with app.app_context():
+            try:
+                count = rebalance()
+                db.session.commit()
+                logger.info(f"Respaced display order of {count} films")
+                if on_done:
+                    on_done()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Display order rebalance failed: {e}", exc_info=True)
+            finally:
+                db.session.remove()
+    thread = threading.Thread(target=run, name='order-rebalance', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,60 @@
+# pagination.py
+# Keyset (cursor) pagination of film lists in display order. The cursor is the
+# (display_order, id) of the last film on a page, so the next page is an index range scan
+# rather than an OFFSET that re-reads every earlier row. id breaks display_order ties.
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import load_only, raiseload
+
+from models import Film
+
+# Columns the film cards and the admin table render; everything else stays unloaded
+LIST_COLUMNS = (
+    Film.id, Film.letterboxd_slug, Film.display_name, Film.year, Film.director, Film.poster_url,
+    Film.is_tracked, Film.last_scraped_at, Film.last_known_average_rating, Film.last_known_rating_count,
+    Film.display_order,
+)
+
+def list_columns_only():
+    """Loader options for film lists: only LIST_COLUMNS, and relationships (snapshots,
+    rollups, ...) are never loaded."""
+    return (load_only(*LIST_COLUMNS), raiseload('*'))
+
+def encode_cursor(film):
+    return f"{film.display_order}.{film.id}"
+
+def parse_cursor(raw):
+    """Parses a "display_order.id" cursor. Returns None if absent or invalid."""
+    if not raw:
+        return None
+    order, _, film_id = raw.partition('.')
+    try:
+        return int(order), int(film_id)
+    except ValueError:
+        return None
+
+def keyset_page(session, stmt, limit, after=None, before=None):
+    """Runs `stmt` (a select whose first entity is Film) for one page in display order.
+    `after`/`before` are parsed cursors. Returns (rows, prev_cursor, next_cursor); a cursor
+    is None when there is no page in that direction."""
+    order, film_id = Film.display_order, Film.id
+    if before is not None:
+        stmt = stmt.where(or_(order < before[0], and_(order == before[0], film_id < before[1])))
+        stmt = stmt.order_by(order.desc(), film_id.desc())
+    else:
+        if after is not None:
+            stmt = stmt.where(or_(order > after[0], and_(order == after[0], film_id > after[1])))
+        stmt = stmt.order_by(order.asc(), film_id.asc())
+    # One extra row tells whether there is another page
+    rows = session.execute(stmt.limit(limit + 1)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+    if not rows:
+        return rows, None, None
+    first, last = rows[0][0], rows[-1][0]
+    has_previous = more if before is not None else after is not None
+    has_next = more if before is None else True
+    return (rows,
+            encode_cursor(first) if has_previous else None,
+            encode_cursor(last) if has_next else None)
@@ -0,0 +1,69 @@
+# rate_limiter.py
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """A thread-safe token bucket. Each acquire() spends one request from the budget."""
+
+    def __init__(self, requests_per_minute, burst=1):
+        self._lock = threading.Lock()
+        self.configure(requests_per_minute, burst)
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+
+    def configure(self, requests_per_minute, burst=1):
+        with self._lock:
+            self.rate_per_second = max(float(requests_per_minute), 1.0) / 60.0
+            self.burst = max(int(burst), 1)
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate_per_second)
+        self._last_refill = now
+
+    def pause(self, seconds):
+        """Holds every acquire() for `seconds` (e.g. a server's Retry-After), on all threads."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+    def acquire(self):
+        """Blocks until a token is available, then spends it. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                paused_for = self._paused_until - time.monotonic()
+                if paused_for > 0:
+                    wait_for = paused_for
+                else:
+                    self._refill()
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    # Sleep just long enough for the next token to drip in
+                    wait_for = (1 - self._tokens) / self.rate_per_second
+            time.sleep(wait_for)
+            waited += wait_for
+
+# One bucket per process so every scrape path (scheduled cycle, workers, imports)
+# draws from the same request budget.
+_shared_bucket = None
+_shared_bucket_lock = threading.Lock()
+
+def get_rate_limiter(requests_per_minute, burst=1):
+    """Returns the process-wide token bucket, reconfiguring it if the budget changed."""
+    global _shared_bucket
+    with _shared_bucket_lock:
+        if _shared_bucket is None:
+            _shared_bucket = TokenBucket(requests_per_minute, burst)
+            logger.info(f"Scrape rate limiter initialised at {requests_per_minute} requests/minute")
+        elif (_shared_bucket.rate_per_second != max(float(requests_per_minute), 1.0) / 60.0
+              or _shared_bucket.burst != max(int(burst), 1)):
+            _shared_bucket.configure(requests_per_minute, burst)
+            logger.info(f"Scrape rate limiter reconfigured to {requests_per_minute} requests/minute")
+        return _shared_bucket
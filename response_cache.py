@@ -0,0 +1,298 @@
+# response_cache.py
+# Response cache for public pages and JSON APIs. Their data only changes when a scrape
+# or an admin action commits, so responses are cached until the films they depend on
+# are invalidated (or the TTL runs out).
+#
+# Invalidation uses tag versions: every entry records the version of each tag it was
+# built from (e.g. "film:28-years-later", "catalog"), and invalidating a film bumps
+# those versions. With a shared SQLite backend the versions live in one file, so a
+# scrape in run_scheduler.py invalidates pages cached by every gunicorn worker.
+import base64
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, session, Response, make_response
+
+logger = logging.getLogger(__name__)
+
+CATALOG_TAG = 'catalog'
+
+def film_tag(letterboxd_slug):
+    return f'film:{letterboxd_slug}'
+
+class LRUCache:
+    """A bounded, thread-safe LRU mapping with a per-entry TTL."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at=None):
+        with self._lock:
+            self._entries[key] = (expires_at or time.time() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SQLiteCacheBackend:
+    """Cache entries and tag versions in a local SQLite file shared by several processes."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entry ("
+                " key TEXT PRIMARY KEY, payload TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS tag_version (tag TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT payload, expires_at FROM cache_entry WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        entry = json.loads(row[0])
+        # Bodies may be binary, so they are stored base64-encoded
+        try:
+            entry['body'] = base64.b64decode(entry['body'], validate=True)
+        except ValueError:
+            return None  # written by an older version that stored text bodies
+        return entry, row[1]
+
+    def set(self, key, value, expires_at):
+        conn = self._connect()
+        payload = dict(value, body=base64.b64encode(value['body']).decode('ascii'))
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entry (key, payload, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(payload), expires_at),
+        )
+        # Opportunistic cleanup keeps the file from growing without bound
+        conn.execute("DELETE FROM cache_entry WHERE expires_at < ?", (time.time(),))
+
+    def tag_versions(self, tags):
+        if not tags:
+            return {}
+        placeholders = ','.join('?' * len(tags))
+        rows = self._connect().execute(
+            f"SELECT tag, version FROM tag_version WHERE tag IN ({placeholders})", list(tags)
+        ).fetchall()
+        versions = dict(rows)
+        return {tag: versions.get(tag, 0) for tag in tags}
+
+    def bump(self, tags):
+        conn = self._connect()
+        conn.executemany(
+            "INSERT INTO tag_version (tag, version) VALUES (?, 1) "
+            "ON CONFLICT(tag) DO UPDATE SET version = version + 1",
+            [(tag,) for tag in tags],
+        )
+        return self.tag_versions(tags)
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache_entry")
+
+class ResponseCache:
+    """Two-level response cache: an in-process LRU in front of an optional shared backend."""
+
+    def __init__(self, max_entries=512, ttl_seconds=300, shared_path=None, version_check_seconds=1.0):
+        self.ttl_seconds = ttl_seconds
+        self.local = LRUCache(max_entries, ttl_seconds)
+        self.shared = None
+        if shared_path:
+            try:
+                self.shared = SQLiteCacheBackend(shared_path)
+            except sqlite3.Error as e:
+                logger.warning(f"Shared response cache unavailable at {shared_path}; using in-process cache only: {e}")
+        # Tag versions read from the shared backend are reused for this long, so cache
+        # hits don't query the backend on every request.
+        self.version_check_seconds = version_check_seconds
+        self._versions = {}
+        self._versions_checked_at = {}
+        self._lock = threading.Lock()
+
+    def current_versions(self, tags):
+        now = time.monotonic()
+        with self._lock:
+            stale = [t for t in tags if now - self._versions_checked_at.get(t, float('-inf')) > self.version_check_seconds]
+        if stale and self.shared is not None:
+            try:
+                fresh = self.shared.tag_versions(stale)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read response cache tag versions: {e}")
+                fresh = {}
+            with self._lock:
+                self._versions.update(fresh)
+                for tag in fresh:
+                    self._versions_checked_at[tag] = now
+        with self._lock:
+            return {tag: self._versions.get(tag, 0) for tag in tags}
+
+    def get(self, key, versions):
+        """Returns the cached entry for key if it was built from these tag versions."""
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            try:
+                found = self.shared.get(key)
+            except sqlite3.Error:
+                found = None
+            if found is not None:
+                entry, expires_at = found
+                self.local.set(key, entry, expires_at)
+        if entry is None or entry['versions'] != versions:
+            return None
+        return entry
+
+    def set(self, key, versions, body, mimetype, etag):
+        entry = {
+            'versions': versions,
+            'body': body,
+            'mimetype': mimetype,
+            'etag': etag,
+        }
+        expires_at = time.time() + self.ttl_seconds
+        self.local.set(key, entry, expires_at)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, entry, expires_at)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not write shared response cache entry: {e}")
+
+    def invalidate(self, tags):
+        tags = list(dict.fromkeys(tags))
+        if not tags:
+            return
+        now = time.monotonic()
+        if self.shared is not None:
+            try:
+                versions = self.shared.bump(tags)
+                with self._lock:
+                    self._versions.update(versions)
+                    for tag in tags:
+                        self._versions_checked_at[tag] = now
+                return
+            except sqlite3.Error as e:
+                logger.warning(f"Could not bump shared cache tag versions: {e}")
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+                self._versions_checked_at[tag] = now
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+# Process-wide cache, configured by init_response_cache(app)
+_cache = None
+
+def init_response_cache(app):
+    global _cache
+    if not app.config.get('RESPONSE_CACHE_ENABLED', True):
+        _cache = None
+        return None
+    _cache = ResponseCache(
+        max_entries=int(app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 512)),
+        ttl_seconds=int(app.config.get('RESPONSE_CACHE_TTL_SECONDS', 300)),
+        shared_path=app.config.get('RESPONSE_CACHE_SHARED_PATH') or None,
+    )
+    return _cache
+
+def get_response_cache():
+    return _cache
+
+def invalidate_films(slugs):
+    """Drops cached responses for these films, and the catalog pages that list them.
+    Call after the change has been committed."""
+    if _cache is None:
+        return
+    slugs = [slug for slug in slugs if slug]
+    if slugs:
+        _cache.invalidate([film_tag(slug) for slug in slugs] + [CATALOG_TAG])
+
+def invalidate_catalog():
+    """Drops cached film listings (index, search) after ordering/tracking changes."""
+    if _cache is not None:
+        _cache.invalidate([CATALOG_TAG])
+
+def _cache_key(variant=None):
+    args = sorted(request.args.items(multi=True))
+    key = f"{request.endpoint}?{json.dumps(args)}"
+    return f"{key}#{variant}" if variant else key
+
+def _bypass_cache():
+    # Admin pages render session-specific navigation and flashed messages
+    return request.method != 'GET' or session.get('admin_logged_in') or '_flashes' in session
+
+def cached_response(tags, vary=None):
+    """Caches a view's 200 responses. `tags` is called with the view's arguments and
+    returns the cache tags the response depends on. `vary`, if given, is called with no
+    arguments and returns a string that splits the cache for views that negotiate on
+    request headers. Adds ETag / 304 handling. Streamed responses pass through uncached:
+    caching one would read the whole stream into memory before sending anything."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if _cache is None or _bypass_cache():
+                return view(*args, **kwargs)
+
+            key = _cache_key(vary() if vary else None)
+            # Versions are read before the view runs, so an invalidation that lands while
+            # the response is being built leaves the new entry already stale.
+            versions = _cache.current_versions(tags(*args, **kwargs))
+            entry = _cache.get(key, versions)
+            if entry is not None:
+                response = Response(entry['body'], mimetype=entry['mimetype'])
+                response.set_etag(entry['etag'])
+                response.headers['X-Cache'] = 'HIT'
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                etag = hashlib.sha1(body).hexdigest()
+                _cache.set(key, versions, body, response.mimetype, etag)
+                response.set_etag(etag)
+                response.headers['X-Cache'] = 'MISS'
+            response.headers['Cache-Control'] = 'no-cache'
+            if vary:
+                response.vary.add('Accept')
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
@@ -0,0 +1,167 @@
+# rollups.py
+# Hourly, daily and weekly aggregates of RatingSnapshot rows. Snapshot history is
+# immutable, so long-range charts can read these instead of re-scanning raw rows.
+import logging
+from datetime import timedelta
+
+from sqlalchemy import insert, delete
+
+from models import db, RatingSnapshot, RatingRollup
+from cold_storage import fetch_archived_history, merge_histories
+
+logger = logging.getLogger(__name__)
+
+# Finest to coarsest
+RESOLUTIONS = ('hour', 'day', 'week')
+BUCKET_SECONDS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+
+def bucket_start(timestamp, resolution):
+    """Start of the bucket containing timestamp. Weeks start on Monday."""
+    if resolution == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == 'day':
+        return day
+    if resolution == 'week':
+        return day - timedelta(days=day.weekday())
+    raise ValueError(f"Unknown rollup resolution: {resolution}")
+
+def _fold(rollup, timestamp, average_rating, rating_count):
+    # Snapshots normally arrive in time order, but a late one must not become the close
+    if timestamp < rollup.first_timestamp:
+        rollup.first_timestamp = timestamp
+        rollup.open_average_rating = average_rating
+        rollup.open_rating_count = rating_count
+    if timestamp >= rollup.last_timestamp:
+        rollup.last_timestamp = timestamp
+        rollup.close_average_rating = average_rating
+        rollup.close_rating_count = rating_count
+    rollup.min_average_rating = min(rollup.min_average_rating, average_rating)
+    rollup.max_average_rating = max(rollup.max_average_rating, average_rating)
+    rollup.sample_count += 1
+
+def record_snapshot(film_id, timestamp, average_rating, rating_count):
+    """Folds one new snapshot into the film's hour/day/week rollups. Does not commit."""
+    for resolution in RESOLUTIONS:
+        start = bucket_start(timestamp, resolution)
+        rollup = RatingRollup.query.filter_by(
+            film_id=film_id, resolution=resolution, bucket_start=start
+        ).first()
+        if rollup is None:
+            db.session.add(RatingRollup(
+                film_id=film_id,
+                resolution=resolution,
+                bucket_start=start,
+                first_timestamp=timestamp,
+                last_timestamp=timestamp,
+                open_average_rating=average_rating,
+                close_average_rating=average_rating,
+                min_average_rating=average_rating,
+                max_average_rating=average_rating,
+                open_rating_count=rating_count,
+                close_rating_count=rating_count,
+                sample_count=1,
+            ))
+        else:
+            _fold(rollup, timestamp, average_rating, rating_count)
+
+def record_snapshots(snapshots):
+    """Bulk form of record_snapshot for many films at once: one select loads every
+    affected bucket, new buckets are inserted together. Does not commit.
+    `snapshots` are dicts with film_id, timestamp, average_rating and rating_count."""
+    if not snapshots:
+        return
+    keys = {
+        (s['film_id'], resolution, bucket_start(s['timestamp'], resolution))
+        for s in snapshots for resolution in RESOLUTIONS
+    }
+    # film_id/bucket_start IN (...) over-selects a little; exact keys are matched below
+    existing = RatingRollup.query.filter(
+        RatingRollup.film_id.in_({film_id for film_id, _, _ in keys}),
+        RatingRollup.bucket_start.in_({start for _, _, start in keys}),
+    ).all()
+    rollups = {(r.film_id, r.resolution, r.bucket_start): r for r in existing}
+    new_rows = {}
+    for s in sorted(snapshots, key=lambda s: s['timestamp']):
+        for resolution in RESOLUTIONS:
+            key = (s['film_id'], resolution, bucket_start(s['timestamp'], resolution))
+            rollup = rollups.get(key)
+            if rollup is not None:
+                _fold(rollup, s['timestamp'], s['average_rating'], s['rating_count'])
+                continue
+            row = new_rows.get(key)
+            if row is None:
+                new_rows[key] = {
+                    'film_id': s['film_id'],
+                    'resolution': resolution,
+                    'bucket_start': key[2],
+                    'first_timestamp': s['timestamp'],
+                    'last_timestamp': s['timestamp'],
+                    'open_average_rating': s['average_rating'],
+                    'close_average_rating': s['average_rating'],
+                    'min_average_rating': s['average_rating'],
+                    'max_average_rating': s['average_rating'],
+                    'open_rating_count': s['rating_count'],
+                    'close_rating_count': s['rating_count'],
+                    'sample_count': 1,
+                }
+            else:
+                row['last_timestamp'] = s['timestamp']
+                row['close_average_rating'] = s['average_rating']
+                row['close_rating_count'] = s['rating_count']
+                row['min_average_rating'] = min(row['min_average_rating'], s['average_rating'])
+                row['max_average_rating'] = max(row['max_average_rating'], s['average_rating'])
+                row['sample_count'] += 1
+    if new_rows:
+        db.session.execute(insert(RatingRollup), list(new_rows.values()))
+
+def _aggregate(rows, resolution):
+    """Builds rollup row dicts from time-ordered (timestamp, average_rating, rating_count) rows."""
+    buckets = []
+    current = None
+    for timestamp, average_rating, rating_count in rows:
+        start = bucket_start(timestamp, resolution)
+        if current is None or current['bucket_start'] != start:
+            current = {
+                'resolution': resolution,
+                'bucket_start': start,
+                'first_timestamp': timestamp,
+                'last_timestamp': timestamp,
+                'open_average_rating': average_rating,
+                'close_average_rating': average_rating,
+                'min_average_rating': average_rating,
+                'max_average_rating': average_rating,
+                'open_rating_count': rating_count,
+                'close_rating_count': rating_count,
+                'sample_count': 0,
+            }
+            buckets.append(current)
+        current['last_timestamp'] = timestamp
+        current['close_average_rating'] = average_rating
+        current['close_rating_count'] = rating_count
+        current['min_average_rating'] = min(current['min_average_rating'], average_rating)
+        current['max_average_rating'] = max(current['max_average_rating'], average_rating)
+        current['sample_count'] += 1
+    return buckets
+
+def rebuild_rollups_for_film(film_id):
+    """Recomputes every rollup for one film from its raw snapshots, archived ones included.
+    Does not commit. Returns the number of rollup rows written."""
+    rows = db.session.execute(
+        db.select(RatingSnapshot.timestamp, RatingSnapshot.average_rating, RatingSnapshot.rating_count)
+        .where(RatingSnapshot.film_id == film_id)
+        .order_by(RatingSnapshot.timestamp.asc())
+    ).all()
+    cold = fetch_archived_history(film_id)
+    if cold:
+        rows = merge_histories(cold, rows)
+    db.session.execute(delete(RatingRollup).where(RatingRollup.film_id == film_id))
+    written = 0
+    for resolution in RESOLUTIONS:
+        buckets = _aggregate(rows, resolution)
+        for bucket in buckets:
+            bucket['film_id'] = film_id
+        if buckets:
+            db.session.execute(insert(RatingRollup), buckets)
+            written += len(buckets)
+    return written
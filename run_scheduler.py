@@ -1,9 +1,14 @@
 import time
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from app import app
 from tasks import scheduled_scrape_task
+from scrape_queue import release_dead_leases, queue_stats
 from config import Config
+import metrics
+
+JOB_ID = 'scrape_job'
 
 
 def run_scrape_job():
@@ -15,17 +20,37 @@ def run_scrape_job():
 
 
 def main():
-    interval = getattr(Config, 'SCHEDULER_INTERVAL_MINUTES', 15)
-    print(f"Starting standalone APScheduler for scraping (interval: {interval} min)...")
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(
-        func=run_scrape_job,
-        trigger='interval',
-        minutes=interval,
-        id='scrape_job',
-        next_run_time=datetime.now()  # fire immediately on start
-    )
-    scheduler.start()
+    metrics.enable_export()
+    # Wake up every tick; each run only scrapes the films whose own interval has elapsed
+    interval = getattr(Config, 'SCHEDULER_TICK_MINUTES', 5)
+    print(f"Starting standalone APScheduler for scraping (checking for due films every {interval} min)...")
+    # The job (and its next run time) persists across restarts; its own table keeps it
+    # apart from the web app's Flask-APScheduler jobs in the same file.
+    jobstore = SQLAlchemyJobStore(url=Config.SCHEDULER_JOBSTORE_URL, tablename='standalone_scheduler_jobs')
+    scheduler = BackgroundScheduler(jobstores={'default': jobstore})
+
+    # Leases held by a previous instance of this process are released, so an interrupted
+    # cycle resumes at once instead of waiting for them to expire.
+    with app.app_context():
+        release_dead_leases()
+        pending, _ = queue_stats()
+
+    scheduler.start(paused=True)
+    job = scheduler.get_job(JOB_ID)
+    if job is None:
+        scheduler.add_job(
+            func=run_scrape_job,
+            trigger='interval',
+            minutes=interval,
+            id=JOB_ID,
+            next_run_time=datetime.now()  # fire immediately on first start
+        )
+    else:
+        scheduler.reschedule_job(JOB_ID, trigger='interval', minutes=interval)
+        if pending:
+            print(f"Resuming interrupted cycle: {pending} films still in the scrape queue.")
+            scheduler.modify_job(JOB_ID, next_run_time=datetime.now())
+    scheduler.resume()
     print("Scheduler started! Press Ctrl+C to exit.")
     try:
         while True:
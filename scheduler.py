@@ -37,7 +37,8 @@ def init_scheduler(app):
 
         # Check if job already exists to prevent duplicates on app restart
         if not scheduler.get_job(SCRAPE_JOB_ID):
-            interval_minutes = int(app.config.get('SCHEDULER_INTERVAL_MINUTES', 60))
+            # The job only wakes up to scrape films that are due; each film has its own interval
+            interval_minutes = int(app.config.get('SCHEDULER_TICK_MINUTES', 5))
             logger.debug(f"interval_minutes = {interval_minutes} (type: {type(interval_minutes)})")
             job = scheduler.add_job(
                 id=SCRAPE_JOB_ID,
@@ -46,11 +47,17 @@ def init_scheduler(app):
                 minutes=interval_minutes,
                 next_run_time=datetime.now() + timedelta(seconds=10) # Start 10s after app start
             )
-            logger.info(f"Scheduled scrape job to run every {interval_minutes} minutes.")
+            logger.info(f"Scheduled scrape job to check for due films every {interval_minutes} minutes.")
             if hasattr(job, 'next_run_time') and job.next_run_time:
                 logger.info(f"Next scheduled run is at: {job.next_run_time.strftime('%Y-%m-%d %H:%M:%S %Z')}")
             logger.info(f"Job added with ID: {SCRAPE_JOB_ID}")
         else:
+            # Restored from the persistent job store: keep its next run time, but pick up a changed tick
+            job = scheduler.get_job(SCRAPE_JOB_ID)
+            interval_minutes = int(app.config.get('SCHEDULER_TICK_MINUTES', 5))
+            if getattr(job.trigger, 'interval', None) != timedelta(minutes=interval_minutes):
+                scheduler.scheduler.reschedule_job(SCRAPE_JOB_ID, trigger='interval', minutes=interval_minutes)
+                logger.info(f"Scrape job rescheduled to check for due films every {interval_minutes} minutes.")
             logger.info("Scrape job already exists; not adding duplicate.")
     else:
         logger.info("APScheduler already running.")
\ No newline at end of file
@@ -0,0 +1,101 @@
+# scrape_budget.py
+# The global SCRAPE_REQUESTS_PER_MINUTE budget, split between every process that is fetching
+# Letterboxd pages: scrape workers, the scheduler (standalone or in the web app) and admin
+# jobs (scrape now, imports). While it fetches, a process keeps a heartbeat row in the
+# scrape_worker table and sets its rate limiter to an even share of the budget, so adding
+# processes never raises the combined rate above the limit.
+import logging
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, func, delete
+
+from models import db, ScrapeWorker
+from rate_limiter import get_rate_limiter
+from scrape_queue import default_worker_id
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+# A process that has not reported for this long no longer counts towards the budget split
+WORKER_TIMEOUT_SECONDS = 60
+
+def heartbeat(worker_id, films_scraped=0):
+    """Records that this process is alive. Commits."""
+    worker = db.session.get(ScrapeWorker, worker_id)
+    if worker is None:
+        worker = ScrapeWorker(id=worker_id, hostname=socket.gethostname(), pid=os.getpid(), films_scraped=0)
+        db.session.add(worker)
+    worker.last_heartbeat_at = datetime.utcnow()
+    worker.films_scraped += films_scraped
+    db.session.commit()
+
+def live_worker_count(now=None):
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(seconds=WORKER_TIMEOUT_SECONDS)
+    return db.session.execute(
+        select(func.count(ScrapeWorker.id)).where(ScrapeWorker.last_heartbeat_at >= cutoff)
+    ).scalar()
+
+def remove_worker(worker_id):
+    db.session.execute(delete(ScrapeWorker).where(ScrapeWorker.id == worker_id))
+    db.session.commit()
+
+def share_of_budget(requests_per_minute, live_workers):
+    """This process's requests/minute: an even share of the global budget."""
+    return max(requests_per_minute / max(live_workers, 1), 1.0)
+
+def _heartbeat_loop(app, worker_id, done):
+    # Runs on its own thread (and session), so long fetch batches never look like a dead process
+    with app.app_context():
+        global_rate = int(current_app.config.get('SCRAPE_REQUESTS_PER_MINUTE', 20))
+        while not done.wait(HEARTBEAT_SECONDS):
+            try:
+                heartbeat(worker_id)
+                get_rate_limiter(share_of_budget(global_rate, live_worker_count()))
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Scrape heartbeat of {worker_id} failed: {e}")
+        db.session.remove()
+
+# One registration per process, however many jobs in it fetch at once: they all draw
+# from the same process-wide bucket, so the process counts once in the split
+_lock = threading.Lock()
+_users = 0
+_done = None
+_beat = None
+
+@contextmanager
+def fetch_budget():
+    """Registers this process as a fetcher for the duration of the block and yields the
+    process-wide rate limiter, set to this process's share of the budget (re-checked every
+    HEARTBEAT_SECONDS). Needs an app context."""
+    global _users, _done, _beat
+    app = current_app._get_current_object()
+    worker_id = default_worker_id()
+    global_rate = int(app.config.get('SCRAPE_REQUESTS_PER_MINUTE', 20))
+    with _lock:
+        _users += 1
+        if _users == 1:
+            heartbeat(worker_id)
+            _done = threading.Event()
+            _beat = threading.Thread(target=_heartbeat_loop, args=(app, worker_id, _done),
+                                     name='scrape-heartbeat', daemon=True)
+            _beat.start()
+    try:
+        yield get_rate_limiter(share_of_budget(global_rate, live_worker_count()))
+    finally:
+        with _lock:
+            _users -= 1
+            if _users == 0:
+                _done.set()
+                _beat.join(timeout=5)
+                try:
+                    remove_worker(worker_id)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.warning(f"Could not remove scrape heartbeat of {worker_id}: {e}")
@@ -0,0 +1,195 @@
+# scrape_queue.py
+# Durable scrape queue. Due films are copied into the scrape_queue table, and workers
+# claim batches of entries by writing a lease (an expiry time plus a claim token) with
+# a single conditional UPDATE, so two processes can never hold the same entry. An entry
+# is deleted in the same transaction that stores its scrape result. After a crash or a
+# deploy, the entries that were not finished are still in the table and are claimed
+# again once their lease runs out (or at once, see release_dead_leases).
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete, insert, func, and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Film, ScrapeQueueEntry
+from scrape_schedule import due_condition
+
+logger = logging.getLogger(__name__)
+
+# An entry claimed this many times without completing keeps crashing its worker; drop it
+MAX_ATTEMPTS = 5
+
+def _host():
+    # Claim tokens (host:pid:random) must fit in leased_by
+    return socket.gethostname()[:40]
+
+def default_worker_id():
+    """host:pid, so leases left by dead processes on this host can be recognised."""
+    return f"{_host()}:{os.getpid()}"
+
+def _insert_ignoring_duplicates(rows):
+    # Two schedulers may enqueue the same film at once; the unique film_id keeps one entry
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        db.session.execute(dialect_insert(ScrapeQueueEntry).on_conflict_do_nothing(index_elements=['film_id']), rows)
+        return
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(ScrapeQueueEntry), [row])
+        except IntegrityError:
+            pass
+
+def enqueue_due_films(now=None):
+    """Queues every due tracked film that is not queued yet. Does not commit.
+    Returns the number of films queued."""
+    now = now or datetime.utcnow()
+    due = db.session.execute(
+        select(Film.id, Film.next_scrape_due_at)
+        .where(due_condition(now), Film.id.not_in(select(ScrapeQueueEntry.film_id)))
+    ).all()
+    rows = [
+        {'film_id': film_id, 'due_at': due_at or now, 'attempts': 0, 'enqueued_at': now}
+        for film_id, due_at in due
+    ]
+    if rows:
+        _insert_ignoring_duplicates(rows)
+    return len(rows)
+
+def _claimable(now):
+    return and_(
+        ScrapeQueueEntry.due_at <= now,
+        or_(ScrapeQueueEntry.lease_until.is_(None), ScrapeQueueEntry.lease_until < now),
+    )
+
+def claim_entries(worker_id, limit, lease_seconds, now=None):
+    """Leases up to `limit` due entries and commits the claim.
+    Returns (token, [(entry_id, film_id, slug), ...]) in due order."""
+    now = now or datetime.utcnow()
+    token = f"{worker_id}:{uuid.uuid4().hex[:12]}"
+    candidates = (
+        select(ScrapeQueueEntry.id)
+        .where(_claimable(now))
+        .order_by(ScrapeQueueEntry.due_at.asc(), ScrapeQueueEntry.id.asc())
+        .limit(limit)
+        # Postgres: FOR UPDATE SKIP LOCKED lets concurrent workers claim disjoint batches
+        # without waiting on each other. SQLite ignores it; its single writer serialises claims.
+        .with_for_update(skip_locked=True)
+    )
+    # The claimable condition is repeated on the UPDATE itself, so an entry another
+    # process claimed between the subquery and the write is skipped, not stolen.
+    db.session.execute(
+        update(ScrapeQueueEntry)
+        .where(ScrapeQueueEntry.id.in_(candidates.scalar_subquery()), _claimable(now))
+        .values(
+            lease_until=now + timedelta(seconds=lease_seconds),
+            leased_by=token,
+            attempts=ScrapeQueueEntry.attempts + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    rows = db.session.execute(
+        select(ScrapeQueueEntry.id, ScrapeQueueEntry.film_id, Film.letterboxd_slug, ScrapeQueueEntry.attempts)
+        .join(Film, Film.id == ScrapeQueueEntry.film_id)
+        .where(ScrapeQueueEntry.leased_by == token)
+        .order_by(ScrapeQueueEntry.due_at.asc(), ScrapeQueueEntry.id.asc())
+    ).all()
+    claimed = []
+    poisoned = []
+    for entry_id, film_id, slug, attempts in rows:
+        if attempts > MAX_ATTEMPTS:
+            poisoned.append((entry_id, film_id, slug))
+        else:
+            claimed.append((entry_id, film_id, slug))
+    if poisoned:
+        _drop_poisoned(poisoned, now)
+    return token, claimed
+
+def _drop_poisoned(entries, now):
+    for entry_id, film_id, slug in entries:
+        logger.error(f"Dropping {slug} from the scrape queue after {MAX_ATTEMPTS} unfinished attempts.")
+        film = db.session.get(Film, film_id)
+        if film is not None:
+            # Push it back by its own interval so the next tick does not queue it straight away
+            film.next_scrape_due_at = now + timedelta(minutes=film.scrape_interval_minutes or 60)
+    db.session.execute(delete(ScrapeQueueEntry).where(ScrapeQueueEntry.id.in_([e[0] for e in entries])))
+    db.session.commit()
+
+def complete_entries(token, entry_ids):
+    """Removes finished entries. Does not commit: call it in the transaction that stores
+    the results, so results and queue progress are saved together."""
+    if not entry_ids:
+        return
+    db.session.execute(
+        delete(ScrapeQueueEntry)
+        .where(ScrapeQueueEntry.id.in_(entry_ids), ScrapeQueueEntry.leased_by == token)
+        .execution_options(synchronize_session=False)
+    )
+
+def release_entries(token, entry_ids=None, count_attempt=True):
+    """Gives unfinished entries (all of the claim's, or just `entry_ids`) back to the queue
+    right away, e.g. after an error. With count_attempt=False the claim is not counted
+    towards MAX_ATTEMPTS: for entries that were never tried, like those the circuit
+    breaker stopped. Commits."""
+    values = {'lease_until': None, 'leased_by': None}
+    if not count_attempt:
+        values['attempts'] = ScrapeQueueEntry.attempts - 1
+    stmt = update(ScrapeQueueEntry).where(ScrapeQueueEntry.leased_by == token)
+    if entry_ids is not None:
+        stmt = stmt.where(ScrapeQueueEntry.id.in_(entry_ids))
+    db.session.execute(stmt.values(**values).execution_options(synchronize_session=False))
+    db.session.commit()
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+def release_dead_leases():
+    """Releases leases held by processes on this host that no longer exist, so a restarted
+    scheduler resumes their entries immediately instead of waiting for the leases to expire.
+    Returns the number of entries released."""
+    host = _host()
+    holders = db.session.execute(
+        select(ScrapeQueueEntry.leased_by).where(ScrapeQueueEntry.leased_by.like(f"{host}:%")).distinct()
+    ).scalars().all()
+    released = 0
+    for token in holders:
+        parts = token.split(':')
+        if len(parts) < 3 or not parts[1].isdigit() or _pid_alive(int(parts[1])):
+            continue
+        result = db.session.execute(
+            update(ScrapeQueueEntry)
+            .where(ScrapeQueueEntry.leased_by == token)
+            .values(lease_until=None, leased_by=None)
+            .execution_options(synchronize_session=False)
+        )
+        released += result.rowcount
+    db.session.commit()
+    if released:
+        logger.info(f"Released {released} scrape queue entries left by dead workers.")
+    return released
+
+def queue_stats(now=None):
+    """(queued, leased) entry counts."""
+    now = now or datetime.utcnow()
+    queued, leased = db.session.execute(
+        select(
+            func.count(ScrapeQueueEntry.id),
+            func.count(ScrapeQueueEntry.id).filter(ScrapeQueueEntry.lease_until >= now),
+        )
+    ).one()
+    return queued, leased
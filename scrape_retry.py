@@ -0,0 +1,195 @@
+# scrape_retry.py
+# Resilient fetching for every scrape path. Transient failures (network errors, 5xx, 429)
+# are retried with jittered exponential backoff, each retry drawing from the shared rate
+# limiter. A Retry-After from the server pauses the whole limiter, not only the thread
+# that got it. A process-wide circuit breaker watches the outcome of recent requests;
+# when most of them fail (Letterboxd is down or blocking us), it opens and the pipeline
+# stops fetching until a cooldown has passed and a single probe request succeeds.
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+from config import Config
+import metrics
+from scraper import (fetch_film_data, fetch_page, ScrapeResult, SCRAPE_FAILED, TRANSIENT_FAILURES,
+                     FAILURE_RATE_LIMITED, FAILURE_CIRCUIT_OPEN)
+
+logger = logging.getLogger(__name__)
+
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half_open'
+# Values of the circuit breaker state gauge
+_BREAKER_GAUGE = {BREAKER_CLOSED: 0, BREAKER_HALF_OPEN: 1, BREAKER_OPEN: 2}
+
+def _setting(name, default):
+    # Fetch threads run without an app context, so settings come from Config like scraper.py
+    return type(default)(getattr(Config, name, default))
+
+def backoff_delay(attempt, base=None, cap=None):
+    """Seconds to wait before retry number `attempt` (1-based): "full jitter", a random
+    time up to base * 2**(attempt-1), capped. Jitter keeps threads from retrying in step."""
+    base = _setting('SCRAPE_RETRY_BASE_SECONDS', 2.0) if base is None else base
+    cap = _setting('SCRAPE_RETRY_MAX_SECONDS', 60.0) if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker over the last `window` requests. Opens when at least
+    `min_requests` were seen and the share of transient failures reaches `failure_rate`.
+    After `cooldown` seconds it lets one probe through (half-open): success closes it,
+    failure opens it again for twice as long, up to `max_cooldown`."""
+
+    def __init__(self, window=20, min_requests=10, failure_rate=0.5, cooldown=300.0, max_cooldown=3600.0):
+        self._lock = threading.Lock()
+        self.window = max(int(window), 1)
+        self.min_requests = max(min(int(min_requests), self.window), 1)
+        self.failure_rate = float(failure_rate)
+        self.base_cooldown = float(cooldown)
+        self.max_cooldown = max(float(max_cooldown), self.base_cooldown)
+        self._outcomes = deque(maxlen=self.window)
+        self._set_state(BREAKER_CLOSED)
+        self._cooldown = self.base_cooldown
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == BREAKER_OPEN and time.monotonic() - self._opened_at >= self._cooldown:
+            self._set_state(BREAKER_HALF_OPEN)
+            self._probe_in_flight = False
+        return self._state
+
+    def _set_state(self, state):
+        self._state = state
+        metrics.BREAKER_STATE.set(_BREAKER_GAUGE[state])
+
+    def seconds_until_retry(self):
+        """Seconds until an open breaker lets a probe through (0 if it would now)."""
+        with self._lock:
+            if self._current_state() != BREAKER_OPEN:
+                return 0.0
+            return max(self._cooldown - (time.monotonic() - self._opened_at), 0.0)
+
+    def allow_request(self):
+        """True if a request may go out now. In the half-open state only one probe is allowed."""
+        with self._lock:
+            state = self._current_state()
+            if state == BREAKER_CLOSED:
+                return True
+            if state == BREAKER_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record(self, failed):
+        """Records a request's outcome: failed=True for a transient failure."""
+        with self._lock:
+            state = self._current_state()
+            if state == BREAKER_HALF_OPEN:
+                if failed:
+                    self._open(min(self._cooldown * 2, self.max_cooldown))
+                else:
+                    logger.info("Scrape circuit breaker closed: probe request succeeded")
+                    self._set_state(BREAKER_CLOSED)
+                    self._cooldown = self.base_cooldown
+                    self._outcomes.clear()
+                return
+            if state == BREAKER_OPEN:
+                return
+            self._outcomes.append(bool(failed))
+            failures = sum(self._outcomes)
+            if len(self._outcomes) >= self.min_requests and failures / len(self._outcomes) >= self.failure_rate:
+                self._open(self.base_cooldown)
+
+    def _open(self, cooldown):
+        self._set_state(BREAKER_OPEN)
+        self._cooldown = cooldown
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self._outcomes.clear()
+        logger.warning(f"Scrape circuit breaker opened: pausing scrapes for {cooldown:.0f}s")
+
+    def reset(self):
+        with self._lock:
+            self._set_state(BREAKER_CLOSED)
+            self._cooldown = self.base_cooldown
+            self._outcomes.clear()
+            self._probe_in_flight = False
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+def get_circuit_breaker():
+    """The process-wide circuit breaker shared by every scrape path."""
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(
+                window=_setting('SCRAPE_BREAKER_WINDOW', 20),
+                min_requests=_setting('SCRAPE_BREAKER_MIN_REQUESTS', 10),
+                failure_rate=_setting('SCRAPE_BREAKER_FAILURE_RATE', 0.5),
+                cooldown=_setting('SCRAPE_BREAKER_COOLDOWN_SECONDS', 300.0),
+            )
+        return _breaker
+
+def fetch_with_retry(letterboxd_slug, bucket=None, conditional=True, breaker=None):
+    """fetch_film_data with retries, rate limiting and the circuit breaker. Each attempt
+    takes a token from `bucket` (if given). Gives up early when a Retry-After is longer than
+    SCRAPE_RETRY_MAX_SECONDS, so the film is deferred rather than holding a thread.
+    Returns the last ScrapeResult; FAILURE_CIRCUIT_OPEN if the breaker stopped it."""
+    result = _with_retry(letterboxd_slug, lambda: fetch_film_data(letterboxd_slug, conditional=conditional),
+                         bucket, breaker)
+    metrics.RESULTS.inc(outcome=result.failure if result.status == SCRAPE_FAILED else result.status)
+    return result
+
+def fetch_page_with_retry(url, bucket=None, breaker=None, **kwargs):
+    """scraper.fetch_page (list pages, boxd.it links) with the same retries, rate limiting
+    and circuit breaker as film pages. Returns the last ScrapeResult."""
+    return _with_retry(url, lambda: fetch_page(url, **kwargs), bucket, breaker)
+
+def _with_retry(label, fetch, bucket, breaker):
+    breaker = breaker or get_circuit_breaker()
+    attempts = max(_setting('SCRAPE_RETRY_ATTEMPTS', 3), 1)
+    max_wait = _setting('SCRAPE_RETRY_MAX_SECONDS', 60.0)
+    result = None
+    for attempt in range(1, attempts + 1):
+        if not breaker.allow_request():
+            return ScrapeResult(SCRAPE_FAILED, None, FAILURE_CIRCUIT_OPEN)
+        if bucket is not None:
+            metrics.RATE_LIMIT_WAIT_SECONDS.observe(bucket.acquire())
+            # The breaker may have opened while this thread waited for its turn
+            if breaker.state == BREAKER_OPEN:
+                return ScrapeResult(SCRAPE_FAILED, None, FAILURE_CIRCUIT_OPEN)
+        try:
+            result = fetch()
+        except Exception:
+            # Recorded as a failure so a half-open probe is never left in flight for good
+            breaker.record(True)
+            raise
+        transient = result.status == SCRAPE_FAILED and result.failure in TRANSIENT_FAILURES
+        breaker.record(transient)
+        if not transient or attempt == attempts:
+            return result
+
+        delay = backoff_delay(attempt)
+        if result.failure == FAILURE_RATE_LIMITED:
+            if result.retry_after is not None and result.retry_after > max_wait:
+                logger.warning(f"Rate limited on {label}: Retry-After {result.retry_after:.0f}s, deferring")
+                if bucket is not None:
+                    bucket.pause(max_wait)
+                return result
+            delay = max(delay, result.retry_after or 0.0)
+            # Everyone backs off, not just this thread
+            if bucket is not None:
+                bucket.pause(delay)
+        metrics.RETRIES.inc(failure=result.failure)
+        logger.info(f"Retrying {label} in {delay:.1f}s "
+                    f"(attempt {attempt + 1}/{attempts}, {result.failure})")
+        time.sleep(delay)
+    return result
@@ -0,0 +1,87 @@
+# scrape_schedule.py
+# Per-film scrape scheduling. Every film carries its own interval and next-due time:
+# films whose rating is moving are polled more often, films that have been stable
+# for a while less often, so the request budget goes where the data is changing.
+# Due films are handed to the durable queue in scrape_queue.py.
+import logging
+from datetime import datetime, timedelta
+from statistics import median
+
+from flask import current_app
+from sqlalchemy import select, and_, or_
+
+from models import db, Film, RatingSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Interval multipliers: back off gently while a film is quiet, tighten quickly when it moves
+WIDEN_FACTOR = 1.5
+TIGHTEN_FACTOR = 0.5
+# Snapshots used to estimate a starting interval for films without one
+ESTIMATE_SAMPLE_SIZE = 10
+
+def interval_bounds():
+    """(base, minimum, maximum) interval in minutes from the app config."""
+    config = current_app.config
+    base = int(config.get('SCHEDULER_INTERVAL_MINUTES', 60))
+    minimum = max(int(config.get('SCRAPE_MIN_INTERVAL_MINUTES', 15)), 1)
+    maximum = max(int(config.get('SCRAPE_MAX_INTERVAL_MINUTES', 1440)), minimum)
+    return base, minimum, maximum
+
+def _clamp(minutes, minimum, maximum):
+    return int(max(minimum, min(round(minutes), maximum)))
+
+def estimate_interval_minutes(film_id, base, minimum, maximum):
+    """Starting interval for a film: the median gap between its recent snapshots.
+    Snapshots are only written when the rating moves, so the gap is how often it changes."""
+    timestamps = db.session.execute(
+        select(RatingSnapshot.timestamp)
+        .where(RatingSnapshot.film_id == film_id)
+        .order_by(RatingSnapshot.timestamp.desc())
+        .limit(ESTIMATE_SAMPLE_SIZE)
+    ).scalars().all()
+    if len(timestamps) < 2:
+        return _clamp(base, minimum, maximum)
+    gaps = [(newer - older).total_seconds() / 60 for newer, older in zip(timestamps, timestamps[1:])]
+    return _clamp(median(gaps), minimum, maximum)
+
+def next_interval_minutes(current, moved, minimum, maximum):
+    """Widens the interval after an unchanged scrape and tightens it after a change."""
+    factor = TIGHTEN_FACTOR if moved else WIDEN_FACTOR
+    return _clamp(current * factor, minimum, maximum)
+
+def next_schedule(film, moved, failed=False, now=None):
+    """The film's new (scrape_interval_minutes, next_scrape_due_at) after a scrape.
+    `film` only needs id, display_name and scrape_interval_minutes (an ORM object or a row).
+    A failed scrape keeps the current interval."""
+    now = now or datetime.utcnow()
+    base, minimum, maximum = interval_bounds()
+    current = film.scrape_interval_minutes
+    if current is None:
+        current = estimate_interval_minutes(film.id, base, minimum, maximum)
+    if failed:
+        interval = _clamp(current, minimum, maximum)
+    else:
+        interval = next_interval_minutes(current, moved, minimum, maximum)
+    if interval != film.scrape_interval_minutes:
+        logger.debug(f"Scrape interval for {film.display_name}: {film.scrape_interval_minutes} -> {interval} min")
+    return interval, now + timedelta(minutes=interval)
+
+def retry_schedule(film, retry_after=None, now=None):
+    """(scrape_interval_minutes, next_scrape_due_at) after a transient failure: the interval
+    is kept, but the film is due again after the minimum interval (or the server's
+    Retry-After, if longer) instead of a whole interval later."""
+    now = now or datetime.utcnow()
+    base, minimum, maximum = interval_bounds()
+    interval = film.scrape_interval_minutes
+    if interval is None:
+        interval = estimate_interval_minutes(film.id, base, minimum, maximum)
+    delay = max(timedelta(minutes=minimum), timedelta(seconds=retry_after or 0))
+    return interval, now + min(delay, timedelta(minutes=interval))
+
+def due_condition(now):
+    """SQL condition for tracked films whose next scrape is due at `now`."""
+    return and_(
+        Film.is_tracked.is_(True),
+        or_(Film.next_scrape_due_at.is_(None), Film.next_scrape_due_at <= now),
+    )
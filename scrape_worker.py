@@ -0,0 +1,108 @@
+# scrape_worker.py
+# `flask scrape-worker`: worker processes that drain the shared scrape queue (see
+# scrape_queue.py), on one host or several. Each worker takes its share of the global
+# SCRAPE_REQUESTS_PER_MINUTE budget (see scrape_budget.py), so adding workers raises
+# throughput until that limit is reached.
+import logging
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from models import db
+import metrics
+from scrape_budget import fetch_budget, heartbeat
+from scrape_queue import enqueue_due_films, release_dead_leases, default_worker_id
+from tasks import drain_scrape_queue, lease_seconds_for
+
+logger = logging.getLogger(__name__)
+
+# How long an idle worker waits before checking for due films again
+IDLE_POLL_SECONDS = 30
+
+def run_worker(app, stop, threads=None, once=False):
+    """Drains the scrape queue until `stop` is set (or, with once=True, until it is empty)."""
+    metrics.enable_export()
+    with app.app_context():
+        config = current_app.config
+        worker_id = default_worker_id()
+        threads = max(int(threads or config.get('SCRAPE_MAX_WORKERS', 4)), 1)
+        batch_size = max(int(config.get('SCRAPE_COMMIT_BATCH_SIZE', 25)), 1)
+
+        release_dead_leases()
+        logger.info(f"Scrape worker {worker_id} started ({threads} threads)")
+        try:
+            with fetch_budget() as bucket, \
+                    ThreadPoolExecutor(max_workers=threads, thread_name_prefix='scrape') as pool:
+                while not stop.is_set():
+                    # The heartbeat thread keeps the bucket at this process's share
+                    rate = bucket.rate_per_second * 60
+                    enqueue_due_films()
+                    db.session.commit()
+                    succeeded, processed = drain_scrape_queue(
+                        pool, bucket, worker_id, batch_size,
+                        lease_seconds_for(config, rate, batch_size), should_stop=stop.is_set,
+                    )
+                    if processed:
+                        heartbeat(worker_id, films_scraped=processed)
+                        logger.info(f"Scrape worker {worker_id}: {succeeded}/{processed} films scraped")
+                    elif once:
+                        break
+                    else:
+                        stop.wait(IDLE_POLL_SECONDS)
+        finally:
+            logger.info(f"Scrape worker {worker_id} stopped")
+
+def _worker_process(threads, once):
+    # Entry point of a spawned worker process: a fresh interpreter with its own engine
+    from app import app
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    run_worker(app, stop, threads=threads, once=once)
+
+def run_workers(app, workers=1, threads=None, once=False):
+    """Runs `workers` worker processes (or one in this process) until interrupted.
+    Workers that die unexpectedly are restarted."""
+    if workers <= 1:
+        stop = threading.Event()
+        try:
+            run_worker(app, stop, threads=threads, once=once)
+        except KeyboardInterrupt:
+            stop.set()
+        return
+
+    # spawn, not fork: children must not inherit the parent's DB connections
+    context = multiprocessing.get_context('spawn')
+    stopping = threading.Event()
+
+    def start():
+        process = context.Process(target=_worker_process, args=(threads, once), name='scrape-worker')
+        process.start()
+        return process
+
+    def request_stop(*_):
+        stopping.set()
+        for process in processes:
+            if process.is_alive():
+                process.terminate() # SIGTERM: the worker finishes its current batch, then exits
+
+    processes = [start() for _ in range(workers)]
+    signal.signal(signal.SIGTERM, request_stop)
+    try:
+        while processes:
+            for process in list(processes):
+                process.join(timeout=1)
+                if process.is_alive():
+                    continue
+                if stopping.is_set() or (once and process.exitcode == 0):
+                    processes.remove(process)
+                else:
+                    logger.warning(f"Scrape worker pid {process.pid} exited with code {process.exitcode}; restarting")
+                    processes[processes.index(process)] = start()
+    except KeyboardInterrupt:
+        request_stop()
+        for process in processes:
+            process.join()
@@ -0,0 +1,130 @@
+# scrape_writer.py
+# Batched persistence for scheduled scrapes. Results are buffered in memory and written
+# every `max_rows` films or `max_seconds`, whichever comes first: one select for the
+# films' current state, one executemany UPDATE of the film rows, one multi-row INSERT
+# of the new snapshots, a refresh of the films' stats rows, and a single commit. On
+# SQLite every commit is an fsync that holds the writer lock, so fewer, larger
+# transactions also keep web reads responsive.
+import logging
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import select, update, insert
+
+from models import db, Film, RatingSnapshot
+import metrics
+from scraper import remember_validators
+from rollups import record_snapshots
+from film_stats import refresh_film_stats
+from response_cache import invalidate_films
+from scrape_queue import complete_entries
+
+logger = logging.getLogger(__name__)
+
+PendingResult = namedtuple('PendingResult', ['token', 'entry_id', 'film_id', 'result'])
+
+# Columns the plan function reads
+_STATE_COLUMNS = (
+    Film.id, Film.letterboxd_slug, Film.display_name, Film.year, Film.director, Film.poster_url,
+    Film.last_known_average_rating, Film.last_known_rating_count, Film.last_scraped_at,
+    Film.scrape_interval_minutes, Film.last_snapshot_average_rating, Film.last_snapshot_rating_count,
+)
+
+class ScrapeResultWriter:
+    """Buffers scrape results and writes them in bulk. If a bulk write fails, the batch is
+    retried one film per transaction, so a single bad row only loses that film's result
+    (its queue entry stays leased and is retried once the lease runs out)."""
+
+    def __init__(self, plan, max_rows=25, max_seconds=30.0):
+        # plan(film_row, result, now) -> (values, snapshot, success); see tasks.plan_scrape_update
+        self.plan = plan
+        self.max_rows = max(int(max_rows), 1)
+        self.max_seconds = max_seconds
+        self._pending = []
+        self._oldest = None
+        self.succeeded = 0
+        self.written = 0
+        self.commits = 0
+
+    def add(self, token, entry_id, film_id, result):
+        if not self._pending:
+            self._oldest = time.monotonic()
+        self._pending.append(PendingResult(token, entry_id, film_id, result))
+        if len(self._pending) >= self.max_rows or time.monotonic() - self._oldest >= self.max_seconds:
+            self.flush()
+
+    def flush(self):
+        """Writes everything buffered. Returns the number of results stored."""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, []
+        try:
+            stored = self._write(pending)
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Bulk write of {len(pending)} scrape results failed ({e}); retrying one by one")
+            stored = []
+            for item in pending:
+                try:
+                    stored.extend(self._write([item]))
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Could not store scrape result for film {item.film_id}: {e}", exc_info=True)
+        invalidate_films([slug for slug, _ in stored])
+        self.written += len(stored)
+        self.succeeded += sum(1 for _, success in stored if success)
+        return len(stored)
+
+    def _write(self, items):
+        """One transaction for `items`. Returns [(slug, success), ...] for the films written."""
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        states = {
+            row.id: row
+            for row in db.session.execute(
+                select(*_STATE_COLUMNS).where(Film.id.in_([item.film_id for item in items]))
+            )
+        }
+        film_updates = []
+        snapshots = []
+        stored = []
+        validators = []
+        for item in items:
+            film = states.get(item.film_id)
+            if film is None:
+                logger.warning(f"Film {item.film_id} was deleted during the scrape cycle; dropping result.")
+                continue
+            values, snapshot, success = self.plan(film, item.result, now)
+            film_updates.append(dict(values, id=item.film_id))
+            if snapshot:
+                snapshots.append(dict(snapshot, film_id=item.film_id))
+            stored.append((film.letterboxd_slug, success))
+            validators.append((film.letterboxd_slug, item.result.validators))
+
+        if film_updates:
+            # ORM bulk UPDATE by primary key: executemany, grouped by the set of columns changed
+            db.session.execute(update(Film), film_updates)
+        if snapshots:
+            db.session.execute(insert(RatingSnapshot), snapshots)
+            record_snapshots(snapshots)
+        # Deltas drift as time passes even when the rating holds, so every scraped film is refreshed
+        refresh_film_stats([item.film_id for item in items if item.film_id in states], now)
+        by_token = {}
+        for item in items:
+            # On-demand scrapes (token None) have no queue entry to complete
+            if item.token is not None:
+                by_token.setdefault(item.token, []).append(item.entry_id)
+        for token, entry_ids in by_token.items():
+            complete_entries(token, entry_ids)
+        db.session.commit()
+        self.commits += 1
+        # Only now: cached before the commit, a rolled-back write would be masked by a 304
+        for slug, film_validators in validators:
+            remember_validators(slug, film_validators)
+        metrics.DB_WRITE_SECONDS.observe(time.perf_counter() - started)
+        metrics.DB_WRITE_ROWS.inc(len(stored))
+        successes = sum(1 for _, success in stored if success)
+        metrics.SNAPSHOT_DECISIONS.inc(len(snapshots), decision='stored')
+        metrics.SNAPSHOT_DECISIONS.inc(successes - len(snapshots), decision='skipped')
+        return stored
@@ -1,158 +1,421 @@
 # scraper.py
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
+from collections import namedtuple
 import re
+import html
 import logging
+import threading
 import json # For parsing JSON-LD
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from config import Config
+import metrics
 
 # The logger instance will be configured by Flask when app.py runs
 # For standalone testing (if __name__ == '__main__'), basicConfig would be used.
 logger = logging.getLogger(__name__)
 
-def get_film_data(letterboxd_slug):
+USER_AGENT = 'LetterboxdRatingTracker/1.0 (YourName; YourContactInfo; For personal project monitoring film ratings)'
+REQUEST_TIMEOUT_SECONDS = 15
+
+# Scrape outcomes reported by fetch_film_data
+SCRAPE_CHANGED = 'changed'      # Page downloaded and parsed; `data` holds the fields
+SCRAPE_UNCHANGED = 'unchanged'  # Server answered 304 Not Modified; nothing to parse
+SCRAPE_FAILED = 'failed'        # Request or parsing failed; `data` is None
+
+# Why a scrape failed (ScrapeResult.failure)
+FAILURE_NETWORK = 'network'            # Connection error, timeout, 5xx or another unexpected status
+FAILURE_RATE_LIMITED = 'rate_limited'  # 429, or 503 with Retry-After
+FAILURE_NOT_FOUND = 'not_found'        # 404/410: the slug is wrong or the film was removed
+FAILURE_PARSE = 'parse'                # The page downloaded but could not be parsed
+FAILURE_CIRCUIT_OPEN = 'circuit_open'  # Not attempted: the circuit breaker is open (see scrape_retry.py)
+# Worth retrying soon; the others will fail the same way again
+TRANSIENT_FAILURES = (FAILURE_NETWORK, FAILURE_RATE_LIMITED)
+
+# `failure` is set for SCRAPE_FAILED; `retry_after` holds a server's Retry-After in seconds.
+# `validators` (SCRAPE_CHANGED only) are the page's ETag / Last-Modified: the caller passes
+# them to remember_validators once the data is committed, so a lost write is not followed
+# by a 304 for a page whose values were never stored
+ScrapeResult = namedtuple('ScrapeResult', ['status', 'data', 'failure', 'retry_after', 'validators'],
+                          defaults=(None, None, None))
+
+# One keep-alive connection pool shared by every scrape in the process
+_session = None
+_session_lock = threading.Lock()
+
+# Per-slug HTTP validators (ETag / Last-Modified) from the last successfully stored scrape
+_validators = {}
+_validators_lock = threading.Lock()
+
+def get_http_session():
+    """Returns the shared requests.Session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = max(int(getattr(Config, 'SCRAPE_MAX_WORKERS', 4)), 1)
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'User-Agent': USER_AGENT})
+            _session = session
+        return _session
+
+def remember_validators(letterboxd_slug, validators):
+    """Caches a stored scrape's validators, so the next fetch of the slug is conditional."""
+    if validators is None:
+        return
+    with _validators_lock:
+        if validators.get('etag') or validators.get('last_modified'):
+            _validators[letterboxd_slug] = validators
+        else:
+            _validators.pop(letterboxd_slug, None)
+
+def forget_validators(letterboxd_slug=None):
+    """Drops cached validators for one slug (or all), forcing the next fetch to download the page."""
+    with _validators_lock:
+        if letterboxd_slug is None:
+            _validators.clear()
+        else:
+            _validators.pop(letterboxd_slug, None)
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+def classify_status(status_code, retry_after=None):
+    """The failure class of a non-2xx/304 response."""
+    if status_code in (404, 410):
+        return FAILURE_NOT_FOUND
+    if status_code == 429 or (status_code == 503 and retry_after is not None):
+        return FAILURE_RATE_LIMITED
+    return FAILURE_NETWORK
+
+def fetch_page(url, **kwargs):
+    """GETs any Letterboxd page (a list page, a boxd.it redirect). Returns a ScrapeResult
+    whose `data` is the response, with failures classified like fetch_film_data's."""
+    try:
+        with metrics.FETCH_SECONDS.time():
+            response = get_http_session().get(url, timeout=REQUEST_TIMEOUT_SECONDS, **kwargs)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"RequestException for URL '{url}': {e}")
+        return ScrapeResult(SCRAPE_FAILED, None, FAILURE_NETWORK)
+    if not response.ok:
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        failure = classify_status(response.status_code, retry_after)
+        logger.warning(f"HTTP {response.status_code} for URL '{url}' ({failure}"
+                       f"{f', retry after {retry_after:.0f}s' if retry_after is not None else ''})")
+        response.close()
+        return ScrapeResult(SCRAPE_FAILED, None, failure, retry_after)
+    return ScrapeResult(SCRAPE_CHANGED, response)
+
+def fetch_film_data(letterboxd_slug, conditional=True):
+    """Fetches and parses a film page. Returns a ScrapeResult.
+
+    With conditional=True, the cached ETag / Last-Modified for the slug are sent so an
+    unchanged page comes back as 304 and is reported as SCRAPE_UNCHANGED without parsing."""
     target_url = f"https://letterboxd.com/film/{letterboxd_slug}/"
     # Reduced logging for normal operation, more can be added if debugging again
     logger.info(f"Attempting to scrape: {target_url}")
 
-    headers = {
-        'User-Agent': 'LetterboxdRatingTracker/1.0 (YourName; YourContactInfo; For personal project monitoring film ratings)'
-    }
+    headers = {}
+    if conditional:
+        with _validators_lock:
+            cached = _validators.get(letterboxd_slug)
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
     
     try:
-        response = requests.get(target_url, headers=headers, timeout=15) # Increased timeout slightly
-        # logger.debug(f"Response status code for {target_url}: {response.status_code}") # Changed to DEBUG
-        response.raise_for_status()
+        with metrics.FETCH_SECONDS.time():
+            response = get_http_session().get(target_url, headers=headers, timeout=REQUEST_TIMEOUT_SECONDS)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"RequestException for URL '{target_url}': {e}")
+        return ScrapeResult(SCRAPE_FAILED, None, FAILURE_NETWORK)
+    metrics.FETCH_BYTES.inc(len(response.content))
+
+    # logger.debug(f"Response status code for {target_url}: {response.status_code}") # Changed to DEBUG
+    if response.status_code == 304:
+        logger.info(f"Page unchanged for {letterboxd_slug} (304 Not Modified). Skipping parse.")
+        return ScrapeResult(SCRAPE_UNCHANGED, None)
+    if not response.ok:
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        failure = classify_status(response.status_code, retry_after)
+        logger.warning(f"HTTP {response.status_code} for URL '{target_url}' ({failure}"
+                       f"{f', retry after {retry_after:.0f}s' if retry_after is not None else ''})")
+        return ScrapeResult(SCRAPE_FAILED, None, failure, retry_after)
+
+    try:
+        with metrics.PARSE_SECONDS.time():
+            data = parse_film_html(response.content, letterboxd_slug)
+    except Exception as e:
+        logger.error(f"General Exception during parsing for URL '{target_url}': {e}", exc_info=True) # exc_info=True is good for full trace in logs
+        return ScrapeResult(SCRAPE_FAILED, None, FAILURE_PARSE)
+
+    validators = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+    return ScrapeResult(SCRAPE_CHANGED, data, validators=validators)
+
+def get_film_data(letterboxd_slug):
+    """Unconditionally fetches a film page. Returns the parsed data dict, or None on failure."""
+    result = fetch_film_data(letterboxd_slug, conditional=False)
+    return result.data if result.status == SCRAPE_CHANGED else None
+
+# --- Fast-path extraction ---
+# The film page is large but only a handful of fields are needed, so the fast path
+# scans the raw bytes with targeted patterns instead of building a full soup tree.
+_HEAD_END = re.compile(rb'</head\s*>', re.IGNORECASE)
+_META_TAG = re.compile(rb'<meta\s[^>]*>', re.IGNORECASE)
+_META_ATTR = re.compile(rb'(property|name|content)\s*=\s*"([^"]*)"', re.IGNORECASE)
+_PRIMARY_NAME = re.compile(rb'<h1\s[^>]*class="[^"]*primaryname[^"]*"[^>]*>\s*<span\s[^>]*class="name[^"]*"[^>]*>(.*?)</span>', re.DOTALL)
+_RELEASE_YEAR = re.compile(rb'class="releasedate"[^>]*>\s*<a[^>]*>\s*(\d{4})\s*</a>')
+_DIRECTOR = re.compile(rb'class="creatorlist"[^>]*>\s*<a[^>]*class="contributor"[^>]*>\s*<span\s[^>]*class="prettify"[^>]*>(.*?)</span>', re.DOTALL)
+_RATING_TOOLTIP = re.compile(rb'data-original-title="Weighted average of ([\d.]+) based on ([\d,]+)(?:\s|&nbsp;|&#160;|\xc2\xa0)+ratings')
+_JSON_LD = re.compile(rb'<script[^>]*type="application/ld\+json"[^>]*>(.*?)</script>', re.DOTALL)
+_META_FIELDS = {b'og:title', b'og:image', b'twitter:data2'}
+
+def _text(raw):
+    return html.unescape(raw.decode('utf-8', 'replace')).strip()
+
+def _fast_parse(html_bytes, letterboxd_slug):
+    """Extracts the film fields by scanning raw bytes. Returns None when the page doesn't
+    match the expected layout, so the caller can fall back to the soup-based parser."""
+    head_end = _HEAD_END.search(html_bytes)
+    head = html_bytes[:head_end.start()] if head_end else html_bytes
+
+    meta = {}
+    for tag in _META_TAG.finditer(head):
+        attrs = {k.lower(): v for k, v in _META_ATTR.findall(tag.group(0))}
+        key = attrs.get(b'property') or attrs.get(b'name')
+        if key in _META_FIELDS and b'content' in attrs:
+            meta[key.decode()] = _text(attrs[b'content'])
+
+    data = {"letterboxd_slug": letterboxd_slug}
+    og_title = meta.get('og:title', '')
+
+    name_match = _PRIMARY_NAME.search(html_bytes)
+    if name_match:
+        data['display_name'] = _text(re.sub(rb'<[^>]+>', b'', name_match.group(1)))
+    elif og_title:
+        name_from_meta = re.sub(r'\s*\(\d{4}\)$', '', og_title)
+        data['display_name'] = name_from_meta.replace(' - Letterboxd', '').strip()
+    else:
+        return None
+
+    year_match = _RELEASE_YEAR.search(html_bytes) or re.search(rb'\((\d{4})\)$', og_title.encode())
+    if year_match:
+        data['year'] = int(year_match.group(1))
+
+    director_match = _DIRECTOR.search(html_bytes)
+    if director_match:
+        data['director'] = _text(director_match.group(1))
+
+    if meta.get('og:image'):
+        data['poster_url'] = meta['og:image']
+
+    tooltip_match = _RATING_TOOLTIP.search(html_bytes)
+    if tooltip_match:
+        data['average_rating'] = float(tooltip_match.group(1))
+        data['rating_count'] = int(tooltip_match.group(2).replace(b',', b''))
+        return data
+
+    if b'display-rating' in html_bytes:
+        # The rating widget is present but its tooltip didn't match; let the full parser decide.
+        return None
+
+    rating_match = re.search(r'([\d\.]+)\s+out\s+of\s+5', meta.get('twitter:data2', ''))
+    if rating_match:
+        data['average_rating'] = float(rating_match.group(1))
+
+    ld_match = _JSON_LD.search(head) or _JSON_LD.search(html_bytes)
+    if ld_match:
+        script_content = ld_match.group(1)
+        json_start_index = script_content.find(b'{')
+        json_end_index = script_content.rfind(b'}')
+        if json_start_index != -1 and json_end_index > json_start_index:
+            try:
+                json_ld_data = json.loads(script_content[json_start_index : json_end_index+1])
+            except ValueError:
+                return None
+            rating_count = (json_ld_data.get('aggregateRating') or {}).get('ratingCount')
+            if rating_count is not None:
+                data['rating_count'] = int(rating_count)
+
+    if ('average_rating' in data) != ('rating_count' in data):
+        # Only half of the rating was found; the full parser has more places to look.
+        return None
+    return data
+
+def _soup_features(backend):
+    if backend == 'lxml':
+        try:
+            import lxml  # noqa: F401 -- optional dependency
+            return 'lxml'
+        except ImportError:
+            logger.warning("SCRAPER_PARSER_BACKEND=lxml but lxml is not installed; using html.parser.")
+    return 'html.parser'
+
+def parse_film_html(html_content, letterboxd_slug, backend=None):
+    """Extracts metadata and rating fields from a film page's HTML (bytes or str).
+
+    backend is 'fast' (byte-level extraction with a soup fallback), 'html.parser' or 'lxml'.
+    Defaults to Config.SCRAPER_PARSER_BACKEND."""
+    backend = backend or getattr(Config, 'SCRAPER_PARSER_BACKEND', 'fast')
+    if backend == 'fast':
+        html_bytes = html_content.encode('utf-8') if isinstance(html_content, str) else html_content
+        data = _fast_parse(html_bytes, letterboxd_slug)
+        if data is not None:
+            logger.info(f"Fast-parsed {data.get('display_name', letterboxd_slug)}: "
+                        f"{data.get('average_rating')} ({data.get('rating_count')} ratings)")
+            return data
+        logger.info(f"Fast path missed for {letterboxd_slug}. Falling back to the full HTML parser.")
+
+    if isinstance(html_content, bytes):
+        html_content = html_content.decode('utf-8', 'replace')
+    return _parse_film_soup(html_content, letterboxd_slug, _soup_features(backend))
+
+def _parse_film_soup(html_content, letterboxd_slug, features='html.parser'):
+    """The original BeautifulSoup-based extraction, used as the fallback path."""
+    soup = BeautifulSoup(html_content, features)
+    data = {"letterboxd_slug": letterboxd_slug}
+
+    # --- Metadata Parsing ---
+    name_tag = soup.select_one("h1.headline-1.primaryname span.name")
+    if name_tag:
+        data['display_name'] = name_tag.text.strip()
+    else: # Fallback
+        title_tag = soup.find('meta', property='og:title')
+        if title_tag and title_tag.get('content'):
+            name_from_meta = title_tag['content']
+            name_from_meta = re.sub(r'\s*\(\d{4}\)$', '', name_from_meta)
+            name_from_meta = name_from_meta.replace(' - Letterboxd', '').strip()
+            data['display_name'] = name_from_meta
+        else:
+            logger.warning(f"Could not find display name for {letterboxd_slug}")
+            data['display_name'] = letterboxd_slug # Fallback to slug
+    # logger.debug(f"Parsed display_name: {data.get('display_name')}") # DEBUG level
+
+    year_tag = soup.select_one(".productioninfo .releasedate a")
+    if year_tag and year_tag.text.isdigit():
+        data['year'] = int(year_tag.text)
+    else: # Fallback for year
+        title_tag_content = soup.find('meta', property='og:title')['content'] if soup.find('meta', property='og:title') else ""
+        year_match = re.search(r'\((\d{4})\)$', title_tag_content)
+        if year_match:
+            data['year'] = int(year_match.group(1))
+    # logger.debug(f"Parsed year: {data.get('year')}") # DEBUG level
+
+    director_tag = soup.select_one(".productioninfo .credits .creatorlist a.contributor span.prettify")
+    if director_tag:
+        data['director'] = director_tag.text.strip()
+    # logger.debug(f"Parsed director: {data.get('director')}") # DEBUG level
+
+    poster_meta_tag = soup.find('meta', property='og:image')
+    if poster_meta_tag and poster_meta_tag.get('content'):
+        data['poster_url'] = poster_meta_tag['content']
+    # logger.debug(f"Parsed poster_url: {data.get('poster_url')}") # DEBUG level
+    # --- End Metadata Parsing ---
+
+    # --- Rating Parsing ---
+    avg_rating_anchor = soup.select_one('span.average-rating a.display-rating')
+    parsed_from_primary = False
+
+    if avg_rating_anchor and avg_rating_anchor.has_attr('data-original-title'):
+        # logger.debug(f"PRIMARY: RATING ANCHOR FOUND for {letterboxd_slug}") # DEBUG
+        title_text = avg_rating_anchor['data-original-title']
+        # logger.debug(f"PRIMARY: RATING TOOLTIP TEXT: '{title_text}'") # DEBUG
         
-        html_content = response.text
-        soup = BeautifulSoup(html_content, 'html.parser')
-        data = {"letterboxd_slug": letterboxd_slug}
-
-        # --- Metadata Parsing ---
-        name_tag = soup.select_one("h1.headline-1.primaryname span.name")
-        if name_tag:
-            data['display_name'] = name_tag.text.strip()
-        else: # Fallback
-            title_tag = soup.find('meta', property='og:title')
-            if title_tag and title_tag.get('content'):
-                name_from_meta = title_tag['content']
-                name_from_meta = re.sub(r'\s*\(\d{4}\)$', '', name_from_meta)
-                name_from_meta = name_from_meta.replace(' - Letterboxd', '').strip()
-                data['display_name'] = name_from_meta
-            else:
-                logger.warning(f"Could not find display name for {letterboxd_slug}")
-                data['display_name'] = letterboxd_slug # Fallback to slug
-        # logger.debug(f"Parsed display_name: {data.get('display_name')}") # DEBUG level
-
-        year_tag = soup.select_one(".productioninfo .releasedate a")
-        if year_tag and year_tag.text.isdigit():
-            data['year'] = int(year_tag.text)
-        else: # Fallback for year
-            title_tag_content = soup.find('meta', property='og:title')['content'] if soup.find('meta', property='og:title') else ""
-            year_match = re.search(r'\((\d{4})\)$', title_tag_content)
-            if year_match:
-                data['year'] = int(year_match.group(1))
-        # logger.debug(f"Parsed year: {data.get('year')}") # DEBUG level
-
-        director_tag = soup.select_one(".productioninfo .credits .creatorlist a.contributor span.prettify")
-        if director_tag:
-            data['director'] = director_tag.text.strip()
-        # logger.debug(f"Parsed director: {data.get('director')}") # DEBUG level
-
-        poster_meta_tag = soup.find('meta', property='og:image')
-        if poster_meta_tag and poster_meta_tag.get('content'):
-            data['poster_url'] = poster_meta_tag['content']
-        # logger.debug(f"Parsed poster_url: {data.get('poster_url')}") # DEBUG level
-        # --- End Metadata Parsing ---
-
-        # --- Rating Parsing ---
-        avg_rating_anchor = soup.select_one('span.average-rating a.display-rating')
-        parsed_from_primary = False
-
-        if avg_rating_anchor and avg_rating_anchor.has_attr('data-original-title'):
-            # logger.debug(f"PRIMARY: RATING ANCHOR FOUND for {letterboxd_slug}") # DEBUG
-            title_text = avg_rating_anchor['data-original-title']
-            # logger.debug(f"PRIMARY: RATING TOOLTIP TEXT: '{title_text}'") # DEBUG
-            
-            avg_rating_match = re.search(r'Weighted average of ([\d\.]+)', title_text)
-            rating_count_match = re.search(r'based on ([\d,]+) ratings', title_text)
-
-            if avg_rating_match:
-                data['average_rating'] = float(avg_rating_match.group(1))
-                # logger.info(f"PRIMARY: Parsed average_rating: {data['average_rating']}") # INFO if you want to see it often
-                parsed_from_primary = True
-            else:
-                logger.warning(f"PRIMARY: Could not parse average_rating from tooltip for {letterboxd_slug}: '{title_text}'")
+        avg_rating_match = re.search(r'Weighted average of ([\d\.]+)', title_text)
+        rating_count_match = re.search(r'based on ([\d,]+) ratings', title_text)
 
-            if rating_count_match:
-                data['rating_count'] = int(rating_count_match.group(1).replace(',', ''))
-                # logger.info(f"PRIMARY: Parsed rating_count: {data['rating_count']}") # INFO
-            else:
-                logger.warning(f"PRIMARY: Could not parse rating_count from tooltip for {letterboxd_slug}: '{title_text}'")
+        if avg_rating_match:
+            data['average_rating'] = float(avg_rating_match.group(1))
+            # logger.info(f"PRIMARY: Parsed average_rating: {data['average_rating']}") # INFO if you want to see it often
+            parsed_from_primary = True
         else:
-            logger.info(f"PRIMARY: Visual rating anchor not found for {letterboxd_slug}. Will attempt fallback.")
-
-        if not parsed_from_primary or 'rating_count' not in data or 'average_rating' not in data:
-            logger.info(f"FALLBACK: Attempting to parse rating from meta/JSON-LD for {letterboxd_slug}.")
-            
-            if 'average_rating' not in data:
-                twitter_rating_meta = soup.find('meta', attrs={'name': 'twitter:data2'})
-                if twitter_rating_meta and twitter_rating_meta.get('content'):
-                    rating_match = re.search(r'([\d\.]+)\s+out\s+of\s+5', twitter_rating_meta['content'])
-                    if rating_match:
-                        data['average_rating'] = float(rating_match.group(1))
-                        # logger.info(f"FALLBACK: Parsed average_rating: {data['average_rating']}")
-                    else:
-                        logger.warning(f"FALLBACK: Could not parse average_rating from twitter:data2 for {letterboxd_slug}: {twitter_rating_meta['content']}")
-                else:
-                    logger.warning(f"FALLBACK: twitter:data2 meta tag for rating not found for {letterboxd_slug}.")
-
-            if 'rating_count' not in data:
-                script_tag_ld_json = soup.find('script', type='application/ld+json')
-                if script_tag_ld_json:
-                    script_content = script_tag_ld_json.string
-                    if script_content:
-                        json_start_index = script_content.find('{')
-                        json_end_index = script_content.rfind('}')
-                        if json_start_index != -1 and json_end_index != -1 and json_end_index > json_start_index:
-                            json_string_to_parse = script_content[json_start_index : json_end_index+1]
-                            try:
-                                json_ld_data = json.loads(json_string_to_parse)
-                                if 'aggregateRating' in json_ld_data and 'ratingCount' in json_ld_data['aggregateRating']:
-                                    data['rating_count'] = int(json_ld_data['aggregateRating']['ratingCount'])
-                                    # logger.info(f"FALLBACK: Parsed rating_count: {data['rating_count']}")
-                                else:
-                                    logger.warning(f"FALLBACK: 'ratingCount' not found in JSON-LD for {letterboxd_slug}.")
-                            except json.JSONDecodeError as e:
-                                logger.warning(f"FALLBACK: Could not parse JSON-LD for {letterboxd_slug}. Error: {e}.")
-                        else:
-                            logger.warning(f"FALLBACK: Could not find valid JSON object in JSON-LD script for {letterboxd_slug}.")
-                    else:
-                        logger.warning(f"FALLBACK: JSON-LD script tag content empty for {letterboxd_slug}.")
-                else:
-                    logger.warning(f"FALLBACK: JSON-LD script tag not found for {letterboxd_slug}.")
+            logger.warning(f"PRIMARY: Could not parse average_rating from tooltip for {letterboxd_slug}: '{title_text}'")
+
+        if rating_count_match:
+            data['rating_count'] = int(rating_count_match.group(1).replace(',', ''))
+            # logger.info(f"PRIMARY: Parsed rating_count: {data['rating_count']}") # INFO
+        else:
+            logger.warning(f"PRIMARY: Could not parse rating_count from tooltip for {letterboxd_slug}: '{title_text}'")
+    else:
+        logger.info(f"PRIMARY: Visual rating anchor not found for {letterboxd_slug}. Will attempt fallback.")
+
+    if not parsed_from_primary or 'rating_count' not in data or 'average_rating' not in data:
+        logger.info(f"FALLBACK: Attempting to parse rating from meta/JSON-LD for {letterboxd_slug}.")
         
         if 'average_rating' not in data:
-             logger.warning(f"FINAL: average_rating could not be determined for {letterboxd_slug}.")
-        if 'rating_count' not in data:
-             logger.warning(f"FINAL: rating_count could not be determined for {letterboxd_slug}.")
-        # --- End Rating Parsing ---
-        
-        if 'average_rating' in data and 'rating_count' in data:
-            logger.info(f"Successfully scraped rating for {data.get('display_name', letterboxd_slug)}: {data['average_rating']} ({data['rating_count']} ratings)")
-        elif 'average_rating' in data: # Has rating but not count (should be rare with current logic)
-            logger.info(f"Successfully scraped average rating for {data.get('display_name', letterboxd_slug)}: {data['average_rating']} (rating count MISSING)")
-        else: # No rating info at all
-            logger.info(f"No rating data found for {data.get('display_name', letterboxd_slug)} after all attempts.")
+            twitter_rating_meta = soup.find('meta', attrs={'name': 'twitter:data2'})
+            if twitter_rating_meta and twitter_rating_meta.get('content'):
+                rating_match = re.search(r'([\d\.]+)\s+out\s+of\s+5', twitter_rating_meta['content'])
+                if rating_match:
+                    data['average_rating'] = float(rating_match.group(1))
+                    # logger.info(f"FALLBACK: Parsed average_rating: {data['average_rating']}")
+                else:
+                    logger.warning(f"FALLBACK: Could not parse average_rating from twitter:data2 for {letterboxd_slug}: {twitter_rating_meta['content']}")
+            else:
+                logger.warning(f"FALLBACK: twitter:data2 meta tag for rating not found for {letterboxd_slug}.")
 
+        if 'rating_count' not in data:
+            script_tag_ld_json = soup.find('script', type='application/ld+json')
+            if script_tag_ld_json:
+                script_content = script_tag_ld_json.string
+                if script_content:
+                    json_start_index = script_content.find('{')
+                    json_end_index = script_content.rfind('}')
+                    if json_start_index != -1 and json_end_index != -1 and json_end_index > json_start_index:
+                        json_string_to_parse = script_content[json_start_index : json_end_index+1]
+                        try:
+                            json_ld_data = json.loads(json_string_to_parse)
+                            if 'aggregateRating' in json_ld_data and 'ratingCount' in json_ld_data['aggregateRating']:
+                                data['rating_count'] = int(json_ld_data['aggregateRating']['ratingCount'])
+                                # logger.info(f"FALLBACK: Parsed rating_count: {data['rating_count']}")
+                            else:
+                                logger.warning(f"FALLBACK: 'ratingCount' not found in JSON-LD for {letterboxd_slug}.")
+                        except json.JSONDecodeError as e:
+                            logger.warning(f"FALLBACK: Could not parse JSON-LD for {letterboxd_slug}. Error: {e}.")
+                    else:
+                        logger.warning(f"FALLBACK: Could not find valid JSON object in JSON-LD script for {letterboxd_slug}.")
+                else:
+                    logger.warning(f"FALLBACK: JSON-LD script tag content empty for {letterboxd_slug}.")
+            else:
+                logger.warning(f"FALLBACK: JSON-LD script tag not found for {letterboxd_slug}.")
+    
+    if 'average_rating' not in data:
+         logger.warning(f"FINAL: average_rating could not be determined for {letterboxd_slug}.")
+    if 'rating_count' not in data:
+         logger.warning(f"FINAL: rating_count could not be determined for {letterboxd_slug}.")
+    # --- End Rating Parsing ---
+    
+    if 'average_rating' in data and 'rating_count' in data:
+        logger.info(f"Successfully scraped rating for {data.get('display_name', letterboxd_slug)}: {data['average_rating']} ({data['rating_count']} ratings)")
+    elif 'average_rating' in data: # Has rating but not count (should be rare with current logic)
+        logger.info(f"Successfully scraped average rating for {data.get('display_name', letterboxd_slug)}: {data['average_rating']} (rating count MISSING)")
+    else: # No rating info at all
+        logger.info(f"No rating data found for {data.get('display_name', letterboxd_slug)} after all attempts.")
 
-        return data
 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"RequestException for URL '{target_url}': {e}")
-        return None
-    except Exception as e:
-        logger.error(f"General Exception during parsing for URL '{target_url}': {e}", exc_info=True) # exc_info=True is good for full trace in logs
-        return None
+    return data
 
 if __name__ == '__main__':
     # This block is for direct testing of scraper.py.
@@ -0,0 +1,100 @@
+# sqlite_profile.py
+# SQLite engine profile. The database file is shared by the gunicorn workers, the
+# scheduler and the scrape workers, so:
+# - every connection gets WAL journaling and the other PRAGMAs below on connect, so readers
+#   never block the writer and vice versa, and lock waits use busy_timeout instead of
+#   failing with "database is locked";
+# - each process keeps a small writer pool (one connection by default; SQLite allows a
+#   single writer at a time anyway);
+# - routes marked @read_only_db read through a separate read-only (mode=ro) pool, so page
+#   and API reads never wait behind the scraper for a connection.
+# Only applies to file-backed SQLite URIs; other databases are left untouched.
+from functools import wraps
+from urllib.parse import quote
+
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+READ_ENGINE_KEY = 'sqlite_read_engine'
+
+def _is_file_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:') \
+        and 'mode=memory' not in str(url)
+
+def _pragmas(config, read_only=False):
+    pragmas = [
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('busy_timeout', int(config['SQLITE_BUSY_TIMEOUT_MS'])),
+        ('cache_size', int(config['SQLITE_CACHE_SIZE'])),
+        ('mmap_size', int(config['SQLITE_MMAP_SIZE'])),
+    ]
+    if read_only:
+        pragmas.append(('query_only', 'ON'))
+    else:
+        # journal_mode is stored in the database file; only a writer can change it
+        pragmas.insert(0, ('journal_mode', config['SQLITE_JOURNAL_MODE']))
+    return pragmas
+
+def _apply_pragmas_on_connect(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def configure_sqlite_engine(app):
+    """Sets writer engine options. Call before db.init_app(app)."""
+    config = app.config
+    if not config.get('SQLITE_PROFILE_ENABLED', True) or not _is_file_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        return
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    options.setdefault('pool_size', int(config['SQLITE_WRITER_POOL_SIZE']))
+    options.setdefault('max_overflow', 0)
+    connect_args = dict(options.get('connect_args') or {})
+    connect_args.setdefault('timeout', int(config['SQLITE_BUSY_TIMEOUT_MS']) / 1000)
+    options['connect_args'] = connect_args
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+def init_sqlite_profile(app, db):
+    """Installs the PRAGMAs on the writer engine and creates the read-only pool.
+    Call after db.init_app(app), before anything connects."""
+    config = app.config
+    if not config.get('SQLITE_PROFILE_ENABLED', True) or not _is_file_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        return
+    with app.app_context():
+        writer = db.engine
+    _apply_pragmas_on_connect(writer, _pragmas(config))
+
+    # Flask-SQLAlchemy has already made the path absolute
+    path = writer.url.database
+    reader = create_engine(
+        f"sqlite:///file:{quote(path)}?mode=ro&uri=true",
+        pool_size=int(config['SQLITE_READ_POOL_SIZE']),
+        max_overflow=int(config['SQLITE_READ_POOL_SIZE']),
+        connect_args={'timeout': int(config['SQLITE_BUSY_TIMEOUT_MS']) / 1000, 'check_same_thread': False},
+    )
+    _apply_pragmas_on_connect(reader, _pragmas(config, read_only=True))
+    app.extensions[READ_ENGINE_KEY] = reader
+
+class RoutingSession(Session):
+    """Session that sends reads in @read_only_db routes to the read-only pool."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and g.get('read_only_db'):
+            reader = current_app.extensions.get(READ_ENGINE_KEY)
+            if reader is not None:
+                return reader
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def read_only_db(view):
+    """Marks a view as read-only: its queries use the read-only connection pool.
+    Writing from such a view fails with 'attempt to write a readonly database'."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only_db = True
+        return view(*args, **kwargs)
+    return wrapper
@@ -1,85 +1,277 @@
 # tasks.py
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from random import randint
 import time
 
+from flask import current_app
+from sqlalchemy import select
+
 from models import db, Film, RatingSnapshot
-from scraper import get_film_data
+import metrics
+from scraper import (ScrapeResult, SCRAPE_CHANGED, SCRAPE_UNCHANGED, SCRAPE_FAILED,
+                     TRANSIENT_FAILURES, FAILURE_CIRCUIT_OPEN, remember_validators)
+from scrape_retry import fetch_with_retry, get_circuit_breaker, BREAKER_OPEN
+from scrape_budget import fetch_budget
+from rollups import record_snapshot
+from film_stats import refresh_film_stats
+from response_cache import invalidate_films
+from scrape_schedule import next_schedule, retry_schedule
+from deadband import deadband_settings, is_significant
+from scrape_queue import enqueue_due_films, claim_entries, release_entries, queue_stats, default_worker_id
+from scrape_writer import ScrapeResultWriter
 
 logger = logging.getLogger(__name__)
 
-def run_scrape_job_for_film(film_id):
-    """Scrapes a single film and updates the database. Returns True on success, False on failure."""
-    # This function is executed within an application context provided by
-    # Flask-APScheduler (for scheduled jobs) or a Flask view (for manual triggers).
-    film = Film.query.get(film_id)
-    if not film:
-        logger.error(f"Film with ID {film_id} not found for scraping.")
-        return False
-
-    logger.info(f"Scraping data for: {film.display_name} ({film.letterboxd_slug})")
-    scraped_data = get_film_data(film.letterboxd_slug)
+def plan_scrape_update(film, result, now=None):
+    """Works out what a ScrapeResult changes for a film, without touching the session.
+    `film` is a Film or a row with the same column attributes. Returns (values, snapshot, success):
+    the Film columns to set, the RatingSnapshot values to insert (None if the rating did not
+    move), and False if the scrape failed."""
+    now = now or datetime.utcnow()
+    if result.status == SCRAPE_UNCHANGED:
+        # Fast path: the page has not changed since the last scrape, so neither has the rating.
+        logger.info(f"Page for {film.display_name} not modified. Skipping snapshot.")
+        interval, due_at = next_schedule(film, moved=False, now=now)
+        return {'last_scraped_at': now, 'scrape_interval_minutes': interval, 'next_scrape_due_at': due_at}, None, True
 
+    scraped_data = result.data if result.status == SCRAPE_CHANGED else None
     if scraped_data:
+        snapshot = None
         # Update film metadata if it changed (e.g. director added later)
-        film.display_name = scraped_data.get('display_name', film.display_name)
-        film.year = scraped_data.get('year', film.year)
-        film.director = scraped_data.get('director', film.director)
-        film.poster_url = scraped_data.get('poster_url', film.poster_url)
-        
+        values = {
+            'display_name': scraped_data.get('display_name', film.display_name),
+            'year': scraped_data.get('year', film.year),
+            'director': scraped_data.get('director', film.director),
+            'poster_url': scraped_data.get('poster_url', film.poster_url),
+        }
+
         if 'average_rating' in scraped_data and 'rating_count' in scraped_data:
             avg_rating = scraped_data['average_rating']
             rating_count = scraped_data['rating_count']
 
             # Check if rating actually changed to avoid redundant snapshots
-            if (film.last_known_average_rating != avg_rating or
-                film.last_known_rating_count != rating_count or
-                film.last_scraped_at is None):
-
-                snapshot = RatingSnapshot(
-                    film_id=film.id,
-                    average_rating=avg_rating,
-                    rating_count=rating_count,
-                    timestamp=datetime.utcnow()
-                )
-                db.session.add(snapshot)
+            deadband = deadband_settings()
+            if deadband:
+                # Compressed storage: only moves beyond the deadband around the last stored point
+                changed = is_significant(film.last_snapshot_average_rating, film.last_snapshot_rating_count,
+                                         avg_rating, rating_count, *deadband)
+            else:
+                changed = (film.last_known_average_rating != avg_rating or
+                           film.last_known_rating_count != rating_count)
+            if changed or film.last_scraped_at is None:
+                snapshot = {'average_rating': avg_rating, 'rating_count': rating_count, 'timestamp': now}
                 logger.info(f"New rating snapshot for {film.display_name}: {avg_rating} ({rating_count} ratings)")
             else:
                 logger.info(f"Rating for {film.display_name} unchanged. Skipping snapshot.")
 
-            film.last_known_average_rating = avg_rating
-            film.last_known_rating_count = rating_count
-        
-        film.last_scraped_at = datetime.utcnow()
-        db.session.commit()
-        return True
+            values['last_known_average_rating'] = avg_rating
+            values['last_known_rating_count'] = rating_count
+            if snapshot:
+                values['last_snapshot_average_rating'] = avg_rating
+                values['last_snapshot_rating_count'] = rating_count
+
+        values['last_scraped_at'] = now
+        values['scrape_interval_minutes'], values['next_scrape_due_at'] = next_schedule(
+            film, moved=snapshot is not None, now=now)
+        return values, snapshot, True
     else:
-        logger.warning(f"Failed to scrape data for {film.display_name}")
-        film.last_scraped_at = datetime.utcnow() # Mark as attempted
-        db.session.commit()
+        failure = getattr(result, 'failure', None)
+        logger.warning(f"Failed to scrape data for {film.display_name} ({failure or 'unknown'})")
+        if failure in TRANSIENT_FAILURES:
+            # Retries already ran out; try again soon rather than a whole interval later
+            interval, due_at = retry_schedule(film, getattr(result, 'retry_after', None), now=now)
+        else:
+            interval, due_at = next_schedule(film, moved=False, failed=True, now=now)
+        # last_scraped_at is left alone: it is the time of the last successful scrape
+        return {'scrape_interval_minutes': interval, 'next_scrape_due_at': due_at}, None, False
+
+def apply_scrape_result(film, result):
+    """Applies a ScrapeResult to a film, stages a snapshot if the rating moved and refreshes
+    the film's stats row. Does not commit.
+    Returns True on success (changed or unchanged), False if the scrape failed."""
+    values, snapshot, success = plan_scrape_update(film, result)
+    if success:
+        metrics.SNAPSHOT_DECISIONS.inc(decision='stored' if snapshot else 'skipped')
+    if snapshot:
+        db.session.add(RatingSnapshot(film_id=film.id, **snapshot))
+        record_snapshot(film.id, snapshot['timestamp'], snapshot['average_rating'], snapshot['rating_count'])
+    for column, value in values.items():
+        setattr(film, column, value)
+    refresh_film_stats([film.id])
+    return success
+
+def run_scrape_job_for_film(film_id):
+    """Scrapes a single film and updates the database. Returns True on success, False on failure."""
+    # This function is executed within an application context provided by
+    # Flask-APScheduler (for scheduled jobs) or a Flask view (for manual triggers).
+    film = Film.query.get(film_id)
+    if not film:
+        logger.error(f"Film with ID {film_id} not found for scraping.")
         return False
 
-def scheduled_scrape_task():
+    logger.info(f"Scraping data for: {film.display_name} ({film.letterboxd_slug})")
+    result = fetch_with_retry(film.letterboxd_slug)
+    success = apply_scrape_result(film, result)
+    db.session.commit()
+    remember_validators(film.letterboxd_slug, result.validators)
+    invalidate_films([film.letterboxd_slug])
+    return success
+
+def scrape_films(progress, film_ids=None):
+    """On-demand scrape of the given films, or of every tracked film with film_ids=None
+    ("scrape now" / "scrape all" in the admin), run as a background job. Films are fetched
+    concurrently under the shared rate limit and stored in bulk, like a scheduled cycle.
+    `progress` is a background_jobs.JobProgress. Returns a summary."""
+    with fetch_budget() as bucket:
+        return _scrape_films(progress, film_ids, bucket)
+
+def _scrape_films(progress, film_ids, bucket):
+    config = current_app.config
+    max_workers = max(int(config.get('SCRAPE_MAX_WORKERS', 4)), 1)
+    batch_size = max(int(config.get('SCRAPE_COMMIT_BATCH_SIZE', 25)), 1)
+    stmt = select(Film.id, Film.letterboxd_slug).order_by(Film.display_order.asc())
+    stmt = stmt.where(Film.is_tracked.is_(True)) if film_ids is None else stmt.where(Film.id.in_(film_ids))
+    films = db.session.execute(stmt).all()
+    db.session.rollback() # Release the read; the writer opens its own transactions
+    progress.stage(f"Scraping {len(films)} films", total=len(films))
+    writer = ScrapeResultWriter(
+        plan_scrape_update,
+        max_rows=batch_size,
+        max_seconds=float(config.get('SCRAPE_COMMIT_INTERVAL_SECONDS', 30)),
+    )
+    skipped = 0
+    with ThreadPoolExecutor(max_workers=min(max_workers, max(len(films), 1)), thread_name_prefix='scrape') as pool:
+        futures = {pool.submit(_rate_limited_fetch, bucket, slug): film_id for film_id, slug in films}
+        for future in as_completed(futures):
+            film_id = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"On-demand scrape crashed for film {film_id}: {e}", exc_info=True)
+                result = ScrapeResult(SCRAPE_FAILED, None)
+            if result.failure == FAILURE_CIRCUIT_OPEN:
+                # Not attempted; the film keeps its schedule
+                skipped += 1
+            else:
+                writer.add(None, None, film_id, result)
+            progress.advance(result.status != SCRAPE_FAILED)
+    writer.flush()
+    outcome = f"{writer.succeeded}/{writer.written} films scraped"
+    if skipped:
+        outcome += f", {skipped} skipped (circuit breaker open)"
+    logger.info(f"On-demand scrape finished: {outcome}")
+    progress.flush(message=outcome)
+    return {"scraped": writer.succeeded, "stored": writer.written, "skipped": skipped, "requested": len(films)}
+
+def _rate_limited_fetch(bucket, slug):
+    # Runs on a worker thread: only the HTTP fetch happens here, never the DB session.
+    # Retries and the circuit breaker are applied per attempt (see scrape_retry.py)
+    return fetch_with_retry(slug, bucket)
+
+def _scrape_claimed_batch(pool, bucket, token, claimed, writer):
+    """Fetches one claimed batch concurrently and hands each result to the writer as it arrives.
+    The writer stores results (and completes their queue entries) in bulk. Films the circuit
+    breaker stopped are not stored; returns their entry ids, so the entries can be released."""
+    skipped = []
+    futures = {}
+    for entry_id, film_id, slug in claimed:
+        logger.debug(f"Queued: {slug}")
+        futures[pool.submit(_rate_limited_fetch, bucket, slug)] = (entry_id, film_id)
+
+    for future in as_completed(futures):
+        entry_id, film_id = futures[future]
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error(f"Scrape worker crashed for film {film_id}: {e}", exc_info=True)
+            result = ScrapeResult(SCRAPE_FAILED, None)
+        if result.failure == FAILURE_CIRCUIT_OPEN:
+            # Never attempted: the film keeps its schedule and queue entry
+            skipped.append(entry_id)
+            continue
+        writer.add(token, entry_id, film_id, result)
+    return skipped
+
+def drain_scrape_queue(pool, bucket, worker_id, batch_size, lease_seconds, should_stop=None):
+    """Claims and scrapes batches until nothing due is left in the queue (or should_stop()
+    returns True, or the circuit breaker opens). Results are written in bulk every batch_size
+    films or SCRAPE_COMMIT_INTERVAL_SECONDS, together with their queue entries.
+    Returns (succeeded, processed) film counts."""
+    breaker = get_circuit_breaker()
+    started = time.perf_counter()
+    writer = ScrapeResultWriter(
+        plan_scrape_update,
+        max_rows=batch_size,
+        max_seconds=float(current_app.config.get('SCRAPE_COMMIT_INTERVAL_SECONDS', 30)),
+    )
+    while not (should_stop and should_stop()):
+        if breaker.state == BREAKER_OPEN:
+            # Half-open still claims a batch: its first fetch is the probe
+            logger.warning(f"Scrape circuit breaker is open; pausing the queue for "
+                           f"{breaker.seconds_until_retry():.0f}s")
+            break
+        token, claimed = claim_entries(worker_id, batch_size, lease_seconds)
+        if not claimed:
+            break
+        try:
+            skipped = _scrape_claimed_batch(pool, bucket, token, claimed, writer)
+            writer.flush()
+            if skipped:
+                # Left unfinished by the open breaker: back to the queue for a later run,
+                # without counting the claim, so an outage can't exhaust MAX_ATTEMPTS
+                release_entries(token, skipped, count_attempt=False)
+        except Exception:
+            db.session.rollback()
+            release_entries(token)
+            raise
+    logger.debug(f"Stored {writer.written} scrape results in {writer.commits} commits")
+    if writer.written:
+        metrics.CYCLE_SECONDS.observe(time.perf_counter() - started)
+        metrics.CYCLE_FILMS.inc(writer.written)
+        metrics.export()
+    return writer.succeeded, writer.written
+
+def lease_seconds_for(config, requests_per_minute, batch_size):
+    # A lease must outlast the batch it covers, or another process could claim it mid-fetch;
+    # retries can add up to (attempts - 1) maximum backoffs on top
+    retry_allowance = (max(int(config.get('SCRAPE_RETRY_ATTEMPTS', 3)), 1) - 1) * float(config.get('SCRAPE_RETRY_MAX_SECONDS', 60))
+    return max(int(config.get('SCRAPE_LEASE_SECONDS', 300)),
+               int(2 * batch_size * 60 / max(requests_per_minute, 1) + retry_allowance))
+
+def scheduled_scrape_task(worker_id=None):
     logger.info("Scheduled task triggered")
     logger.info("Scheduler starting scrape task...")
     # This function is run by APScheduler and will have an app context automatically.
     # Structured log for timing
+    started = time.monotonic()
     logger.info(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    films_to_track = Film.query.filter_by(is_tracked=True).all()
-    if not films_to_track:
-        logger.info("No films are currently marked for tracking.")
+
+    # Due films go into the durable queue; entries left by an interrupted cycle are still
+    # there, so this run picks up where the previous one stopped.
+    enqueued = enqueue_due_films()
+    db.session.commit()
+    queued, leased = queue_stats()
+    if not queued:
+        logger.info("No tracked films are due for scraping.")
         return
 
-    logger.info(f"Found {len(films_to_track)} films to scrape")
-    for film in films_to_track:
-        logger.debug(f"Queued: {film.display_name}")
-    
-    for film in films_to_track:
-        logger.info(f"Scraping: {film.display_name}")
-        run_scrape_job_for_film(film.id)
-        delay = randint(5, 15) # Polite delay between requests
-        logger.info(f"Waiting {delay} seconds before next film...")
-        time.sleep(delay)
-    logger.info("Scheduler finished scrape task.")
-    logger.info(">>> SCHEDULED TASK COMPLETED <<<")
\ No newline at end of file
+    config = current_app.config
+    max_workers = max(int(config.get('SCRAPE_MAX_WORKERS', 4)), 1)
+    batch_size = max(int(config.get('SCRAPE_COMMIT_BATCH_SIZE', 25)), 1)
+    worker_id = worker_id or default_worker_id()
+
+    # Scrape workers may be draining the same queue: this process takes its share of the budget
+    with fetch_budget() as bucket:
+        requests_per_minute = bucket.rate_per_second * 60
+        lease_seconds = lease_seconds_for(config, requests_per_minute, batch_size)
+        logger.info(f"{queued} films in the scrape queue ({enqueued} newly due, {leased} leased elsewhere) "
+                    f"({max_workers} workers, {requests_per_minute:.0f} requests/minute, commit every {batch_size})")
+        # Fetches run concurrently; results are applied and committed on this thread only.
+        # Each batch is claimed with a lease and removed from the queue in the same commit as its results.
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scrape') as pool:
+            succeeded, processed = drain_scrape_queue(pool, bucket, worker_id, batch_size, lease_seconds)
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Scheduler finished scrape task: {succeeded}/{processed} films scraped in {elapsed:.1f}s.")
+    logger.info(">>> SCHEDULED TASK COMPLETED <<<")
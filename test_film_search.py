@@ -0,0 +1,50 @@
+# test_film_search.py
+# Autocomplete search must forgive the typos people actually make: swapped letters, a
+# dropped or wrong letter, including in words too short to keep any trigram intact.
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp, 'test.sqlite3')
+os.environ['RESPONSE_CACHE_SHARED_PATH'] = os.path.join(_tmp, 'response_cache.sqlite3')
+os.environ['METRICS_SHARED_DIR'] = ''
+
+from sqlalchemy import text
+
+from app import app
+from models import db, Film
+from film_search import search_films, rebuild_search_index, DROP_STATEMENTS, normalize
+
+TITLES = ["The Shawshank Redemption", "Film Socialisme", "Fight Club", "The Godfather", "Filth", "Parasite"]
+
+def test_typos_find_the_film():
+    with app.app_context():
+        db.create_all()
+        rebuild_search_index(db.session.connection())
+        for i, title in enumerate(TITLES):
+            db.session.add(Film(letterboxd_slug=normalize(title).replace(' ', '-'), display_name=title,
+                                display_order=i + 1, is_tracked=True))
+        db.session.commit()
+
+        def top(query):
+            results = search_films(query)
+            return results[0].display_name if results else None
+
+        try:
+            # Swapped letters
+            assert top('flim') == "Film Socialisme"
+            assert top('fihgt club') == "Fight Club"
+            assert top('godfahter') == "The Godfather"
+            # One wrong, missing or extra letter
+            assert top('shawshenk') == "The Shawshank Redemption"
+            assert top('shawshnk') == "The Shawshank Redemption"
+            assert top('parassite') == "Parasite"
+            # Exact matches still win, and noise matches nothing
+            assert top('filth') == "Filth"
+            assert search_films('qzxv') == []
+        finally:
+            db.session.remove()
+            with db.engine.begin() as connection:
+                for statement in DROP_STATEMENTS:
+                    connection.execute(text(statement))
+            db.drop_all()
@@ -0,0 +1,65 @@
+# test_scrape_queue.py
+# A Letterboxd outage opens the circuit breaker; the films it stops must stay queued no
+# matter how many half-open probe passes run before the site comes back.
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp, 'test.sqlite3')
+os.environ['RESPONSE_CACHE_SHARED_PATH'] = os.path.join(_tmp, 'response_cache.sqlite3')
+os.environ['METRICS_SHARED_DIR'] = ''
+
+from sqlalchemy import select, func
+
+from app import app
+from config import Config
+from models import db, Film, ScrapeQueueEntry
+from rate_limiter import TokenBucket
+from scraper import ScrapeResult, SCRAPE_FAILED, FAILURE_NETWORK
+from scrape_queue import enqueue_due_films, MAX_ATTEMPTS
+import scrape_retry
+import tasks
+
+def test_breaker_skips_do_not_count_as_attempts(monkeypatch, caplog):
+    films = 30
+    fetched = []
+
+    def outage(slug, conditional=True):
+        fetched.append(slug)
+        return ScrapeResult(SCRAPE_FAILED, None, FAILURE_NETWORK)
+
+    monkeypatch.setattr(scrape_retry, 'fetch_film_data', outage)
+    monkeypatch.setattr(Config, 'SCRAPE_RETRY_ATTEMPTS', 1)
+    breaker = scrape_retry.CircuitBreaker(window=4, min_requests=4, failure_rate=0.5, cooldown=60)
+    monkeypatch.setattr(scrape_retry, '_breaker', breaker)
+    bucket = TokenBucket(60000, burst=films)
+
+    with app.app_context():
+        db.create_all()
+        for i in range(films):
+            db.session.add(Film(letterboxd_slug=f'film-{i}', display_name=f'Film {i}',
+                                display_order=i + 1, is_tracked=True))
+        db.session.commit()
+        enqueue_due_films()
+        db.session.commit()
+
+        caplog.set_level(logging.ERROR, logger='scrape_queue')
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            for _ in range(MAX_ATTEMPTS + 3):
+                tasks.drain_scrape_queue(pool, bucket, 'test:1', batch_size=10, lease_seconds=300)
+                # Skip the cooldown: the next pass starts half-open and sends one probe
+                breaker._opened_at = time.monotonic() - breaker._cooldown - 1
+
+        queued = db.session.execute(select(func.count(ScrapeQueueEntry.id))).scalar()
+        max_attempts = db.session.execute(select(func.max(ScrapeQueueEntry.attempts))).scalar()
+        db.session.remove()
+        db.drop_all()
+
+    # Fetched films were stored as failures (and rescheduled); every other film is still queued
+    assert queued == films - len(fetched)
+    assert queued > 0
+    assert max_attempts == 0
+    assert 'Dropping' not in caplog.text
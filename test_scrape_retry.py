@@ -0,0 +1,125 @@
+# test_scrape_retry.py
+# The pieces that decide how a failed scrape is handled: failure classification,
+# Retry-After parsing, the circuit breaker's states and the schedule a failure gets.
+# No network: breaker cooldowns are skipped by moving its open time back.
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+_tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp, 'test.sqlite3')
+os.environ['RESPONSE_CACHE_SHARED_PATH'] = os.path.join(_tmp, 'response_cache.sqlite3')
+os.environ['METRICS_SHARED_DIR'] = ''
+
+from app import app
+from scraper import (ScrapeResult, SCRAPE_FAILED, FAILURE_NETWORK, FAILURE_RATE_LIMITED, FAILURE_NOT_FOUND,
+                     parse_retry_after, classify_status)
+from scrape_retry import CircuitBreaker, BREAKER_CLOSED, BREAKER_OPEN, BREAKER_HALF_OPEN
+from scrape_schedule import interval_bounds
+import tasks
+
+def _skip_cooldown(breaker):
+    breaker._opened_at = time.monotonic() - breaker._cooldown - 1
+
+def test_classify_status():
+    assert classify_status(404) == FAILURE_NOT_FOUND
+    assert classify_status(410) == FAILURE_NOT_FOUND
+    assert classify_status(429) == FAILURE_RATE_LIMITED
+    assert classify_status(429, retry_after=30.0) == FAILURE_RATE_LIMITED
+    # A 503 is only a rate limit when the server says when to come back
+    assert classify_status(503, retry_after=30.0) == FAILURE_RATE_LIMITED
+    assert classify_status(503) == FAILURE_NETWORK
+    assert classify_status(500) == FAILURE_NETWORK
+    assert classify_status(502, retry_after=30.0) == FAILURE_NETWORK
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120.0
+    assert parse_retry_after(' 5 ') == 5.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('') is None
+    assert parse_retry_after('soon') is None
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=90), usegmt=True)
+    assert 80 <= parse_retry_after(later) <= 90
+    # A date in the past means "now", never a negative wait
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+
+def test_breaker_opens_at_failure_rate():
+    breaker = CircuitBreaker(window=4, min_requests=4, failure_rate=0.5, cooldown=60)
+    for failed in (False, True, False):
+        breaker.record(failed)
+    # Below min_requests nothing opens, whatever the rate
+    assert breaker.state == BREAKER_CLOSED
+    breaker.record(True)
+    assert breaker.state == BREAKER_OPEN
+    assert not breaker.allow_request()
+    assert 0 < breaker.seconds_until_retry() <= 60
+
+def test_breaker_stays_closed_below_failure_rate():
+    breaker = CircuitBreaker(window=4, min_requests=4, failure_rate=0.5, cooldown=60)
+    # Never more than one failure in any four consecutive requests
+    for failed in (False, False, True, False, False, False, True, False):
+        breaker.record(failed)
+    assert breaker.state == BREAKER_CLOSED
+
+def test_breaker_half_open_allows_one_probe():
+    breaker = CircuitBreaker(window=2, min_requests=2, failure_rate=0.5, cooldown=60)
+    breaker.record(True)
+    breaker.record(True)
+    _skip_cooldown(breaker)
+    assert breaker.state == BREAKER_HALF_OPEN
+    assert breaker.seconds_until_retry() == 0.0
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+def test_breaker_failed_probe_doubles_cooldown():
+    breaker = CircuitBreaker(window=2, min_requests=2, failure_rate=0.5, cooldown=60, max_cooldown=100)
+    breaker.record(True)
+    breaker.record(True)
+    _skip_cooldown(breaker)
+    assert breaker.allow_request()
+    breaker.record(True)
+    assert breaker.state == BREAKER_OPEN
+    assert breaker._cooldown == 100 # Doubled, then capped at max_cooldown
+    assert 60 < breaker.seconds_until_retry() <= 100
+
+def test_breaker_successful_probe_closes():
+    breaker = CircuitBreaker(window=2, min_requests=2, failure_rate=0.5, cooldown=60)
+    breaker.record(True)
+    breaker.record(True)
+    _skip_cooldown(breaker)
+    assert breaker.allow_request()
+    breaker.record(False)
+    assert breaker.state == BREAKER_CLOSED
+    assert breaker._cooldown == 60
+    # The failures from before the outage no longer count
+    breaker.record(True)
+    assert breaker.state == BREAKER_CLOSED
+
+def test_plan_scrape_update_failures():
+    now = datetime(2026, 1, 1, 12, 0)
+    last_scraped = now - timedelta(hours=3)
+    film = SimpleNamespace(id=1, display_name='Film', scrape_interval_minutes=240, last_scraped_at=last_scraped)
+    with app.app_context():
+        _, minimum, _ = interval_bounds()
+
+        # Transient: due again after the minimum interval (or Retry-After), interval kept
+        values, snapshot, success = tasks.plan_scrape_update(
+            film, ScrapeResult(SCRAPE_FAILED, None, FAILURE_NETWORK), now)
+        assert (success, snapshot) == (False, None)
+        assert values == {'scrape_interval_minutes': 240, 'next_scrape_due_at': now + timedelta(minutes=minimum)}
+
+        values, _, _ = tasks.plan_scrape_update(
+            film, ScrapeResult(SCRAPE_FAILED, None, FAILURE_RATE_LIMITED, retry_after=minimum * 60 + 600), now)
+        assert values['next_scrape_due_at'] == now + timedelta(minutes=minimum, seconds=600)
+
+        # Permanent: a whole interval later
+        values, snapshot, success = tasks.plan_scrape_update(
+            film, ScrapeResult(SCRAPE_FAILED, None, FAILURE_NOT_FOUND), now)
+        assert (success, snapshot) == (False, None)
+        assert values == {'scrape_interval_minutes': 240, 'next_scrape_due_at': now + timedelta(minutes=240)}
+
+    # A failure never counts as a scrape
+    assert film.last_scraped_at == last_scraped
@@ -1,6 +1,9 @@
 # wsgi.py
 # This file is used by Gunicorn for production deployment
 from app import app
+import metrics
+
+metrics.enable_export() # Every gunicorn worker publishes its scrape metrics for /metrics
 
 if __name__ == "__main__":
     app.run() 
\ No newline at end of file